@@ -3,12 +3,26 @@ import pandas as pd
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime
-import yfinance as yf
 import hashlib
+import html
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 import os
 from urllib.parse import quote
 
+import chart_data
+import indicators
+import settings
+import theme
+from history_store import MAX_LOOKBACK_DAYS, get_history_store, is_intraday
+from journal import equity_curve, get_journal, pnl_by, trade_stats
+from market_snapshot import get_market_snapshot
+from rule_index import parse_volume
+from rule_store import open_store
+from sheet_sync import SheetSession
+from trigger_history import get_trigger_feed
+from symbols import get_symbol_registry
+
 # ==========================================
 # 1. CONFIGURATION & PATHS
 # ==========================================
@@ -19,178 +33,17 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# נתיבים קבועים (ודא שהם תואמים לנתיב ב-GitHub שלך!)
-GITHUB_USER = "orsela"
-REPO_NAME = "stock-app"
-BASE_URL = f"https://raw.githubusercontent.com/{GITHUB_USER}/{REPO_NAME}/main/assets"
-LOGO_URL = f"{BASE_URL}/logo_light_bg.png"
-GOOGLE_ICON_URL = f"{BASE_URL}/google_icon.png"
+# התמונות והעיצוב מוגשים מקומית מ-static/ (נבנים מ-assets/ פעם אחת לתהליך, ראה theme.py)
+LOGO_URL = theme.static_url("logo")
+GOOGLE_ICON_URL = theme.static_url("google_icon")
 
 # ==========================================
 # 2. DYNAMIC THEME CSS
 # ==========================================
 def apply_dynamic_css(dark_mode: bool):
     if dark_mode:
-        css = f"""
-        <style>
-        @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600;900&family=JetBrains+Mono:wght@400;700&family=Permanent+Marker&display=swap');
-        
-        /* רקע ראשי וצבע טקסט כללי */
-        .stApp {{ background-color: #000000 !important; color: #FFFFFF !important; font-family: 'Inter', sans-serif; }}
-        #MainMenu, footer, header, .stDeployButton {{ visibility: hidden; }}
-
-        /* --- שיפור קריאות טקסט וכותרות --- */
-        /* צבע טקסט ראשי לבן ומודגש יותר לכל הפריטים */
-        h1, h2, h3, h4, h5, h6, p, label, .stMetricLabel, .stMarkdown, .css-1dp5vir {{ color: #FFFFFF !important; opacity: 1 !important; font-weight: 600; }} 
-        
-        /* הדגשת כותרות באופן כללי */
-        h2 {{ font-size: 2.0rem !important; font-weight: 900 !important; color: #FF7F50 !important; }}
-        h3 {{ font-size: 1.5rem !important; font-weight: 800 !important; color: #FF7F50 !important; }}
-        h4 {{ font-size: 1.2rem !important; font-weight: 700 !important; }}
-
-      
-     /* ערך המדד (המספר עצמו) - לבן וגדול, ודאי! */
-        .stMetricValue {{ 
-            font-size: 2.5rem !important;
-            font-weight: 900 !important; 
-            color: #FFFFFF !important; /* מוגדר במפורש לבן טהור */
-            opacity: 1 !important; /* מוודא שהשקיפות מלאה */
-            line-height: 1.1;
-        }}
-        
-        /* שיפור קריאות טקסט השינוי היומי (Delta) */
-        .stMetricDelta {{
-            font-weight: 700 !important;
-            font-size: 1.0rem !important;
-        }}
-        }}
-        
-        /* כותרת המדד (S&P 500) - גדולה ובולטת */
-        .stMetricLabel {{
-            font-size: 1.1rem !important;
-            font-weight: 800 !important; /* BOLD חזק */
-            color: #FF7F50 !important; /* כתום בולט */
-            margin-bottom: 5px;
-        }}
-
-        /* ערך המדד (המספר עצמו) - לבן וגדול */
-        .stMetricValue {{ 
-            font-size: 2.5rem !important; /* גודל גדול יותר */
-            font-weight: 900 !important; 
-            color: #FFFFFF !important; /* לבן בולט */
-            line-height: 1.1;
-        }}
-        
-        /* כותרת המדד (S&P 500) - גדולה ובולטת */
-        .stMetricLabel {{
-            font-size: 1.1rem !important;
-            font-weight: 800 !important; /* BOLD חזק */
-            color: #FF7F50 !important; /* שימוש בצבע המותג הכתום לכותרת */
-            margin-bottom: 5px;
-        }}
-
-        /* ערך המדד (המספר עצמו) - לבן וגדול */
-        .stMetricValue {{ 
-            font-size: 2.5rem !important; /* גודל גדול יותר */
-            font-weight: 900 !important; 
-            color: #FFFFFF !important; /* לבן בולט */
-            line-height: 1.1;
-        }}
-
-        /* General Styling */
-        .rtl {{ direction: rtl; text-align: right; font-family: 'Inter', sans-serif; }}
-        
-        /* Input & Button Styling */
-        .stTextInput > div > div > input, .stNumberInput > div > div > input {{ background-color: #111 !important; border: 1px solid #333 !important; color: #FFFFFF !important; font-family: 'JetBrains Mono', monospace !important; }}
-        .stButton > button {{ background-color: #FF7F50 !important; color: #000000 !important; border: none !important; font-weight: 800 !important; border-radius: 4px !important; text-transform: uppercase; font-size: 1rem; transition: all 0.2s ease; }}
-        .stButton > button:hover {{ background-color: #FF6347 !important; transform: scale(1.02); }}
-        
-        /* Overriding Streamlit button styling for Delete/Close Alert to be less aggressive */
-        .stButton > button[kind="secondary"] {{
-            background-color: #333333 !important;
-            color: #FFFFFF !important;
-            font-weight: 400 !important;
-        }}
-        .stButton > button[kind="secondary"]:hover {{
-            background-color: #444444 !important;
-            transform: scale(1.00); 
-        }}
-
-
-        /* Login Page Layout */
-        .login-container {{ display: flex; flex-direction: row; width: 100%; height: 100vh; margin: -20px; }}
-        .login-image-side {{ 
-            flex: 1; 
-            background: #111122;
-            background-image: url('https://upload.wikimedia.org/wikipedia/commons/b/b3/Candlestick_Chart_Example.png'); /* רקע דמוי גרף (placeholder) */
-            background-size: cover;
-            background-position: center;
-            display: flex; align-items: flex-end; justify-content: flex-start; 
-            padding: 50px;
-            position: relative;
-        }}
-        .login-image-side::after {{
-            content: '';
-            position: absolute;
-            top: 0; left: 0; right: 0; bottom: 0;
-            background: rgba(0, 0, 0, 0.4); 
-        }}
-        .login-form-side {{ flex: 1; background-color: #000000; padding: 80px 100px; color: #FFFFFF; display: flex; flex-direction: column; justify-content: center; }}
-        
-        /* Image side text */
-        .welcome-text {{ font-size: 2.2rem; font-weight: 900; color: #FFFFFF; line-height: 1.2; z-index: 10; }}
-        
-        /* Wide Google Button Styling */
-        #google_wide_btn_container button {{
-            background-color: #111 !important;
-            color: #FFFFFF !important;
-            border: 1px solid #444 !important;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            padding: 10px 20px !important;
-            font-weight: 600 !important;
-            font-size: 1em !important;
-        }}
-        #google_wide_btn_container button:hover {{
-            background-color: #222 !important;
-        }}
-        #google_icon_in_btn {{
-            width: 20px;
-            height: 20px;
-            margin-left: 10px; 
-        }}
-
-        /* Login Tabs */
-        .login-tabs {{ display: flex; margin-bottom: 30px; }}
-        .login-tabs div {{ padding: 10px 20px; cursor: pointer; font-weight: 600; color: #AAAAAA; }}
-        .login-tabs .active {{ border-bottom: 3px solid #FF7F50; color: #FFFFFF; }}
-
-        /* Dashboard Specific Styles */
-        .dashboard-logo-img-container {{ text-align: center; margin-bottom: 30px; padding-top: 20px; }}
-        .dashboard-logo-img {{ max-width: 300px; height: auto; display: block; margin-left: auto; margin-right: auto; }}
-        
-        /* Sticky Note Styling */
-        .sticky-note {{
-            background-color: #FFFFAA; border: 1px solid #CCCC00; padding: 15px; border-radius: 5px;
-            margin-bottom: 5px; box-shadow: 3px 3px 5px rgba(0,0,0,0.3); position: relative;
-            transform: rotate(1deg); font-family: 'Permanent Marker', cursive; color: #000080; text-align: right; direction: rtl;
-        }}
-        .sticky-note-header {{
-            font-size: 1.5em; font-weight: bold; margin-bottom: 5px; color: #000080; border-bottom: 1px dashed #CCC;
-            padding-bottom: 5px; display: flex; justify-content: space-between; align-items: center;
-        }}
-        .sticky-note-body p, .sticky-note-footer {{
-            color: #000080 !important;
-        }}
-        .sticky-note-footer {{ display: flex; justify-content: space-between; align-items: center; padding-top: 10px; border-top: 1px dashed #CCC; }}
-        
-        /* Trash Can (now an instructional area) */
-        .trash-can-area {{ background-color: #222; border: 2px dashed #444; border-radius: 10px; padding: 30px; margin-top: 50px; text-align: center; color: #aaa; font-size: 1.2em; }}
-        </style>
-        <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0-beta3/css/all.min.css">
-        """
-        st.markdown(css, unsafe_allow_html=True)
+        # רק תגית link קצרה בכל ריצה - הגיליון עצמו נשמר במטמון הדפדפן לפי ה-?v=
+        st.markdown(theme.stylesheet_tag(), unsafe_allow_html=True)
 
 def apply_terminal_css():
     if 'dark_mode' not in st.session_state: st.session_state.dark_mode = True
@@ -213,10 +66,42 @@ def simulate_google_login_success():
     st.session_state['user_email'] = "google_user@stockpulse.com"
     st.rerun()
 
-@st.cache_data(ttl=30)
+# אפשרויות הגרף בכרטיסיית הניתוח
+CHART_PERIODS = {"1mo": "חודש", "3mo": "3 חודשים", "6mo": "6 חודשים", "1y": "שנה", "2y": "שנתיים", "5y": "5 שנים", "max": "הכל"}
+CHART_INDICATORS = {"sma20": "SMA 20", "sma50": "SMA 50", "ema20": "EMA 20", "bb": "Bollinger 20", "vwap": "VWAP", "rsi": "RSI 14"}
+CHART_INTERVALS = {"auto": "אוטומטי (לפי החלון)", "1d": "יומי", "1wk": "שבועי", "1h": "שעה", "15m": "15 דקות", "5m": "5 דקות", "1m": "דקה"}
+
+def add_indicator_traces(fig, data, selected, interval):
+    # האינדיקטורים מחושבים על הנרות המוצגים (אחרי האיחוד), כך שהם מתיישרים עם הגרף
+    close = data['Close'].to_numpy(dtype=float)
+
+    def line(values, name, color, row=1, dash=None):
+        fig.add_trace(go.Scatter(x=data.index, y=values, name=name, mode='lines',
+                                 line=dict(color=color, width=1.3, dash=dash)), row=row, col=1)
+
+    if "sma20" in selected:
+        line(indicators.sma(close, 20), "SMA 20", "#FFD700")
+    if "sma50" in selected:
+        line(indicators.sma(close, 50), "SMA 50", "#1E90FF")
+    if "ema20" in selected:
+        line(indicators.ema(close, 20), "EMA 20", "#DA70D6")
+    if "bb" in selected:
+        lower, middle, upper = indicators.bollinger(close, 20)
+        line(upper, "BB עליון", "#9999FF", dash="dot")
+        line(middle, "BB אמצע", "#9999FF")
+        line(lower, "BB תחתון", "#9999FF", dash="dot")
+    if "vwap" in selected:
+        # בנרות תוך-יומיים VWAP מתאפס בכל יום מסחר; בנרות יומיים הוא מצטבר מתחילת החלון
+        sessions = data.index.date if is_intraday(interval) else None
+        line(indicators.vwap(data['High'], data['Low'], close, data['Volume'], sessions), "VWAP", "#00CED1")
+    if "rsi" in selected:
+        line(indicators.rsi(close, 14), "RSI 14", "#FF7F50", row=2)
+        for level in (30, 70):
+            fig.add_hline(y=level, row=2, col=1, line_dash="dot", line_color="#666666")
+
 def get_top_metrics():
-    # Fallback hardcoded data
-    return {"S&P 500": (5142.78, 0.63), "NASDAQ": (16173.61, 0.81), "BTC": (68490.1, -1.25), "VIX": (15.55, 3.1)}
+    """(values, updated_at) מתמונת המצב המשותפת לכל הסשנים - לא מחכה לרשת"""
+    return get_market_snapshot().get()
 
 # ==========================================
 # 4. LOGIN PAGE
@@ -298,47 +183,304 @@ def login_page():
 # 5. MAIN DASHBOARD (מעודכן עם טאבים וקריאות משופרת)
 # ==========================================
 
-# פונקציה לבניית כרטיס התראה יחיד
-def render_alert_card(alert_data, alert_index):
-    # HTML עבור פתקית יחידה
-    st.markdown(f"""
+@st.cache_resource
+def get_rule_store():
+    # אותו מאגר כללים שה-scheduler סורק (גיליון או SQLite לפי STOCKWATCHER_RULE_STORE)
+    session = SheetSession()
+    return open_store(settings.RULE_STORE, get_sheet=session.sheet)
+
+ALERTS_PAGE_SIZE = 12
+ALERT_STATUSES = {"Active": "פעיל", "Archived": "בארכיון", "Deleted": "נמחק"}
+
+def _as_number(value):
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+def alert_card_html(rule):
+    # HTML של פתקית יחידה - בלי widgets, כך שכל העמוד נבנה כמחרוזת אחת
+    min_price, max_price = _as_number(rule.get('min_price')), _as_number(rule.get('max_price'))
+    change_pct, min_volume = _as_number(rule.get('change_pct')), _as_number(rule.get('min_volume'))
+    targets = []
+    if min_price:
+        targets.append(f"מתחת ל-${min_price:,.2f}")
+    if max_price:
+        targets.append(f"מעל ${max_price:,.2f}")
+    if change_pct:
+        targets.append(f"{change_pct:+.2f}%")
+    notes = html.escape(str(rule.get('notes') or "אין הערות."))
+    status = str(rule.get('status') or "")
+    last_alert = html.escape(str(rule.get('last_alert') or "")) or "-"
+    return f"""
     <div class="sticky-note">
         <div class="sticky-note-header">
-            {alert_data['ticker']} 
+            {html.escape(str(rule.get('symbol', '')))}
+            <span style="font-size: 0.5em;">#{html.escape(str(rule.get('rule_id') or rule.get('row') or ''))}</span>
         </div>
         <div class="sticky-note-body">
-            <p><strong>מחיר יעד:</strong> {alert_data['target']} ({alert_data['price']})</p>
-            <p><strong>ווליום מינ':</strong> {alert_data['volume']}</p>
+            <p><strong>יעד:</strong> {html.escape(" / ".join(targets) or "-")}</p>
+            <p><strong>ווליום מינ':</strong> {f"{min_volume:,.0f}" if min_volume else "-"}</p>
+            <p><strong>התראה אחרונה:</strong> {last_alert}</p>
             <p><strong>הערות:</strong></p>
             <p style="font-size:0.9em; margin-top: 5px; border-top: 1px dashed #CCC; padding-top: 5px;">
-                <em>"{alert_data['notes']}"</em>
+                <em>"{notes}"</em>
             </p>
         </div>
         <div class="sticky-note-footer">
-            <span>{alert_data['status']}</span>
-            <button style="background-color: #4CAF50; color: white; border: none; padding: 5px 10px; border-radius: 3px; cursor: pointer;">📊 גרף</button>
+            <span>{html.escape(ALERT_STATUSES.get(status, status))}</span>
+            <span>{"חד-פעמית" if str(rule.get('is_one_time')).upper() in ("TRUE", "1") else "חוזרת"}</span>
         </div>
-    </div>
-    """, unsafe_allow_html=True)
+    </div>"""
+
+def symbol_caption(info):
+    """שורת מטא-דאטה קצרה לסימול: שם · בורסה · מטבע · סוג"""
+    parts = [info.get('name'), info.get('exchange'), info.get('currency'), (info.get('asset_type') or '').title()]
+    return f"{info['symbol']}: " + " · ".join(part for part in parts if part)
+
+def _pick_symbol(symbol):
+    st.session_state.new_alert_ticker = symbol
+
+def render_symbol_suggestions(matches):
+    """כפתורי השלמה מתחת לשדה הסימול - לחיצה ממלאת את השדה"""
+    if not matches:
+        st.caption("אין סימול מוכר שמתחיל כך - הסימול ייבדק מול Yahoo בשמירה.")
+        return
+    for info in matches:
+        st.button(f"{info['symbol']} — {info.get('name') or info.get('exchange') or ''}", key=f"pick_symbol_{info['symbol']}",
+                  on_click=_pick_symbol, args=(info['symbol'],), type="secondary", use_container_width=True)
+
+def render_alert_board(store):
+    # סינון ודפדוף - המאגר מחזיר רק את העמוד המבוקש, כך ש-rerun לא תלוי במספר ההתראות
+    col_symbol, col_status, col_page = st.columns([2, 2, 1])
+    with col_symbol:
+        symbol_filter = st.text_input("סינון לפי סימול", key="alerts_symbol_filter").strip().upper()
+    with col_status:
+        status_filter = st.selectbox("סטטוס", ["Active", "Archived", ""], key="alerts_status_filter",
+                                     format_func=lambda status: ALERT_STATUSES.get(status, "הכל"))
+    # עמוד 1 כשהסינון משתנה
+    filters = (symbol_filter, status_filter)
+    if st.session_state.get("alerts_filters") != filters:
+        st.session_state.alerts_filters = filters
+        st.session_state.alerts_page = 1
+    board = st.container()
+
+    _, total = store.list_rules(symbol_filter, status_filter or None, 0, 0)
+    pages = max(1, -(-total // ALERTS_PAGE_SIZE))
+    st.session_state.alerts_page = min(st.session_state.get("alerts_page", 1), pages)
+    with col_page:
+        page = st.number_input("עמוד", min_value=1, max_value=pages, step=1, key="alerts_page")
+
+    rules, total = store.list_rules(symbol_filter, status_filter or None, (page - 1) * ALERTS_PAGE_SIZE, ALERTS_PAGE_SIZE)
+    closable = [rule for rule in rules if rule.get('status') == "Active"]
+    if closable:
+        # טופס אחד לסגירת התראות מהעמוד (במקום כפתור לכל פתקית)
+        with st.form("close_alerts_form", clear_on_submit=True):
+            to_close = st.multiselect("סגירת התראות", range(len(closable)),
+                                      format_func=lambda i: f"{closable[i]['symbol']} #{closable[i].get('rule_id') or closable[i].get('row')}")
+            if st.form_submit_button("🗑️ סגור התראות נבחרות", use_container_width=True, type="secondary") and to_close:
+                closed = 0
+                for i in to_close:
+                    rule = closable[i]
+                    # שורת גיליון בלי rule_id מזוהה לפי מספר השורה והסימול
+                    where = {} if rule.get('rule_id') else {'row': rule.get('row'), 'symbol': rule.get('symbol')}
+                    if store.set_status(rule.get('rule_id'), "Archived", **where):
+                        closed += 1
+                st.toast(f"{closed} התראות נסגרו.", icon="🗑️")
+                rules, total = store.list_rules(symbol_filter, status_filter or None,
+                                                (page - 1) * ALERTS_PAGE_SIZE, ALERTS_PAGE_SIZE)
+
+    with board:
+        if rules:
+            st.markdown('<div class="alert-board">' + "".join(alert_card_html(rule) for rule in rules) + '</div>',
+                        unsafe_allow_html=True)
+            st.caption(f"{total} התראות · עמוד {page} מתוך {pages}")
+        else:
+            st.info("אין התראות פעילות כרגע." if status_filter == "Active" and not symbol_filter else "לא נמצאו התראות.")
+
+JOURNAL_PAGE_SIZE = 50
+
+def render_journal_forms(journal):
+    note_tab, trade_tab = st.tabs(["📝 הערה", "💼 עסקה"])
+    with note_tab:
+        with st.form("journal_note_form", clear_on_submit=True):
+            note_day = st.date_input("תאריך", value=datetime.now().date(), key="journal_note_day")
+            note_symbol = st.text_input("סימול (אופציונלי)", key="journal_note_symbol")
+            note_tags = st.text_input("תגיות", placeholder="מופרדות בפסיק, למשל breakout, earnings", key="journal_note_tags")
+            note_text = st.text_area("הערת מסחר יומית", height=150, placeholder="רשום כאן את הניתוח והמסקנות שלך להיום...")
+            if st.form_submit_button("שמור רשומה", use_container_width=True, type="primary"):
+                if note_text.strip():
+                    journal.add_note(note_text, symbol=note_symbol, tags=note_tags, day=note_day)
+                    st.success("הרשומה נשמרה ביומן.")
+                else:
+                    st.error("הרשומה ריקה.")
+    with trade_tab:
+        with st.form("journal_trade_form", clear_on_submit=True):
+            col_symbol, col_side = st.columns(2)
+            trade_symbol = col_symbol.text_input("סימול", key="journal_trade_symbol")
+            trade_side = col_side.selectbox("כיוון", ["long", "short"], format_func=lambda side: "לונג" if side == "long" else "שורט")
+            col_qty, col_entry, col_exit = st.columns(3)
+            quantity = col_qty.number_input("כמות", min_value=0.0, value=None, placeholder="מניות")
+            entry_price = col_entry.number_input("מחיר כניסה", min_value=0.0, value=None)
+            exit_price = col_exit.number_input("מחיר יציאה", min_value=0.0, value=None, placeholder="ריק = פתוחה")
+            col_opened, col_closed, col_fees = st.columns(3)
+            opened = col_opened.date_input("נפתחה", value=datetime.now().date(), key="journal_trade_opened")
+            closed = col_closed.date_input("נסגרה", value=datetime.now().date(), key="journal_trade_closed")
+            fees = col_fees.number_input("עמלות", min_value=0.0, value=0.0)
+            trade_tags = st.text_input("תגיות", key="journal_trade_tags")
+            trade_text = st.text_area("הערות לעסקה", height=70)
+            if st.form_submit_button("שמור עסקה", use_container_width=True, type="primary"):
+                try:
+                    journal.add_trade(trade_symbol, trade_side, quantity, entry_price, exit_price=exit_price,
+                                      opened=opened, closed=closed if exit_price is not None else None,
+                                      fees=fees, tags=trade_tags, text=trade_text)
+                    st.success(f"העסקה ב-{trade_symbol.upper()} נשמרה.")
+                except (ValueError, AttributeError):
+                    st.error("הזן סימול, כמות ומחיר כניסה חיוביים.")
+
+    open_trades = journal.trade_table()
+    open_trades = open_trades[open_trades["exit_price"].isna()]
+    if len(open_trades):
+        with st.form("journal_close_form", clear_on_submit=True):
+            trade_id = st.selectbox("סגירת עסקה פתוחה", list(open_trades.index),
+                                    format_func=lambda i: f"{open_trades.at[i, 'symbol']} · {open_trades.at[i, 'quantity']:g} @ {open_trades.at[i, 'entry_price']:,.2f} ({open_trades.at[i, 'opened']})")
+            col_price, col_day = st.columns(2)
+            close_price = col_price.number_input("מחיר יציאה", min_value=0.0, value=None, key="journal_close_price")
+            close_day = col_day.date_input("תאריך", value=datetime.now().date(), key="journal_close_day")
+            if st.form_submit_button("סגור עסקה", use_container_width=True) and close_price:
+                journal.close_trade(trade_id, close_price, closed=close_day)
+                st.toast("העסקה נסגרה.", icon="✅")
+
+def render_journal(journal):
+    # הטפסים קודם - רשומה שנשמרה מופיעה כבר בתוצאות של אותה ריצה
+    col_entries, col_forms = st.columns([2, 1])
+    with col_forms:
+        render_journal_forms(journal)
+
+    with col_entries:
+        col_range, col_symbol, col_tag = st.columns([2, 1, 1])
+        today = datetime.now().date()
+        date_range = col_range.date_input("טווח תאריכים", value=(), max_value=today, key="journal_range")
+        symbol = col_symbol.selectbox("סימול", [""] + journal.symbols(), key="journal_symbol",
+                                      format_func=lambda value: value or "הכל")
+        tag = col_tag.selectbox("תגית", [""] + journal.tags(), key="journal_tag", format_func=lambda value: value or "הכל")
+        query = st.text_input("חיפוש בהערות", key="journal_query", placeholder="מילים מההערות (גם תחילת מילה)")
+        start = date_range[0] if len(date_range) > 0 else None
+        end = date_range[1] if len(date_range) > 1 else start
+        filters = dict(start=start, end=end, symbol=symbol or None, tag=tag or None, query=query or None)
+
+        trades = journal.trades(**filters)
+        stats = trade_stats(trades)
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("רווח/הפסד", f"{stats['total_pnl']:,.2f}")
+        m2.metric("אחוז הצלחה", "—" if stats['win_rate'] is None else f"{stats['win_rate']:.1f}%",
+                  help=f"{stats['closed']} עסקאות סגורות")
+        m3.metric("Profit factor", "—" if stats['profit_factor'] is None else f"{stats['profit_factor']:.2f}")
+        m4.metric("חשיפה פתוחה", f"{stats['gross_exposure']:,.0f}", help=f"{stats['open']} עסקאות פתוחות · נטו {stats['net_exposure']:,.0f}")
+
+        curve = equity_curve(trades)
+        if len(curve) > 1:
+            fig = go.Figure(go.Scatter(x=pd.to_datetime(curve.index), y=curve.values, mode="lines",
+                                       line=dict(color="#FF7F50"), name="P&L"))
+            fig.update_layout(title="רווח מצטבר", height=260, margin=dict(l=10, r=10, t=40, b=10),
+                              plot_bgcolor="#000000", paper_bgcolor="#000000", font=dict(color="#FFFFFF"),
+                              title_font_color="#FF7F50")
+            st.plotly_chart(fig, use_container_width=True)
+        if stats['closed']:
+            with st.expander("רווח לפי סימול / חודש"):
+                col_by_symbol, col_by_month = st.columns(2)
+                col_by_symbol.dataframe(pnl_by(trades, "symbol").round(2), use_container_width=True)
+                col_by_month.dataframe(pnl_by(trades, "month").round(2), use_container_width=True)
+
+        ids = journal.search_ids(**filters)
+        if not ids:
+            st.info("אין רשומות ביומן." if not any(filters.values()) else "לא נמצאו רשומות.")
+            return
+        for record in (journal.records[record_id] for record_id in ids[:JOURNAL_PAGE_SIZE]):
+            header = f"**{record['date']}**" + (f" · {record['symbol']}" if record.get('symbol') else "")
+            if record.get('kind') == "trade":
+                side = "לונג" if record.get('side') == "long" else "שורט"
+                if record.get('exit_price') is None:
+                    header += f" · 💼 {side} {record['quantity']:g} @ {record['entry_price']:,.2f} (פתוחה)"
+                else:
+                    pnl = trades.at[record['id'], 'pnl'] if record['id'] in trades.index else None
+                    header += f" · 💼 {side} {record['quantity']:g} @ {record['entry_price']:,.2f} → {record['exit_price']:,.2f}"
+                    if pnl is not None:
+                        header += f" · {'🟢' if pnl >= 0 else '🔴'} {pnl:,.2f}"
+            if record.get('tags'):
+                header += " · " + " ".join(f"`#{tag}`" for tag in record['tags'])
+            st.markdown(header)
+            if record.get('text'):
+                st.markdown(f'<div class="rtl" style="color:#CCCCCC;">{html.escape(record["text"])}</div>', unsafe_allow_html=True)
+        st.caption(f"{len(ids)} רשומות" + (f" · מוצגות {JOURNAL_PAGE_SIZE} האחרונות" if len(ids) > JOURNAL_PAGE_SIZE else ""))
+
+TRIGGER_SIDES = {'min': "📉 מתחת ל-", 'max': "🚀 מעל ", 'change': "📈 שינוי ", 'volume': "📊 ווליום מעל "}
+
+# פאנל ההתראות האחרונות מתרענן לבד - כל רענון קורא מהמאגר רק את ההתראות שנוספו מאז (החלון משותף לכל הסשנים)
+@st.fragment(run_every=settings.TRIGGER_FEED_SECONDS)
+def render_recent_triggers():
+    feed = get_trigger_feed()
+    try:
+        feed.poll()
+    except Exception as e:
+        st.caption(f"היסטוריית ההתראות לא זמינה: {e}")
+        return
+    triggers = feed.latest()
+    # הסשן זוכר את ה-seq האחרון שהוצג לו - מה שמעליו חדש בשבילו (גם אם סשן אחר כבר קרא אותו מהמאגר)
+    seen = st.session_state.get("triggers_seen_seq")
+    if seen is not None:
+        for trigger in [trigger for trigger in triggers if trigger.seq > seen][:3]:
+            st.toast(f"{trigger.symbol}: {trigger.message or trigger.side}", icon="🔥")
+    if not triggers:
+        st.caption("עוד לא הופעלו התראות.")
+        return
+    rows = []
+    for trigger in triggers:
+        when = datetime.fromtimestamp(trigger.triggered_at).strftime('%d/%m %H:%M')
+        if trigger.threshold is None:
+            threshold = ""
+        else:
+            threshold = f"{trigger.threshold:+g}%" if trigger.side == 'change' else (
+                f"{trigger.threshold:,.0f}" if trigger.side == 'volume' else f"{trigger.threshold:g}")
+        price = "—" if trigger.price is None else f"${trigger.price:,.2f}"
+        fresh = " 🆕" if seen is not None and trigger.seq > seen else ""
+        rows.append(f"<div class='rtl' style='padding: 4px 0; border-bottom: 1px solid #222;'>"
+                    f"<strong>{html.escape(trigger.symbol)}</strong> · {TRIGGER_SIDES.get(trigger.side, trigger.side)}{threshold}"
+                    f" · {price} <span style='color:#888; font-size:0.85em;'>({when} · #{html.escape(trigger.rule_id)})</span>{fresh}</div>")
+    st.markdown("".join(rows), unsafe_allow_html=True)
+    st.session_state.triggers_seen_seq = triggers[0].seq
+
+# שורת המדדים מתרעננת לבד (fragment) - קוראת שוב את תמונת המצב המשותפת בלי להריץ את כל העמוד
+@st.fragment(run_every=settings.MARKET_SNAPSHOT_SECONDS)
+def render_top_metrics():
+    metrics, updated_at = get_top_metrics()
+    m1, m2, m3, m4 = st.columns(4)
+    
+    def show_metric(col, label, key_name):
+        if key_name not in metrics:
+            col.metric(label=label, value="—") # עוד לא הגיע רענון ראשון
+            return
+        val, chg = metrics[key_name]
+        col.metric(
+            label=label, 
+            value=f"{val:,.2f}", 
+            delta=f"{chg:.2f}%"
+        )
 
-    # כפתור סגירת ההתראה שמחובר ללוגיקת מחיקה
-    if st.button(f"🗑️ סגור התראה {alert_data['ticker']}", key=f"delete_alert_{alert_index}", use_container_width=True, type="secondary"):
-        st.toast(f"התראת {alert_data['ticker']} נסגרה.", icon="🗑️")
-        # מחיקת ההתראה מהרשימה בזיכרון
-        del st.session_state.active_alerts[alert_index]
-        st.rerun()
-    st.markdown('<div style="margin-bottom: 15px;"></div>', unsafe_allow_html=True) # רווח בין פתקיות
+    show_metric(m1, "S&P 500", "S&P 500")
+    show_metric(m2, "NASDAQ 100", "NASDAQ")
+    show_metric(m3, "BITCOIN", "BTC")
+    show_metric(m4, "VIX Index", "VIX")
+
+    if updated_at is None:
+        st.caption("⏳ טוען נתוני שוק...")
+    else:
+        age = datetime.now().timestamp() - updated_at
+        stale = " (הנתונים לא עודכנו לאחרונה)" if age > 3 * settings.MARKET_SNAPSHOT_SECONDS else ""
+        st.caption(f"עודכן לאחרונה: {datetime.fromtimestamp(updated_at).strftime('%H:%M:%S')}{stale}")
 
 def main_dashboard():
     
-    # --- הגדרת התראות לדוגמה (אלא אם כבר הוגדרו בזיכרון) ---
-    if 'active_alerts' not in st.session_state:
-        st.session_state.active_alerts = [
-            {"ticker": "NVDA", "target": "+5.00%", "price": "$180.00", "volume": "10M", "notes": "לבדוק דוחות כספיים לפני כניסה.", "status": "פעיל"},
-            {"ticker": "TSLA", "target": "-3.00%", "price": "$250.00", "volume": "5M", "notes": "מצפה לתיקון טכני אחרי אירוע.", "status": "פעיל"},
-            {"ticker": "MSFT", "target": "+10.00%", "price": "$450.00", "volume": "8M", "notes": "התבססות מעל התנגדות קודמת.", "status": "פעיל"},
-        ]
-    
     # --- 0. Logo at the Top ---
     st.markdown(f"""
         <div class="dashboard-logo-img-container">
@@ -349,21 +491,7 @@ def main_dashboard():
     # --- 1. Top Metrics Row (כותרת נתוני שוק חיה) ---
     st.markdown('<h2 class="rtl">📊 נתוני שוק חיים</h2>', unsafe_allow_html=True) 
     
-    metrics = get_top_metrics() 
-    m1, m2, m3, m4 = st.columns(4)
-    
-    def show_metric(col, label, key_name):
-        val, chg = metrics.get(key_name, (0, 0))
-        col.metric(
-            label=label, 
-            value=f"{val:,.2f}", 
-            delta=f"{chg:.2f}%"
-        )
-
-    show_metric(m1, "S&P 500", "S&P 500")
-    show_metric(m2, "NASDAQ 100", "NASDAQ")
-    show_metric(m3, "BITCOIN", "BTC")
-    show_metric(m4, "VIX Index", "VIX")
+    render_top_metrics()
 
     st.write("---")
 
@@ -383,28 +511,65 @@ def main_dashboard():
             st.markdown('<div class="rtl" style="background: #111; padding: 20px; border-radius: 10px; border: 1px solid #444;">', unsafe_allow_html=True)
             st.markdown('<h3 class="rtl">➕ צור התראה חדשה</h3>', unsafe_allow_html=True)
             
+            # הסימול מחוץ לטופס, כדי שההשלמה תתעדכן כבר בהקלדה (Enter / יציאה מהשדה) ולא רק בשליחה
+            new_ticker = st.text_input("Ticker", key="new_alert_ticker", placeholder="סימול המניה או שם החברה").strip().upper()
+            registry = get_symbol_registry()
+            ticker_info = registry.get(new_ticker) if new_ticker else None
+            if ticker_info:
+                st.caption(symbol_caption(ticker_info))
+            elif new_ticker:
+                render_symbol_suggestions(registry.search(new_ticker, limit=6))
+
             with st.form("create_alert_form_tab1", clear_on_submit=True):
-                new_ticker = st.text_input("Ticker", value="", placeholder="סימול המניה").upper()
-                target_price = st.number_input("שינוי מחיר (%)", value=5.0, placeholder="יעד ב-%")
-                min_vol = st.text_input("ווליום מינימלי", value="10M", placeholder="ווליום מינ' (למשל 10M)")
+                target_price = st.number_input("שינוי מחיר (%)", value=None, placeholder="אופציונלי, למשל 5 או -3")
+                col_below, col_above = st.columns(2)
+                with col_below:
+                    below_price = st.number_input("ירידה מתחת ל-($)", value=None, min_value=0.0, placeholder="אופציונלי")
+                with col_above:
+                    above_price = st.number_input("עלייה מעל ($)", value=None, min_value=0.0, placeholder="אופציונלי")
+                min_vol = st.text_input("ווליום מינימלי", value="", placeholder="אופציונלי, למשל 10M")
+                is_one_time = st.checkbox("התראה חד-פעמית", value=True)
                 whatsapp_notify = st.checkbox("התראה בווצאפ", value=True)
+                phone = st.text_input("מספר וואטסאפ", value=st.session_state.get("whatsapp_phone", ""), placeholder="+972501234567")
                 alert_notes = st.text_area("הערות להתראה", height=70, placeholder="הוסף כאן הערות חשובות על התראה זו...")
 
                 submitted = st.form_submit_button("הוסף התראה", use_container_width=True, type="primary")
                 
-                if submitted and new_ticker: 
-                    new_alert = {
-                        "ticker": new_ticker, 
-                        "target": f"+{target_price:.2f}%", 
-                        "price": "N/A", 
-                        "volume": min_vol, 
-                        "notes": alert_notes if alert_notes else "אין הערות.", 
-                        "status": "פעיל"
-                    }
-                    st.session_state.active_alerts.append(new_alert)
-                    st.success(f"התראה ל-{new_ticker} נוצרה! רענון...") 
-                    st.rerun() # רענון כדי שהפתקית החדשה תופיע מיד
-                elif submitted and not new_ticker:
+                try:
+                    # אותו פרסור כמו בסורק (10M, 2.5K, 1,200,000)
+                    parsed_volume = parse_volume(min_vol)
+                except ValueError:
+                    parsed_volume = None
+                    if submitted:
+                        st.error("ווליום לא תקין - השתמש במספר או בקיצור כמו 10M / 500K.")
+                        submitted = False
+
+                if submitted and new_ticker and not (target_price or below_price or above_price or parsed_volume):
+                    st.error("הגדר לפחות תנאי אחד: שינוי %, מחיר או ווליום.")
+                elif submitted and new_ticker:
+                    try:
+                        # סימול שלא ביקום נבדק מול Yahoo פעם אחת; סימול שלא קיים נשמר במטמון השלילי
+                        ticker_info = registry.resolve(new_ticker)
+                        ticker_error = None if ticker_info else f"הסימול {new_ticker} לא נמצא."
+                    except Exception:
+                        ticker_info, ticker_error = None, None
+                        st.warning(f"לא ניתן לאמת את {new_ticker} כרגע (Yahoo לא זמין) - ההתראה תישמר בכל זאת.")
+                    if ticker_error:
+                        st.error(ticker_error)
+                        submitted = False
+
+                if submitted and new_ticker and (target_price or below_price or above_price or parsed_volume):
+                    st.session_state.whatsapp_phone = phone
+                    try:
+                        # נכתב ישר למאגר שה-scheduler סורק; הלוח שמתחת נטען אחרי הכתיבה, כך שאין צורך ב-rerun
+                        get_rule_store().add_rule(new_ticker, min_price=below_price, max_price=above_price,
+                                                  is_one_time=is_one_time, phone=phone if whatsapp_notify else "",
+                                                  change_pct=target_price or None, min_volume=parsed_volume,
+                                                  notes=alert_notes.strip())
+                        st.success(f"התראה ל-{new_ticker} נוצרה!" + (f" ({symbol_caption(ticker_info)})" if ticker_info else ""))
+                    except Exception as e:
+                        st.error(f"שמירת ההתראה נכשלה: {e}")
+                if submitted and not new_ticker:
                     st.error("אנא הזן סימול מניה.")
             
             st.markdown('</div>', unsafe_allow_html=True)
@@ -412,13 +577,13 @@ def main_dashboard():
         # --- צד שמאל: רשימת התראות (Alert List) ---
         with col_list:
             st.markdown('<h3 class="rtl">🔔 התראות פעילות</h3>', unsafe_allow_html=True)
-            
-            if st.session_state.active_alerts:
-                # לולאה שיוצרת פתקית וכפתור מחיקה עבור כל התראה
-                for i, alert in enumerate(st.session_state.active_alerts):
-                    render_alert_card(alert, i)
-            else:
-                st.info("אין התראות פעילות כרגע.")
+            try:
+                render_alert_board(get_rule_store())
+            except Exception as e:
+                st.error(f"שגיאה בטעינת ההתראות: {e}")
+
+            st.markdown('<h3 class="rtl">🔥 התראות שהופעלו לאחרונה</h3>', unsafe_allow_html=True)
+            render_recent_triggers()
 
          
     # =========================================================================
@@ -428,27 +593,56 @@ def main_dashboard():
         st.markdown('<h3 class="rtl">🔍 ניתוח נתונים וגרפים</h3>', unsafe_allow_html=True)
         # דוגמה לניתוח מניה
         stock_ticker = st.text_input("הזן סימול מניה (לדוגמה: AAPL, TSLA)", "AAPL", key="stock_analysis_ticker").upper()
+        col_period, col_interval, col_indicators = st.columns(3)
+        with col_period:
+            chart_period = st.selectbox("תקופה", list(CHART_PERIODS), index=2, format_func=CHART_PERIODS.get, key="stock_analysis_period")
+        with col_interval:
+            chart_interval = st.selectbox("נר", list(CHART_INTERVALS), format_func=CHART_INTERVALS.get, key="stock_analysis_interval")
+        with col_indicators:
+            chart_overlays = st.multiselect("אינדיקטורים", list(CHART_INDICATORS), format_func=CHART_INDICATORS.get, key="stock_analysis_indicators")
         st.info(f"מציג נתונים היסטוריים וגרף עבור: **{stock_ticker}**")
         
         # הדמיית גרף
         if stock_ticker:
             try:
-                # הורדת נתונים באמצעות yfinance
-                data = yf.download(stock_ticker, period="6mo", interval="1d")
+                # נרות יומיים לכל התקופה קובעים את גבולות החלון; הגרף עצמו נטען רק לחלון הנבחר
+                overview = get_history_store().get(stock_ticker, chart_period, "1d")
+                if not overview.empty:
+                    first_day, last_day = overview.index[0].date(), datetime.now().date()
+                    window = st.slider("חלון תצוגה (זום)", min_value=first_day, max_value=last_day,
+                                       value=(first_day, last_day), format="DD/MM/YYYY",
+                                       key=f"stock_analysis_window_{stock_ticker}_{chart_period}")
+                    window_start = pd.Timestamp(window[0]).timestamp()
+                    window_end = pd.Timestamp(window[1]).timestamp() + 86400
+                    lookback = MAX_LOOKBACK_DAYS.get(chart_interval)
+                    if lookback is not None and window_start < datetime.now().timestamp() - lookback * 86400:
+                        st.caption("ב-Yahoo נרות תוך-יומיים זמינים לתקופה מוגבלת - מוצג הטווח הזמין")
+                    # אינטרוול לפי אורך החלון, ואיחוד נרות בצד השרת לפי תקציב הנקודות
+                    data, loaded_interval, factor = chart_data.load_window(
+                        stock_ticker, window_start, window_end, chart_interval, store=get_history_store())
+                else:
+                    data = overview
                 if not data.empty:
-                    fig = go.Figure(data=[go.Candlestick(
+                    bars_note = f" · כל נר מאחד {factor} נרות" if factor > 1 else ""
+                    st.caption(f"{len(data)} נרות · {CHART_INTERVALS[loaded_interval]}{bars_note}")
+                    show_rsi = "rsi" in chart_overlays
+                    fig = make_subplots(rows=2 if show_rsi else 1, cols=1, shared_xaxes=True, vertical_spacing=0.03,
+                                        row_heights=[0.75, 0.25] if show_rsi else [1.0])
+                    fig.add_trace(go.Candlestick(
                         x=data.index,
                         open=data['Open'],
                         high=data['High'],
                         low=data['Low'],
                         close=data['Close'],
+                        name=stock_ticker,
                         increasing_line_color='green', # נרות עולים
                         decreasing_line_color='red'   # נרות יורדים
-                        )])
+                        ), row=1, col=1)
+                    add_indicator_traces(fig, data, chart_overlays, loaded_interval)
 
                     fig.update_layout(
                         xaxis_rangeslider_visible=False,
-                        title=f'{stock_ticker} - גרף נרות (6 חודשים)',
+                        title=f'{stock_ticker} - גרף נרות ({CHART_PERIODS[chart_period]}, {CHART_INTERVALS[loaded_interval]})',
                         xaxis_title="תאריך",
                         yaxis_title="מחיר (USD)",
                         plot_bgcolor="#000000", # רקע גרף שחור
@@ -464,13 +658,14 @@ def main_dashboard():
 
 
     # =========================================================================
-    # כרטיסייה 3: יומן מסחר (placeholder)
+    # כרטיסייה 3: יומן מסחר
     # =========================================================================
     with tab3:
         st.markdown('<h3 class="rtl">📖 רישום עסקאות יומי</h3>', unsafe_allow_html=True)
-        st.info("כאן תוכל לנהל את יומן המסחר שלך ולעקוב אחר ביצועי העסקאות.")
-        st.text_area("הערת מסחר יומית", height=150, placeholder="רשום כאן את הניתוח והמסקנות שלך להיום...")
-        st.button("שמור רשומה", key="save_journal", type="primary")
+        try:
+            render_journal(get_journal())
+        except Exception as e:
+            st.error(f"שגיאה בטעינת היומן: {e}")
 
     # --- יציאה ---
     st.write("---")
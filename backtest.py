@@ -0,0 +1,251 @@
+# קובץ: backtest.py
+# בדיקה היסטורית של הכללים: מתי כל כלל היה מופעל על הנרות השמורים, באותו היגיון של check_alerts
+# הרצה: python backtest.py --interval 1m --start 2025-01-01 [--symbols AAPL,MSFT] [--out events.csv]
+#
+# כל נר הוא "סריקה": כלל מופעל כשה-Close <= min_price או >= max_price, כשהשינוי היומי (מול סגירת
+# יום המסחר הקודם) עבר את change_pct, או כשהווליום היומי המצטבר עבר את min_volume - שגם חוסם
+# את שאר התנאים של הכלל עד שהוא מתמלא. בסריקה אחת כלל מופעל פעם אחת לכל היותר (min, max, change,
+# volume - לפי הסדר). חד-פעמי: רק ההפעלה הראשונה. חוזר: שוב רק אחרי ה-cooldown מההפעלה הקודמת.
+# הכל וקטורי (numpy) על סדרת המחירים של כל סימול - בלי לולאה על הנרות.
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import settings
+from history_store import get_history_store
+
+SIDES = np.array(['min', 'max', 'change', 'volume'])
+
+SUMMARY_COLUMNS = ['symbol', 'min_price', 'max_price', 'change_pct', 'min_volume', 'one_time',
+                   'bars', 'triggers', 'first_trigger', 'last_trigger']
+EVENT_COLUMNS = ['rule', 'symbol', 'time', 'side', 'price']
+
+def _epoch_ns(index):
+    """אינדקס הזמנים כ-int64 ננו-שניות UTC"""
+    if getattr(index, 'tz', None) is not None:
+        index = index.tz_convert(None)
+    return np.asarray(index, dtype='datetime64[ns]').astype(np.int64)
+
+def session_signals(bars):
+    """
+    לכל נר: (שינוי % מול סגירת יום המסחר הקודם, ווליום מצטבר מתחילת היום) - כמו ה-snapshot היומי
+    של indicators בזמן הנר. בנרות יומיים זה פשוט השינוי מול הנר הקודם והווליום של הנר.
+    """
+    close = bars['Close'].to_numpy(dtype=float)
+    n = len(close)
+    if not n:
+        return np.empty(0), np.empty(0)
+    index = bars.index
+    days = index.normalize() if isinstance(index, pd.DatetimeIndex) else pd.DatetimeIndex(index).normalize()
+    day_codes = np.concatenate(([0], np.cumsum(days[1:] != days[:-1])))
+    day_starts = np.flatnonzero(np.concatenate(([True], day_codes[1:] != day_codes[:-1])))
+    day_ends = np.concatenate((day_starts[1:] - 1, [n - 1]))
+
+    previous_close = np.concatenate(([np.nan], close[day_ends[:-1]]))[day_codes]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = (close / previous_close - 1) * 100
+
+    if 'Volume' in bars:
+        volume = np.nan_to_num(bars['Volume'].to_numpy(dtype=float))
+        total = np.cumsum(volume)
+        before_day = np.concatenate(([0.0], total))[day_starts]
+        day_volume = total - before_day[day_codes]
+    else:
+        day_volume = np.full(n, np.nan)
+    return change, day_volume
+
+def _cooldown_hits(hits, times, cooldown_ns):
+    """מתוך הנרות שבהם התנאי התקיים - אלה שבהם הכלל באמת שולח (לא בתוך ה-cooldown מההפעלה הקודמת)"""
+    if cooldown_ns <= 0 or len(hits) < 2:
+        return hits
+    at = times[hits]
+    # לכל הפעלה אפשרית: המיקום של ההפעלה הבאה שמותרת אחריה
+    following = np.searchsorted(at, at + cooldown_ns, side='left').tolist()
+    chosen, i, n = [], 0, len(hits)
+    while i < n: # לולאה על ההפעלות בלבד (לכל היותר טווח הזמן / cooldown), לא על הנרות
+        chosen.append(i)
+        i = following[i]
+    return hits[chosen]
+
+def replay_symbol(rules, bars, cooldown=None, touch=False):
+    """
+    ההפעלות של הכללים של סימול אחד על הנרות שלו.
+    touch=True: סף תחתון נבדק מול ה-Low וסף עליון מול ה-High של הנר (נגיעה תוך כדי הנר) במקום ה-Close.
+    מחזיר {rule.key: (אינדקסים של הנרות, מערך side, מערך מחירים)}.
+    """
+    cooldown = settings.NOTIFY_COOLDOWN_SECONDS if cooldown is None else cooldown
+    results = {}
+    if bars is None or bars.empty:
+        return results
+    bars = bars[bars['Close'].notna()]
+    if bars.empty:
+        return results
+    close = bars['Close'].to_numpy(dtype=float)
+    low = bars['Low'].to_numpy(dtype=float) if touch and 'Low' in bars else close
+    high = bars['High'].to_numpy(dtype=float) if touch and 'High' in bars else close
+    low, high = np.where(np.isnan(low), close, low), np.where(np.isnan(high), close, high)
+    times = _epoch_ns(bars.index)
+    signals = None
+    # מינימום/מקסימום רץ - ההפעלה הראשונה של כלל מחיר חד-פעמי היא חיפוש בינארי, בלי מסכה לכל כלל
+    running_low = -np.fmin.accumulate(low)  # עולה (מונוטוני) - מתאים ל-searchsorted
+    running_high = np.fmax.accumulate(high)
+    n = len(close)
+
+    for rule in rules:
+        if rule.is_one_time and not rule.needs_signals:
+            first_min = np.searchsorted(running_low, -rule.min_price, side='left') if rule.min_price is not None else n
+            first_max = np.searchsorted(running_high, rule.max_price, side='left') if rule.max_price is not None else n
+            first = min(first_min, first_max)
+            if first < n:
+                side = 0 if first_min == first else 1
+                results[rule.key] = (np.array([first]), SIDES[[side]], np.array([low[first] if side == 0 else high[first]]))
+            else:
+                results[rule.key] = (np.empty(0, dtype=np.int64), SIDES[:0], np.empty(0))
+            continue
+
+        if rule.needs_signals and signals is None:
+            signals = session_signals(bars)
+        volume_ok = signals[1] >= rule.min_volume if rule.min_volume is not None else None
+        masks = [
+            low <= rule.min_price if rule.min_price is not None else None,
+            high >= rule.max_price if rule.max_price is not None else None,
+            None,
+            None,
+        ]
+        if rule.change_pct is not None:
+            change = signals[0]
+            masks[2] = change >= rule.change_pct if rule.change_pct > 0 else change <= rule.change_pct
+        if volume_ok is not None:
+            masks = [m & volume_ok if m is not None else None for m in masks]
+            if rule.min_price is None and rule.max_price is None and rule.change_pct is None:
+                masks[3] = volume_ok
+        present = [m for m in masks if m is not None]
+        if not present:
+            continue
+        hits = np.flatnonzero(np.logical_or.reduce(present))
+        hits = hits[:1] if rule.is_one_time else _cooldown_hits(hits, times, int(cooldown * 1e9))
+
+        # הצד של כל הפעלה - הראשון (לפי הסדר) שהתקיים בנר
+        conditions = [m[hits] if m is not None else np.zeros(len(hits), dtype=bool) for m in masks]
+        side = np.select(conditions, [0, 1, 2, 3], default=3)
+        price = np.select([side == 0, side == 1], [low[hits], high[hits]], default=close[hits])
+        results[rule.key] = (hits, SIDES[side], price)
+    return results
+
+def run_backtest(rules, bars, cooldown=None, touch=False):
+    """
+    rules: כללים מקומפלים (CompiledRule, למשל store.index). bars: {symbol: DataFrame} או פונקציה symbol -> DataFrame
+    (נקראת פעם אחת לכל סימול, כך שאפשר לטעון סימול-סימול בלי להחזיק את כל ההיסטוריה בזיכרון).
+    מחזיר (summary, events): summary - שורה לכל כלל עם מספר ההפעלות, הראשונה והאחרונה;
+    events - שורה לכל הפעלה (rule, symbol, time, side, price).
+    """
+    load = bars.get if isinstance(bars, dict) else bars
+    by_symbol = {}
+    for rule in rules:
+        by_symbol.setdefault(rule.symbol, []).append(rule)
+
+    summary, events = [], []
+    empty = (np.empty(0, dtype=np.int64), SIDES[:0], np.empty(0))
+    for symbol in sorted(by_symbol):
+        frame = load(symbol)
+        # נרות בלי Close לא נחשבים (גם לא במספר הנרות), כך שהאינדקסים של replay_symbol תואמים ל-frame
+        frame = frame[frame['Close'].notna()].sort_index() if frame is not None and not frame.empty else None
+        rules_here = by_symbol[symbol]
+        fired = replay_symbol(rules_here, frame, cooldown, touch)
+        results = [fired.get(rule.key, empty) for rule in rules_here]
+        counts = np.array([len(hits) for hits, _, _ in results], dtype=np.int64)
+
+        # אינדקס הזמנים נשלף פעם אחת לכל סימול (ולא לכל כלל)
+        first = np.array([hits[0] if len(hits) else -1 for hits, _, _ in results], dtype=np.int64)
+        last = np.array([hits[-1] if len(hits) else -1 for hits, _, _ in results], dtype=np.int64)
+        if frame is not None:
+            first_at = frame.index[np.maximum(first, 0)].where(first >= 0)
+            last_at = frame.index[np.maximum(last, 0)].where(last >= 0)
+        else:
+            first_at = last_at = [pd.NaT] * len(rules_here)
+        summary.append(pd.DataFrame({
+            'symbol': symbol,
+            'min_price': [rule.min_price for rule in rules_here],
+            'max_price': [rule.max_price for rule in rules_here],
+            'change_pct': [rule.change_pct for rule in rules_here],
+            'min_volume': [rule.min_volume for rule in rules_here],
+            'one_time': [rule.is_one_time for rule in rules_here],
+            'bars': 0 if frame is None else len(frame),
+            'triggers': counts,
+            'first_trigger': first_at,
+            'last_trigger': last_at,
+        }, index=pd.Index([rule.key for rule in rules_here], name='rule')))
+
+        if counts.sum():
+            hits = np.concatenate([hits for hits, _, _ in results])
+            events.append(pd.DataFrame({
+                'rule': np.repeat(np.array([rule.key for rule in rules_here], dtype=object), counts),
+                'symbol': symbol,
+                'time': frame.index[hits],
+                'side': np.concatenate([sides for _, sides, _ in results]),
+                'price': np.concatenate([prices for _, _, prices in results]),
+            }))
+
+    summary = pd.concat(summary) if summary else pd.DataFrame(columns=SUMMARY_COLUMNS)
+    events = pd.concat(events, ignore_index=True) if events else pd.DataFrame(columns=EVENT_COLUMNS)
+    return summary, events
+
+def stored_bars(interval='1d', start=None, end=None, store=None):
+    """טוען נרות מהמאגר המקומי (history_store) בלבד - בלי רשת"""
+    store = store or get_history_store()
+    return lambda symbol: store.stored(symbol, interval, start, end)
+
+# ==========================================
+# הרצה משורת הפקודה
+# ==========================================
+def _epoch(text):
+    if not text:
+        return None
+    stamp = pd.Timestamp(text)
+    return (stamp if stamp.tzinfo else stamp.tz_localize('UTC')).timestamp()
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the active alert rules against stored historical bars")
+    parser.add_argument("--interval", default="1d", help="bar interval stored by history_store (e.g. 1d, 5m, 1m)")
+    parser.add_argument("--start", help="first bar to replay (date or timestamp, UTC)")
+    parser.add_argument("--end", help="last bar to replay (date or timestamp, UTC)")
+    parser.add_argument("--store", choices=["sheet", "sqlite"], default=settings.RULE_STORE, help="where rules are stored")
+    parser.add_argument("--symbols", help="comma separated symbols to replay (default: every symbol with an active rule)")
+    parser.add_argument("--cooldown", type=float, default=settings.NOTIFY_COOLDOWN_SECONDS,
+                        help="seconds before a recurring rule can fire again")
+    parser.add_argument("--touch", action="store_true", help="test thresholds against each bar's low/high instead of its close")
+    parser.add_argument("--out", help="write every trigger to this CSV file")
+    args = parser.parse_args()
+
+    from rule_store import open_store
+    from sheet_sync import SheetSession
+
+    store = open_store(args.store, get_sheet=SheetSession().sheet)
+    store.sync()
+    rules = list(store.index)
+    if args.symbols:
+        wanted = {s.strip().upper() for s in args.symbols.split(",")}
+        rules = [rule for rule in rules if rule.symbol in wanted]
+    print(f"⏪ Replaying {len(rules)} rules on {len({r.symbol for r in rules})} symbols ({args.interval} bars)...")
+
+    started = time.perf_counter()
+    summary, events = run_backtest(rules, stored_bars(args.interval, _epoch(args.start), _epoch(args.end)),
+                                   cooldown=args.cooldown, touch=args.touch)
+    elapsed = time.perf_counter() - started
+    bar_total = int(summary.groupby('symbol')['bars'].first().sum()) if len(summary) else 0
+    print(f"✅ {bar_total:,} bars, {len(events):,} triggers in {elapsed:.2f}s")
+    missing = summary.loc[summary['bars'] == 0, 'symbol'].unique()
+    if len(missing):
+        print(f"⚠️ No stored {args.interval} bars for: {', '.join(missing)}")
+
+    with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.max_rows', 50):
+        print(summary.sort_values('triggers', ascending=False).head(50))
+    if args.out:
+        events.to_csv(args.out, index=False)
+        print(f"📄 Triggers written to {args.out}")
+
+if __name__ == "__main__":
+    main()
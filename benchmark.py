@@ -0,0 +1,329 @@
+# קובץ: benchmark.py
+# בנצ'מרק לסריקת ההתראות - בלי גוגל ובלי Yahoo
+#
+# מריץ את check_alerts מול גיליון מדומה (FakeWorksheet) וספק מחירים מדומה (FakePriceProvider)
+# על סטים סינתטיים של כללים, ומודד זמן, מספר קריאות API, זיכרון שיא וקצב בדיקת כללים.
+# התוצאות נשמרות ל-JSON כדי להשוות בין גרסאות:
+#   python benchmark.py --sizes 100,10000,100000 --out before.json
+#   python benchmark.py --out after.json --compare before.json
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+# הבנצ'מרק לא נוגע במטמון ובקבצי הנתונים האמיתיים
+os.environ.setdefault("STOCKWATCHER_DATA_DIR", tempfile.mkdtemp(prefix="stockwatcher-bench-"))
+# כל הכללים נסרקים בכל שעה - הבנצ'מרק מודד את הסריקה, לא את לוח המסחר
+os.environ.setdefault("STOCKWATCHER_MARKET_HOURS", "0")
+
+import notifier
+import scheduler
+from gspread.utils import a1_to_rowcol
+from rule_store import SheetRuleStore, SQLiteRuleStore
+from sharding import ShardedStore, ShardSpec
+
+HEADERS = ['symbol', 'min_price', 'max_price', 'is_one_time', 'phone', 'created_at', 'status', 'last_alert', 'rule_id']
+
+# ==========================================
+# גיליון מדומה
+# ==========================================
+def _col_number(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n
+
+class FakeSpreadsheet:
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+
+    def get_lastUpdateTime(self):
+        self.worksheet.calls['get_lastUpdateTime'] += 1
+        return str(self.worksheet.revision)
+
+class FakeWorksheet:
+    """
+    worksheet בזיכרון עם אותו ממשק שהקוד משתמש בו ב-gspread.
+    calls סופר כמה פעמים נקראה כל פעולת API.
+    """
+
+    def __init__(self, values, latency=0.0):
+        self.values = values
+        self.latency = latency
+        self.revision = 1
+        self.calls = Counter()
+        self.spreadsheet = FakeSpreadsheet(self)
+
+    def _api(self, name):
+        self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _changed(self):
+        self.revision += 1
+
+    @property
+    def col_count(self):
+        return max(len(row) for row in self.values)
+
+    def _range(self, a1):
+        match = re.match(r"^(\d+):(\d+)$", a1)
+        if match:
+            return [list(row) for row in self.values[int(match.group(1)) - 1:int(match.group(2))]]
+        c1, r1, c2, r2 = re.match(r"^([A-Z]+)(\d*):([A-Z]+)(\d*)$", a1).groups()
+        r1, r2 = int(r1 or 1), int(r2 or len(self.values))
+        c1, c2 = _col_number(c1), _col_number(c2)
+        return [row[c1 - 1:c2] for row in self.values[r1 - 1:r2]]
+
+    def get_all_records(self):
+        self._api('get_all_records')
+        headers = self.values[0]
+        return [dict(zip(headers, row)) for row in self.values[1:]]
+
+    def get_all_values(self, **kwargs):
+        self._api('get_all_values')
+        return [list(row) for row in self.values]
+
+    def batch_get(self, ranges, **kwargs):
+        self._api('batch_get')
+        return [self._range(a1) for a1 in ranges]
+
+    def row_values(self, row):
+        self._api('row_values')
+        return list(self.values[row - 1])
+
+    def update_cell(self, row, col, value):
+        self._api('update_cell')
+        self.values[row - 1][col - 1] = value
+        self._changed()
+
+    def batch_update(self, data, **kwargs):
+        self._api('batch_update')
+        for item in data:
+            row, col = a1_to_rowcol(item['range'])
+            self.values[row - 1][col - 1] = item['values'][0][0]
+        self._changed()
+
+    def add_cols(self, count):
+        self._api('add_cols')
+        for row in self.values:
+            row.extend([''] * count)
+
+    def append_rows(self, rows, **kwargs):
+        self._api('append_rows')
+        self.values.extend(list(row) for row in rows)
+        self._changed()
+
+    def append_row(self, row, **kwargs):
+        self.append_rows([row])
+
+# ==========================================
+# ספק מחירים מדומה
+# ==========================================
+class FakePriceProvider:
+    """
+    תחליף ל-resolve_prices: השהיה לכל מנה (כמו הורדה מקובצת) ושיעור כישלון לכל סימול.
+    """
+
+    def __init__(self, base_prices, latency=0.0, failure_rate=0.0, chunk_size=scheduler.PRICE_BATCH_SIZE, seed=0):
+        self.base_prices = base_prices
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.chunk_size = chunk_size
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.symbols_requested = 0
+
+    def __call__(self, symbols):
+        symbols = sorted(set(symbols))
+        prices, failures = {}, {}
+        for start in range(0, len(symbols), self.chunk_size):
+            self.calls += 1
+            if self.latency:
+                time.sleep(self.latency)
+            for symbol in symbols[start:start + self.chunk_size]:
+                self.symbols_requested += 1
+                if self.random.random() < self.failure_rate:
+                    failures[symbol] = "simulated failure"
+                else:
+                    # תנודה של עד 5% סביב מחיר הבסיס
+                    prices[symbol] = self.base_prices[symbol] * (1 + self.random.uniform(-0.05, 0.05))
+        return prices, failures
+
+# ==========================================
+# נתונים סינתטיים
+# ==========================================
+def synthetic_rules(count, seed=0):
+    """
+    count שורות כללים: כ-70% Active, ספים בטווח של עד 10% מהמחיר, מחצית חד-פעמיים.
+    מחזיר (values כולל כותרת, base_prices).
+    """
+    rng = random.Random(seed)
+    symbol_count = max(1, min(count // 10, 3000))
+    base_prices = {f"SYM{i:04d}": round(rng.uniform(5, 500), 2) for i in range(symbol_count)}
+    symbols = list(base_prices)
+    values = [list(HEADERS)]
+    for i in range(count):
+        symbol = rng.choice(symbols)
+        price = base_prices[symbol]
+        side = rng.random()
+        min_price = round(price * rng.uniform(0.90, 1.0), 2) if side < 0.6 else ''
+        max_price = round(price * rng.uniform(1.0, 1.10), 2) if side > 0.4 else ''
+        values.append([symbol, min_price, max_price, 'TRUE' if rng.random() < 0.5 else 'FALSE', '+972500000000',
+                       '2024-01-01 00:00:00', 'Active' if rng.random() < 0.7 else 'Archived', '', i + 1])
+    return values, base_prices
+
+# ==========================================
+# הרצה
+# ==========================================
+@contextlib.contextmanager
+def _quiet():
+    # ההדפסות של הסורק לא נמדדות כחלק מהבנצ'מרק
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def _make_store(kind, sheet, tmpdir, populate=True):
+    if kind == 'sheet':
+        return SheetRuleStore(lambda: sheet)
+    store = SQLiteRuleStore(os.path.join(tmpdir, f"rules-{len(sheet.values)}.db"))
+    if populate:
+        records = [dict(zip(HEADERS, row)) for row in sheet.values[1:]]
+        store.apply_sheet_changes(
+            [(None, {f: r[f] for f in HEADERS if f != 'rule_id'}, None) for r in records], [])
+    return store
+
+def run_case(kind, size, scans, latency, failure_rate, sheet_latency, seed, measure_memory, shards=1):
+    """
+    shards > 1: כל shard נסרק עם מאגר משלו (כמו worker נפרד), אחד אחרי השני.
+    wall_seconds הוא אז זמן ה-shard האיטי ביותר - זמן הסריקה הצפוי כשה-workers רצים במקביל.
+    """
+    values, base_prices = synthetic_rules(size, seed)
+    sheet = FakeWorksheet(values, latency=sheet_latency)
+    provider = FakePriceProvider(base_prices, latency=latency, failure_rate=failure_rate, seed=seed)
+    scheduler.fetch_prices = provider
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        stores = [_make_store(kind, sheet, tmpdir, populate=i == 0) for i in range(shards)]
+        specs = [ShardSpec(i, shards) for i in range(shards)]
+        # יומן התראות נפרד לכל מקרה (בלי Twilio), כדי שה-cooldown לא יעבור בין מקרים
+        notifier._dispatcher = notifier.Dispatcher(None, log_path=os.path.join(tmpdir, "notifications.db"))
+        for scan in range(1, scans + 1):
+            sheet.calls.clear()
+            provider.calls = provider.symbols_requested = 0
+            walls, peaks, phases, fired, active = [], [], [], 0, 0
+            for store, spec in zip(stores, specs):
+                if measure_memory:
+                    tracemalloc.start()
+                started = time.perf_counter()
+                try:
+                    with _quiet():
+                        fired += scheduler.check_alerts(store, shard=spec) or 0
+                finally:
+                    walls.append(time.perf_counter() - started)
+                    if measure_memory:
+                        peaks.append(tracemalloc.get_traced_memory()[1])
+                        tracemalloc.stop()
+                phases.append(scheduler.scan_metrics.registry.last_scan.to_dict()["phases"])
+                active += len(ShardedStore(store, spec).index)
+
+            wall = max(walls)
+            results.append({
+                "store": kind,
+                "rows": size,
+                "shards": shards,
+                "scan": scan,
+                "active_rules": active,
+                "wall_seconds": round(wall, 4),
+                "shard_wall_seconds": [round(w, 4) for w in walls],
+                "rules_per_second": round(active / wall, 1) if wall else None,
+                "triggered": fired,
+                "sheet_api_calls": dict(sheet.calls),
+                "sheet_api_total": sum(sheet.calls.values()),
+                "price_api_calls": provider.calls,
+                "symbols_requested": provider.symbols_requested,
+                "peak_memory_mb": round(max(peaks) / 1024 / 1024, 2) if peaks else None,
+                "phases": phases[0] if shards == 1 else phases,
+            })
+        if kind == 'sqlite':
+            for store in stores:
+                store.close()
+        notifier._dispatcher.close_log()
+    return results
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "describe", "--always", "--dirty"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+def compare(current, baseline_path):
+    """השוואת זמן וקריאות API מול קובץ תוצאות קודם"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    old = {(r["store"], r["rows"], r.get("shards", 1), r["scan"]): r for r in baseline["results"]}
+    print(f"\nCompared to {baseline_path} ({baseline.get('revision')}):")
+    for r in current["results"]:
+        before = old.get((r["store"], r["rows"], r["shards"], r["scan"]))
+        if not before:
+            continue
+        ratio = before["wall_seconds"] / r["wall_seconds"] if r["wall_seconds"] else float("inf")
+        print(f"  {r['store']:6} {r['rows']:>7} rows x{r['shards']} scan {r['scan']}: "
+              f"{before['wall_seconds']:.3f}s -> {r['wall_seconds']:.3f}s (x{ratio:.2f}), "
+              f"API {before['sheet_api_total'] + before['price_api_calls']} -> {r['sheet_api_total'] + r['price_api_calls']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the alert scan against local stand-ins for Sheets and Yahoo")
+    parser.add_argument("--sizes", default="100,10000,100000", help="comma separated rule counts")
+    parser.add_argument("--stores", default="sheet,sqlite", help="comma separated rule stores to test")
+    parser.add_argument("--shards", default="1", help="comma separated shard counts (each shard scanned as a separate worker)")
+    parser.add_argument("--scans", type=int, default=2, help="consecutive scans per case (the 2nd shows the no-change path)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds of simulated latency per price batch")
+    parser.add_argument("--failure-rate", type=float, default=0.01, help="fraction of symbols whose price fetch fails")
+    parser.add_argument("--sheet-latency", type=float, default=0.0, help="seconds of simulated latency per Sheets call")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (it slows the scan down)")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    args = parser.parse_args()
+
+    report = {
+        "revision": _git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "results": [],
+    }
+    for kind in args.stores.split(","):
+        for size in (int(s) for s in args.sizes.split(",")):
+            for shards in (int(n) for n in args.shards.split(",")):
+                for r in run_case(kind, size, args.scans, args.latency, args.failure_rate,
+                                  args.sheet_latency, args.seed, not args.no_memory, shards):
+                    report["results"].append(r)
+                    mem = f", peak {r['peak_memory_mb']} MB" if r["peak_memory_mb"] is not None else ""
+                    label = f" x{shards} shards" if shards > 1 else ""
+                    print(f"{kind:6} {size:>7} rows{label} scan {r['scan']}: {r['wall_seconds']:.3f}s, "
+                          f"{r['rules_per_second']:,.0f} rules/s, {r['triggered']} triggered, "
+                          f"sheet API {r['sheet_api_total']}, price API {r['price_api_calls']}{mem}")
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📄 Results written to {args.out}")
+    if args.compare:
+        compare(report, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# קובץ: chart_data.py
+# הכנת נתוני גרף הנרות בצד השרת - כדי ש-Plotly לא יקבל עשרות אלפי נרות
+#
+# 1. האינטרוול נבחר לפי אורך החלון המוצג: חלון קצר מקבל נרות דקה/5 דקות, חלון ארוך נרות יומיים/שבועיים.
+#    כך זום לחלון קצר טוען פירוט רב רק עבור אותו חלון.
+# 2. אם עדיין יש יותר נרות מתקציב הנקודות, הם מאוחדים לנרות גדולים יותר:
+#    Open = הראשון, High = המקסימום, Low = המינימום, Close = האחרון, Volume = הסכום.
+
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+import settings
+from history_store import MAX_LOOKBACK_DAYS, get_history_store
+
+# אינטרוולים לבחירה אוטומטית (מהמפורט לגס), ומספר הנרות המשוער ליום מסחר
+AUTO_INTERVALS = ['1m', '5m', '15m', '1h', '1d', '1wk']
+BARS_PER_TRADING_DAY = {'1m': 390, '5m': 78, '15m': 26, '1h': 7, '1d': 1, '1wk': 0.2}
+TRADING_DAYS_PER_DAY = 252 / 365
+
+def estimate_bars(start, end, interval):
+    """הערכה של מספר הנרות בחלון (שעות מסחר רגילות - בקריפטו יהיו יותר, ואז resample מתקן)"""
+    days = max(end - start, 0) / 86400
+    return days * TRADING_DAYS_PER_DAY * BARS_PER_TRADING_DAY[interval]
+
+def pick_interval(start, end, max_points=None, now=None):
+    """האינטרוול המפורט ביותר שנכנס בתקציב הנקודות ושעבורו ל-Yahoo יש נתונים מ-start"""
+    max_points = max_points or settings.CHART_MAX_POINTS
+    now = now or time.time()
+    for interval in AUTO_INTERVALS:
+        limit = MAX_LOOKBACK_DAYS.get(interval)
+        if limit is not None and start < now - limit * 86400:
+            continue
+        if estimate_bars(start, end, interval) <= max_points:
+            return interval
+    return AUTO_INTERVALS[-1]
+
+def resample_ohlcv(data, max_points=None):
+    """
+    איחוד נרות סמוכים כך שיישארו לכל היותר max_points.
+    מחזיר (frame, factor) - factor = כמה נרות מקוריים בכל נר (1 = ללא שינוי).
+    """
+    max_points = max_points or settings.CHART_MAX_POINTS
+    n = len(data)
+    if n <= max_points:
+        return data, 1
+
+    factor = math.ceil(n / max_points)
+    starts = np.arange(0, n, factor)
+    ends = np.append(starts[1:], n) - 1
+    columns = {}
+    if 'Open' in data:
+        columns['Open'] = data['Open'].to_numpy()[starts]
+    if 'High' in data:
+        columns['High'] = np.maximum.reduceat(data['High'].to_numpy(dtype=float), starts)
+    if 'Low' in data:
+        columns['Low'] = np.minimum.reduceat(data['Low'].to_numpy(dtype=float), starts)
+    if 'Close' in data:
+        columns['Close'] = data['Close'].to_numpy()[ends]
+    if 'Volume' in data:
+        columns['Volume'] = np.add.reduceat(np.nan_to_num(data['Volume'].to_numpy(dtype=float)), starts)
+    # כל נר מאוחד מסומן בזמן הפתיחה של הנר הראשון בו
+    return pd.DataFrame(columns, index=data.index[starts]), factor
+
+def load_window(symbol, start, end, interval='auto', max_points=None, store=None):
+    """
+    נרות לחלון [start, end] (epoch) מוכנים לגרף.
+    מחזיר (frame, interval, factor) - האינטרוול שנטען ופקטור האיחוד.
+    """
+    max_points = max_points or settings.CHART_MAX_POINTS
+    store = store or get_history_store()
+    if interval == 'auto':
+        interval = pick_interval(start, end, max_points)
+    data = store.get_range(symbol, start, end, interval)
+    frame, factor = resample_ohlcv(data, max_points)
+    return frame, interval, factor
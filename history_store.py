@@ -0,0 +1,339 @@
+# קובץ: history_store.py
+# מאגר היסטוריית נרות (OHLCV) מקומי ומצטבר - קובץ Parquet אחד לכל סימול ואינטרוול
+#
+# נרות שכבר ירדו נשמרים על הדיסק, ובכל בקשה יורדים רק:
+# - נרות חדשים מאז הנר האחרון השמור (הנר האחרון עצמו יורד שוב - ייתכן שהיה חלקי), ורק כשהנתונים לא טריים;
+# - טווח ישן יותר מהשמור, אם ביקשו תקופה ארוכה יותר מזו שכבר ירדה.
+# עותק בזיכרון (LRU) של הסימולים האחרונים, כך שריצה חוזרת של Streamlit לא נוגעת בדיסק בכלל.
+# stale-while-revalidate: נרות שלא טריים מוחזרים מיד, והנרות החדשים יורדים ב-thread ברקע.
+# הקבצים בדיסק מוגבלים ל-HISTORY_MAX_BYTES - מעבר לזה נמחקים הקבצים שלא נקראו הכי הרבה זמן (LRU).
+# בלי pyarrow הקבצים נשמרים כ-pickle.
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from urllib.parse import quote
+
+import pandas as pd
+import settings
+from yahoo_gateway import CHART, get_gateway
+
+try:
+    import pyarrow # noqa: F401 - רק בדיקת זמינות, pandas משתמש בו ל-Parquet
+    FILE_FORMAT = "parquet"
+except ImportError:
+    FILE_FORMAT = "pickle"
+
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# כל כמה שניות לעדכן את זמן הגישה של קובץ שנקרא (לפינוי LRU) - לא בכל ריצה של הדשבורד
+TOUCH_SECONDS = 60
+
+# תקופות (ימים אחורה)
+PERIOD_DAYS = {'1d': 1, '5d': 5, '1mo': 31, '3mo': 92, '6mo': 183, '1y': 366, '2y': 731, '5y': 1827, '10y': 3653}
+
+INTERVAL_SECONDS = {'1m': 60, '2m': 120, '5m': 300, '15m': 900, '30m': 1800, '60m': 3600, '90m': 5400,
+                    '1h': 3600, '1d': 86400, '5d': 5 * 86400, '1wk': 7 * 86400, '1mo': 30 * 86400, '3mo': 91 * 86400}
+
+# המגבלות של Yahoo על נרות תוך-יומיים: כמה ימים אחורה בכלל, וכמה ימים בבקשה אחת
+MAX_LOOKBACK_DAYS = {'1m': 29, '2m': 59, '5m': 59, '15m': 59, '30m': 59, '90m': 59, '60m': 729, '1h': 729}
+REQUEST_DAYS = {'1m': 7}
+
+def is_intraday(interval):
+    return INTERVAL_SECONDS.get(interval, 86400) < 86400
+
+def period_start(period, interval='1d', now=None):
+    """
+    תחילת התקופה בשניות epoch (0 = כל ההיסטוריה), אחרי הגבלת Yahoo לאינטרוול.
+    מחזיר (start, clamped) - clamped=True אם התקופה קוצרה בגלל המגבלה.
+    """
+    now = now or time.time()
+    if period == 'max':
+        start = 0.0
+    elif period == 'ytd':
+        start = pd.Timestamp(year=time.gmtime(now).tm_year, month=1, day=1, tz='UTC').timestamp()
+    else:
+        start = now - PERIOD_DAYS[period] * 86400
+    limit = MAX_LOOKBACK_DAYS.get(interval)
+    if limit is not None and start < now - limit * 86400:
+        return now - limit * 86400, True
+    return start, False
+
+def _timestamp(epoch, index):
+    """epoch כ-Timestamp שאפשר להשוות לאינדקס (עם או בלי אזור זמן)"""
+    ts = pd.Timestamp(epoch, unit='s', tz='UTC')
+    return ts.tz_convert(index.tz) if getattr(index, 'tz', None) is not None else ts.tz_localize(None)
+
+def download_range(symbol, interval, start=None, end=None):
+    """נרות בטווח [start, end) (epoch; start=None - כל ההיסטוריה), עם עמודות שטוחות"""
+    if start is None or start <= 0:
+        data = get_gateway().download(symbol, priority=CHART, period='max', interval=interval, progress=False)
+        return _clean(data)
+
+    end = end or time.time()
+    step = REQUEST_DAYS.get(interval, 0) * 86400 or (end - start)
+    frames = []
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(end, chunk_start + step)
+        data = get_gateway().download(symbol, priority=CHART, start=pd.Timestamp(chunk_start, unit='s', tz='UTC'),
+                                      end=pd.Timestamp(chunk_end, unit='s', tz='UTC'),
+                                      interval=interval, progress=False)
+        frames.append(_clean(data))
+        chunk_start = chunk_end
+    return _merge(*frames)
+
+def _clean(data):
+    if data is None or data.empty:
+        return pd.DataFrame(columns=COLUMNS)
+    if isinstance(data.columns, pd.MultiIndex):
+        data = data.droplevel(1, axis=1)
+    return data[[c for c in COLUMNS if c in data.columns]]
+
+def _merge(*frames):
+    """איחוד לפי זמן; בנר שמופיע פעמיים גובר העדכני (האחרון ברשימה)"""
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    data = pd.concat(frames) if len(frames) > 1 else frames[0]
+    return data[~data.index.duplicated(keep='last')].sort_index()
+
+class HistoryStore:
+    """
+    get(symbol, period, interval) מחזיר DataFrame של נרות לתקופה.
+    fetch(symbol, interval, start, end) - ברירת מחדל download_range (ניתן להחלפה בבדיקות).
+    """
+
+    def __init__(self, root=None, memory_items=None, fetch=download_range, fresh_seconds=None, max_bytes=None):
+        self.root = root or settings.HISTORY_DIR
+        self.memory_items = memory_items or settings.HISTORY_MEMORY_ITEMS
+        self.max_bytes = max_bytes or settings.HISTORY_MAX_BYTES
+        self.fetch = fetch
+        self.fresh_seconds = fresh_seconds
+        self.downloads = 0  # מספר ההורדות שבוצעו (לצורך מעקב)
+        self._memory = OrderedDict()  # (symbol, interval) -> [frame, covered_from, checked_at]
+        self._locks = defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+        self._refreshing = set()  # מפתחות שכבר מתרעננים ברקע
+        self._touched = {}        # key -> מתי עודכן זמן הגישה של הקובץ
+
+    def _path(self, symbol, interval):
+        ext = "parquet" if FILE_FORMAT == "parquet" else "pkl"
+        return os.path.join(self.root, interval, f"{quote(symbol, safe='')}.{ext}")
+
+    def _is_fresh(self, interval, checked_at):
+        if self.fresh_seconds is not None:
+            limit = self.fresh_seconds
+        elif is_intraday(interval):
+            limit = max(60, INTERVAL_SECONDS[interval])
+        else:
+            limit = settings.BARS_TTL
+        return time.time() - checked_at < limit
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks[key]
+
+    # ------------------------------------------
+    # קריאה וכתיבה
+    # ------------------------------------------
+    def _load(self, key):
+        self._touch(key)
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            return entry
+        path = self._path(*key)
+        try:
+            with open(path + ".json", encoding="utf-8") as f:
+                meta = json.load(f)
+            frame = pd.read_parquet(path) if FILE_FORMAT == "parquet" else pd.read_pickle(path)
+        except (OSError, ValueError):
+            return None # אין קובץ, או קובץ פגום - יורד מחדש
+        return self._remember(key, [frame, meta['covered_from'], meta['checked_at']])
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+        return entry
+
+    def _save(self, key, entry):
+        frame, covered_from, checked_at = entry
+        path = self._path(*key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # כתיבה לקובץ זמני ו-rename, כדי שקורא במקביל לא יראה קובץ חצוי
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if FILE_FORMAT == "parquet":
+            frame.to_parquet(tmp)
+        else:
+            frame.to_pickle(tmp)
+        os.replace(tmp, path)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({'covered_from': covered_from, 'checked_at': checked_at, 'rows': len(frame)}, f)
+        os.replace(tmp, path + ".json")
+        self._touched[key] = time.monotonic()
+        self.evict(keep=path)
+
+    def _download(self, symbol, interval, start, end=None):
+        self.downloads += 1
+        return self.fetch(symbol, interval, start, end)
+
+    def _append_new(self, symbol, interval, entry):
+        """הנרות שנוספו מאז הנר האחרון השמור. מחזיר entry חדש (לא שומר)"""
+        frame, covered_from, _ = entry
+        now = time.time()
+        since = frame.index[-1].timestamp() if not frame.empty else covered_from
+        return [_merge(frame, self._download(symbol, interval, since)), covered_from, now]
+
+    # ------------------------------------------
+    # ריענון ברקע ופינוי
+    # ------------------------------------------
+    def _revalidate(self, key):
+        """הורדת הנרות החדשים של key ב-thread רקע, פעם אחת בלבד לכל מפתח בו-זמנית"""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                with self._key_lock(key):
+                    entry = self._load(key)
+                    if entry is not None and not self._is_fresh(key[1], entry[2]):
+                        entry = self._append_new(*key, entry)
+                        self._save(key, entry)
+                        self._remember(key, entry)
+            except Exception as e:
+                print(f"⚠️ Background refresh failed for {key[0]} ({key[1]}): {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _touch(self, key):
+        """עדכון זמן הגישה של הקובץ (mtime), לכל היותר פעם ב-TOUCH_SECONDS"""
+        now = time.monotonic()
+        if now - self._touched.get(key, float("-inf")) < TOUCH_SECONDS:
+            return
+        self._touched[key] = now
+        try:
+            os.utime(self._path(*key))
+        except OSError:
+            pass # עוד לא נשמר
+
+    def evict(self, keep=None):
+        """מחיקת הקבצים שנקראו הכי מזמן, עד שהמאגר בדיסק חוזר ל-max_bytes (keep לא נמחק)"""
+        files = []
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith((".json", ".tmp")):
+                    continue
+                path = os.path.join(folder, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue # נמחק בינתיים
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            for victim in (path + ".json", path):
+                try:
+                    os.remove(victim)
+                except OSError:
+                    pass
+            total -= size
+
+    # ------------------------------------------
+    # API
+    # ------------------------------------------
+    def get(self, symbol, period='6mo', interval='1d', stale_ok=True):
+        start, _ = period_start(period, interval)
+        return self.get_range(symbol, start, None, interval, stale_ok)
+
+    def get_range(self, symbol, start, end=None, interval='1d', stale_ok=True):
+        """
+        נרות בטווח [start, end] (epoch; end=None - עד עכשיו). start מוגבל לטווח ש-Yahoo מחזיק לאינטרוול.
+        ברירת המחדל היא stale-while-revalidate, כי זה מה שהדשבורד צריך: נרות שלא טריים מוחזרים מיד
+        והחדשים יורדים ברקע. stale_ok=False מחכה להורדה.
+        """
+        symbol = symbol.strip().upper()
+        limit = MAX_LOOKBACK_DAYS.get(interval)
+        if limit is not None:
+            start = max(start, time.time() - limit * 86400)
+        key = (symbol, interval)
+        with self._key_lock(key):
+            entry = self._load(key)
+            now = time.time()
+            stale = False
+            if entry is None:
+                # פעם ראשונה - כל התקופה בהורדה אחת
+                frame = _merge(self._download(symbol, interval, start or None))
+                if frame.empty:
+                    return frame # לא שומרים תוצאה ריקה - כנראה סימול לא קיים או כישלון זמני
+                entry = [frame, start, now]
+                self._save(key, entry)
+                self._remember(key, entry)
+            else:
+                frame, covered_from, checked_at = entry
+                changed = False
+                if start < covered_from:
+                    # ביקשו תקופה ארוכה מזו שירדה - רק החלק הישן שחסר
+                    older_end = frame.index[0].timestamp() if not frame.empty else None
+                    frame = _merge(self._download(symbol, interval, start or None, older_end), frame)
+                    covered_from = start
+                    changed = True
+                entry = [frame, covered_from, checked_at]
+                stale = not self._is_fresh(interval, checked_at)
+                if stale and not stale_ok:
+                    # רק נרות חדשים, החל מהנר האחרון השמור
+                    entry = self._append_new(symbol, interval, entry)
+                    changed, stale = True, False
+                if changed:
+                    self._save(key, entry)
+                    self._remember(key, entry)
+        if stale:
+            self._revalidate(key)
+
+        frame = entry[0]
+        if start > 0 and not frame.empty:
+            frame = frame[frame.index >= _timestamp(start, frame.index)]
+        if end is not None and not frame.empty:
+            frame = frame[frame.index <= _timestamp(end, frame.index)]
+        return frame
+
+    def stored(self, symbol, interval='1d', start=None, end=None):
+        """
+        רק הנרות שכבר שמורים, בלי רשת ובלי הגבלת הטווח של Yahoo (המאגר מצטבר, כך שנשמר יותר ממה ש-Yahoo מחזיר).
+        משמש את הבדיקה ההיסטורית (backtest.py). DataFrame ריק אם הסימול לא נשמר.
+        """
+        key = (symbol.strip().upper(), interval)
+        with self._key_lock(key):
+            entry = self._load(key)
+        if entry is None:
+            return pd.DataFrame(columns=COLUMNS)
+        frame = entry[0]
+        if start and not frame.empty:
+            frame = frame[frame.index >= _timestamp(start, frame.index)]
+        if end is not None and not frame.empty:
+            frame = frame[frame.index <= _timestamp(end, frame.index)]
+        return frame
+
+_default_store = None
+_default_lock = threading.Lock()
+
+def get_history_store():
+    """מאגר יחיד לכל התהליך - הדשבורד (כל הסשנים), chart_data ו-backtest חולקים את הנרות והנעילות"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = HistoryStore()
+    return _default_store
@@ -0,0 +1,243 @@
+# קובץ: indicators.py
+# מנוע אינדיקטורים טכניים מבוסס NumPy - מחושב על כל הסימולים יחד
+#
+# כל הפונקציות מקבלות מערך 1D (סימול אחד) או 2D (סימול בכל שורה, נר בכל עמודה) ומחשבות לאורך הציר האחרון,
+# כך שחישוב לאלף סימולים הוא אותה פעולה וקטורית כמו לסימול אחד. ערך חסר = NaN.
+# - גרף הניתוח: overlay של SMA/EMA/Bollinger/VWAP ופאנל RSI.
+# - הסורק: שינוי % יומי וווליום לכל הסימולים שיש להם כללים כאלה, ובדיקת כל הכללים במעבר אחד.
+
+import time
+import weakref
+
+import numpy as np
+import pandas as pd
+
+import scan_metrics
+import yahoo_gateway
+
+# כמה סימולים לבקש בכל הורדה מקובצת (כמו PRICE_BATCH_SIZE בסורק)
+BATCH_SIZE = 50
+
+SNAPSHOT_COLUMNS = ['price', 'change_pct', 'volume', 'volume_ratio']
+
+# ==========================================
+# אינדיקטורים
+# ==========================================
+def _rolling_sum(x, window):
+    """סכום נע על הציר האחרון (NaN בהתחלה ובכל חלון שיש בו ערך חסר)"""
+    x = np.asarray(x, dtype=float)
+    out = np.full(x.shape, np.nan)
+    if window < 1 or x.shape[-1] < window:
+        return out
+    csum = np.cumsum(np.nan_to_num(x), axis=-1)
+    gaps = np.cumsum(np.isnan(x), axis=-1)
+    zero = np.zeros(x.shape[:-1] + (1,))
+    csum = np.concatenate([zero, csum], axis=-1)
+    gaps = np.concatenate([zero, gaps], axis=-1)
+    total = csum[..., window:] - csum[..., :-window]
+    missing = gaps[..., window:] - gaps[..., :-window]
+    out[..., window - 1:] = np.where(missing > 0, np.nan, total)
+    return out
+
+def sma(x, window=20):
+    return _rolling_sum(x, window) / window
+
+def ema(x, span=20, alpha=None):
+    """ממוצע נע אקספוננציאלי (adjust=False). ערך חסר שומר את הערך הקודם"""
+    x = np.asarray(x, dtype=float)
+    alpha = alpha or 2.0 / (span + 1)
+    out = np.full(x.shape, np.nan)
+    prev = np.full(x.shape[:-1], np.nan)
+    # לולאה על הנרות בלבד - כל צעד וקטורי על כל הסימולים
+    for i in range(x.shape[-1]):
+        value = x[..., i]
+        prev = np.where(np.isnan(prev), value, np.where(np.isnan(value), prev, prev + alpha * (value - prev)))
+        out[..., i] = prev
+    return out
+
+def rsi(close, period=14):
+    """RSI של Wilder (0-100)"""
+    close = np.asarray(close, dtype=float)
+    delta = np.diff(close, axis=-1)
+    gains = ema(np.where(delta > 0, delta, np.where(np.isnan(delta), np.nan, 0.0)), alpha=1.0 / period)
+    losses = ema(np.where(delta < 0, -delta, np.where(np.isnan(delta), np.nan, 0.0)), alpha=1.0 / period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = np.where(losses == 0, 100.0, 100.0 - 100.0 / (1.0 + gains / losses))
+    values[..., :period - 1] = np.nan # לפני שיש period שינויים
+    pad = np.full(close.shape[:-1] + (1,), np.nan)
+    return np.concatenate([pad, values], axis=-1)
+
+def bollinger(close, window=20, k=2.0):
+    """(lower, middle, upper) - ממוצע נע ± k סטיות תקן (אוכלוסייה, כמו רוב הפלטפורמות)"""
+    close = np.asarray(close, dtype=float)
+    middle = sma(close, window)
+    mean_sq = _rolling_sum(close * close, window) / window
+    std = np.sqrt(np.maximum(mean_sq - middle * middle, 0.0))
+    return middle - k * std, middle, middle + k * std
+
+def vwap(high, low, close, volume, sessions=None):
+    """
+    VWAP מצטבר מהנר הראשון. sessions (מערך תוויות באורך הנרות, למשל תאריך) מאפס את הצבירה בכל session חדש.
+    """
+    typical = (np.asarray(high, dtype=float) + np.asarray(low, dtype=float) + np.asarray(close, dtype=float)) / 3
+    volume = np.nan_to_num(np.asarray(volume, dtype=float))
+    pv = np.cumsum(np.nan_to_num(typical) * volume, axis=-1)
+    vol = np.cumsum(volume, axis=-1)
+    if sessions is not None:
+        sessions = np.asarray(sessions)
+        starts = np.flatnonzero(np.r_[True, sessions[1:] != sessions[:-1]])
+        # לכל נר - הסכום המצטבר עד לפני תחילת ה-session שלו
+        owner = np.repeat(starts, np.diff(np.r_[starts, len(sessions)]))
+        pv_before = np.concatenate([np.zeros(pv.shape[:-1] + (1,)), pv[..., :-1]], axis=-1)
+        vol_before = np.concatenate([np.zeros(vol.shape[:-1] + (1,)), vol[..., :-1]], axis=-1)
+        pv = pv - pv_before[..., owner]
+        vol = vol - vol_before[..., owner]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(vol > 0, pv / vol, np.nan)
+
+def pct_change(close, periods=1):
+    close = np.asarray(close, dtype=float)
+    out = np.full(close.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[..., periods:] = (close[..., periods:] / close[..., :-periods] - 1.0) * 100.0
+    return out
+
+def volume_ratio(volume, window=20):
+    """ווליום הנר חלקי ממוצע window הנרות שלפניו"""
+    volume = np.asarray(volume, dtype=float)
+    average = np.full(volume.shape, np.nan)
+    average[..., 1:] = sma(volume, window)[..., :-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(average > 0, volume / average, np.nan)
+
+def last_valid(values, count=2):
+    """
+    count הערכים התקינים האחרונים בכל שורה (2D) -> מערך (rows, count), מהאחרון אחורה.
+    סימולים עם ימי מסחר שונים (קריפטו מול מניות) מיושרים לפי הנתונים שלהם ולא לפי התאריך המשותף.
+    """
+    values = np.asarray(values, dtype=float)
+    valid = ~np.isnan(values)
+    # דירוג מהסוף: 1 לערך התקין האחרון, 2 לזה שלפניו וכו'
+    rank = np.cumsum(valid[:, ::-1], axis=1)[:, ::-1]
+    out = np.full((values.shape[0], count), np.nan)
+    for k in range(count):
+        rows, cols = np.nonzero(valid & (rank == k + 1))
+        out[rows, k] = values[rows, cols]
+    return out
+
+# ==========================================
+# נתונים מקובצים
+# ==========================================
+def to_panel(data, symbols, columns=('Close', 'Volume')):
+    """תוצאת yf.download (group_by='ticker') -> {column: מערך 2D לפי סדר symbols}"""
+    panel = {c: np.full((len(symbols), len(data.index)), np.nan) for c in columns}
+    multi = isinstance(data.columns, pd.MultiIndex)
+    for i, symbol in enumerate(symbols):
+        try:
+            frame = data[symbol] if multi else data
+        except KeyError:
+            continue
+        for c in columns:
+            if c in frame:
+                panel[c][i] = frame[c].to_numpy(dtype=float)
+    return panel
+
+def daily_snapshot(symbols, period='1mo', chunk_size=BATCH_SIZE, priority=yahoo_gateway.SCHEDULER):
+    """
+    מצב יומי לכל סימול: DataFrame לפי סימול עם price, change_pct (מול הסגירה הקודמת), volume,
+    volume_ratio (מול ממוצע 20 הימים שלפני). סימול בלי נתונים לא מופיע.
+    priority: עדיפות ההורדות בשער ל-Yahoo.
+    """
+    symbols = sorted(set(symbols))
+    metrics = scan_metrics.current()
+    frames = []
+    for start in range(0, len(symbols), chunk_size):
+        chunk = symbols[start:start + chunk_size]
+        started = time.perf_counter()
+        try:
+            data = yahoo_gateway.get_gateway().download(chunk, priority=priority, period=period, interval='1d',
+                                                        group_by='ticker', progress=False, threads=True)
+        except Exception as e:
+            print(f"⚠️ Daily snapshot download failed for {len(chunk)} symbols: {e}")
+            continue
+        finally:
+            metrics.observe('batch', time.perf_counter() - started)
+        if data is None or data.empty:
+            continue
+        frames.append(snapshot_from_panel(chunk, to_panel(data, chunk)))
+    if not frames:
+        return empty_snapshot()
+    return pd.concat(frames)
+
+def empty_snapshot():
+    return pd.DataFrame({c: pd.Series(dtype=float) for c in SNAPSHOT_COLUMNS}, index=pd.Index([], name='symbol'))
+
+def snapshot_from_panel(symbols, panel):
+    """החישוב עצמו של daily_snapshot - וקטורי על כל הסימולים"""
+    close, volume = panel['Close'], panel['Volume']
+    closes = last_valid(close, 2)
+    # ווליום של אותו נר כמו הסגירה האחרונה
+    has_close = ~np.isnan(close)
+    volumes = last_valid(np.where(has_close, volume, np.nan), 21)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = (closes[:, 0] / closes[:, 1] - 1.0) * 100.0
+        previous = volumes[:, 1:]
+        count = np.sum(~np.isnan(previous), axis=1)
+        average = np.where(count > 0, np.nansum(previous, axis=1) / np.maximum(count, 1), np.nan)
+        ratio = np.where(average > 0, volumes[:, 0] / average, np.nan)
+    snapshot = pd.DataFrame({'price': closes[:, 0], 'change_pct': change, 'volume': volumes[:, 0],
+                             'volume_ratio': ratio}, index=pd.Index(symbols, name='symbol'))
+    return snapshot[snapshot['price'].notna()]
+
+# ==========================================
+# בדיקת כללי שינוי % / ווליום
+# ==========================================
+class SignalTable:
+    """הכללים התלויים בנתונים יומיים כמערכים מקבילים - נבנה פעם אחת לכל RuleIndex"""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.symbols = pd.Index([r.symbol for r in self.rules])
+        self.change_pct = np.array([np.nan if r.change_pct is None else r.change_pct for r in self.rules], dtype=float)
+        self.min_volume = np.array([np.nan if r.min_volume is None else r.min_volume for r in self.rules], dtype=float)
+        self.has_price = np.array([r.min_price is not None or r.max_price is not None for r in self.rules], dtype=bool)
+
+    def evaluate(self, snapshot):
+        """
+        מחזיר (hits, blocked):
+        hits - רשימת (rule, side, snapshot_row) לכללים שהתנאי היומי שלהם התקיים (side = 'change' / 'volume');
+        blocked - סט של rule.key לכללי מחיר שהווליום שלהם עדיין מתחת למינימום (אין להפעיל אותם).
+        """
+        if not self.rules:
+            return [], set()
+        positions = snapshot.index.get_indexer(self.symbols)
+        known = positions >= 0
+        take = np.where(known, positions, 0)
+        change = np.where(known, snapshot['change_pct'].to_numpy(dtype=float)[take], np.nan)
+        volume = np.where(known, snapshot['volume'].to_numpy(dtype=float)[take], np.nan)
+
+        has_change = ~np.isnan(self.change_pct)
+        has_volume = ~np.isnan(self.min_volume)
+        # השוואה עם NaN נותנת False - סימול בלי נתונים לא מפעיל ולא עובר את תנאי הווליום
+        volume_ok = ~has_volume | (volume >= self.min_volume)
+        change_hit = has_change & (((self.change_pct > 0) & (change >= self.change_pct)) |
+                                   ((self.change_pct < 0) & (change <= self.change_pct)))
+        volume_only = has_volume & ~has_change & ~self.has_price
+
+        fired_change = np.flatnonzero(change_hit & volume_ok)
+        fired_volume = np.flatnonzero(volume_only & volume_ok)
+        blocked = np.flatnonzero(self.has_price & ~volume_ok)
+
+        rows = snapshot.to_dict('index')
+        hits = [(self.rules[i], 'change', rows[self.symbols[i]]) for i in fired_change]
+        hits += [(self.rules[i], 'volume', rows[self.symbols[i]]) for i in fired_volume]
+        return hits, {self.rules[i].key for i in blocked}
+
+_tables = weakref.WeakKeyDictionary()
+
+def signal_table(index):
+    """SignalTable של אינדקס הכללים (נשמר עד שהאינדקס מתחלף)"""
+    table = _tables.get(index)
+    if table is None:
+        table = _tables[index] = SignalTable(index.signal_rules())
+    return table
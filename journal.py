@@ -0,0 +1,360 @@
+# קובץ: journal.py
+# יומן מסחר: הערות ועסקאות בלוג JSONL מקומי שרק מוסיפים לו (append-only)
+#
+# כל שורה היא רשומה: put (רשומה חדשה, או עדכון שדות של id קיים - למשל סגירת עסקה) או delete.
+# הלוג נקרא פעם אחת לזיכרון, ובכל refresh נקראות רק השורות שנוספו מאז (לפי ה-offset בקובץ),
+# כך שריצה חוזרת של Streamlit לא קוראת ולא מפרסרת מחדש שנים של היסטוריה. תמונת מצב (pickle)
+# ליד הלוג חוסכת גם את הקריאה המלאה בהפעלה הבאה.
+# אינדקסים בזיכרון: תאריך (רשימה ממוינת), סימול, תגית ואינדקס מילים לחיפוש בהערות.
+# רווח/הפסד, אחוז הצלחה וחשיפה מחושבים על טבלת העסקאות (DataFrame) בבת אחת.
+
+import json
+import os
+import pickle
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import settings
+
+KINDS = ("note", "trade")
+SIDES = ("long", "short")
+TRADE_FIELDS = ["date", "symbol", "side", "quantity", "entry_price", "exit_price", "fees", "opened", "closed", "tags", "text"]
+
+# כמה רשומות חדשות לקרוא מהלוג לפני שתמונת המצב נכתבת מחדש
+SNAPSHOT_EVERY = 500
+SNAPSHOT_VERSION = 1
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text):
+    return {token.lower() for token in _TOKEN.findall(text or "") if len(token) > 1}
+
+def _day(value):
+    """תאריך כמחרוזת ISO (YYYY-MM-DD) מ-date / datetime / מחרוזת"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        return value[:10]
+    return value.isoformat()[:10]
+
+def _tags(tags):
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    return sorted({tag.strip().lstrip("#").lower() for tag in tags or () if tag.strip()})
+
+class Journal:
+    """
+    add_note / add_trade / close_trade / delete כותבים שורה ללוג; entries ו-trades מסננים לפי
+    תאריכים, סימול, תגית וטקסט חופשי דרך האינדקסים. refresh() קולט שורות שנכתבו בתהליך אחר.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or settings.JOURNAL_PATH
+        self.snapshot_path = self.path + ".snapshot"
+        self._lock = threading.RLock()
+        self._reset()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._load_snapshot()
+        self.refresh()
+
+    def _reset(self):
+        self.records = {}    # id -> dict
+        self.offset = 0      # בתים מהלוג שכבר נקראו
+        self.version = 0     # עולה בכל שינוי - מפתח המטמון של טבלת העסקאות
+        self._since_snapshot = 0
+        self._rebuild_indexes()
+
+    def _rebuild_indexes(self, saved=None):
+        """אינדקסים מהרשומות, או כפי שנשמרו בתמונת המצב (saved)"""
+        self._dates = None   # [(date, id)] ממוין, נבנה בשאילתה הראשונה אחרי שינוי
+        self._vocabulary = None
+        self._trades = None
+        if saved is not None:
+            self._by_symbol, self._by_tag, self._by_word = saved
+            return
+        self._by_symbol = defaultdict(set)
+        self._by_tag = defaultdict(set)
+        self._by_word = defaultdict(set)
+        for record in self.records.values():
+            self._index(record)
+
+    # ------------------------------------------
+    # הלוג
+    # ------------------------------------------
+    def _load_snapshot(self):
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                state = pickle.load(f)
+            # תמונת מצב של לוג אחר (או של לוג שנמחק וקוצר) לא רלוונטית
+            if state.get("version") != SNAPSHOT_VERSION or os.path.getsize(self.path) < state["offset"]:
+                return
+            self.records, self.offset = state["records"], state["offset"]
+            self._rebuild_indexes(state["indexes"])
+        except Exception:
+            pass # בלי תמונת מצב - קוראים את כל הלוג
+
+    def _save_snapshot(self):
+        tmp = self.snapshot_path + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump({"version": SNAPSHOT_VERSION, "offset": self.offset, "records": self.records,
+                             "indexes": (self._by_symbol, self._by_tag, self._by_word)}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.snapshot_path)
+            self._since_snapshot = 0
+        except OSError as e:
+            print(f"⚠️ Could not write journal snapshot: {e}")
+
+    def refresh(self):
+        """קריאת השורות שנוספו ללוג מאז הקריאה הקודמת. מחזיר כמה רשומות נקראו"""
+        with self._lock:
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                return 0
+            if size < self.offset:
+                # הלוג הוחלף - קוראים מההתחלה
+                self._reset()
+            if size == self.offset:
+                return 0
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                chunk = f.read(size - self.offset)
+            # שורה אחרונה בלי \n עדיין נכתבת - נקרא אותה בפעם הבאה
+            end = chunk.rfind(b"\n") + 1
+            count = 0
+            for line in chunk[:end].splitlines():
+                if line.strip():
+                    try:
+                        self._apply(json.loads(line))
+                        count += 1
+                    except (ValueError, KeyError) as e:
+                        print(f"⚠️ Skipping bad journal line: {e}")
+            self.offset += end
+            self._since_snapshot += count
+            if self._since_snapshot >= SNAPSHOT_EVERY:
+                self._save_snapshot()
+            return count
+
+    def _append(self, entry):
+        entry["at"] = time.time()
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            # O_APPEND: כתיבה אחת לסוף הקובץ, גם כשכמה תהליכים כותבים
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+            self.refresh()
+
+    def _apply(self, entry):
+        op, record_id = entry["op"], entry["id"]
+        old = self.records.get(record_id)
+        if old is not None:
+            self._unindex(old)
+        if op == "delete":
+            self.records.pop(record_id, None)
+        else:
+            record = dict(old or {})
+            record.update((key, value) for key, value in entry.items() if key not in ("op", "at"))
+            record.setdefault("created_at", entry.get("at"))
+            self.records[record_id] = record
+            self._index(record)
+        self.version += 1
+        self._dates = self._vocabulary = self._trades = None
+
+    def _index(self, record):
+        record_id = record["id"]
+        if record.get("symbol"):
+            self._by_symbol[record["symbol"]].add(record_id)
+        for tag in record.get("tags", ()):
+            self._by_tag[tag].add(record_id)
+        for word in tokenize(record.get("text")) | tokenize(record.get("symbol")):
+            self._by_word[word].add(record_id)
+
+    def _unindex(self, record):
+        record_id = record["id"]
+        self._by_symbol.get(record.get("symbol"), set()).discard(record_id)
+        for tag in record.get("tags", ()):
+            self._by_tag.get(tag, set()).discard(record_id)
+        for word in tokenize(record.get("text")) | tokenize(record.get("symbol")):
+            self._by_word.get(word, set()).discard(record_id)
+
+    # ------------------------------------------
+    # כתיבה
+    # ------------------------------------------
+    def add_note(self, text, symbol="", tags=(), day=None):
+        record_id = uuid.uuid4().hex[:12]
+        self._append({"op": "put", "id": record_id, "kind": "note", "date": _day(day) or date.today().isoformat(),
+                      "symbol": (symbol or "").strip().upper(), "tags": _tags(tags), "text": (text or "").strip()})
+        return record_id
+
+    def add_trade(self, symbol, side, quantity, entry_price, exit_price=None, opened=None, closed=None,
+                  fees=0.0, tags=(), text=""):
+        """עסקה; בלי exit_price היא פתוחה (נספרת בחשיפה) עד close_trade"""
+        if side not in SIDES:
+            raise ValueError(f"side must be one of {SIDES}")
+        if not quantity or quantity <= 0 or not entry_price or entry_price <= 0:
+            raise ValueError("quantity and entry_price must be positive")
+        opened = _day(opened) or date.today().isoformat()
+        closed = _day(closed) or (date.today().isoformat() if exit_price is not None else None)
+        record_id = uuid.uuid4().hex[:12]
+        self._append({"op": "put", "id": record_id, "kind": "trade", "date": closed or opened,
+                      "symbol": symbol.strip().upper(), "side": side, "quantity": float(quantity),
+                      "entry_price": float(entry_price),
+                      "exit_price": None if exit_price is None else float(exit_price),
+                      "fees": float(fees or 0), "opened": opened, "closed": closed,
+                      "tags": _tags(tags), "text": (text or "").strip()})
+        return record_id
+
+    def close_trade(self, record_id, exit_price, closed=None, fees=None):
+        record = self.records.get(record_id)
+        if record is None or record.get("kind") != "trade":
+            raise KeyError(record_id)
+        closed = _day(closed) or date.today().isoformat()
+        update = {"op": "put", "id": record_id, "exit_price": float(exit_price), "closed": closed, "date": closed}
+        if fees is not None:
+            update["fees"] = float(fees)
+        self._append(update)
+
+    def delete(self, record_id):
+        if record_id in self.records:
+            self._append({"op": "delete", "id": record_id})
+
+    # ------------------------------------------
+    # שאילתות
+    # ------------------------------------------
+    def symbols(self):
+        return sorted(symbol for symbol, ids in self._by_symbol.items() if ids)
+
+    def tags(self):
+        return sorted(tag for tag, ids in self._by_tag.items() if ids)
+
+    def _date_index(self):
+        if self._dates is None:
+            self._dates = sorted((record["date"], record_id) for record_id, record in self.records.items())
+        return self._dates
+
+    def _words_matching(self, prefix):
+        """כל המילים באינדקס שמתחילות ב-prefix (המילה האחרונה בחיפוש יכולה להיות חלקית)"""
+        if self._vocabulary is None:
+            self._vocabulary = sorted(word for word, ids in self._by_word.items() if ids)
+        start = bisect_left(self._vocabulary, prefix)
+        end = bisect_left(self._vocabulary, prefix + "\uffff")
+        return self._vocabulary[start:end]
+
+    def search_ids(self, start=None, end=None, symbol=None, tag=None, query=None, kind=None):
+        """ה-id-ים שעונים על כל המסננים, מהחדש לישן"""
+        with self._lock:
+            candidates = None
+
+            def narrow(ids):
+                nonlocal candidates
+                candidates = set(ids) if candidates is None else candidates & ids
+
+            if symbol:
+                narrow(self._by_symbol.get(symbol.upper(), set()))
+            if tag:
+                narrow(self._by_tag.get(tag.lower(), set()))
+            words = [token.lower() for token in _TOKEN.findall(query or "")]
+            for position, word in enumerate(words):
+                if position == len(words) - 1:
+                    matched = set()
+                    for full in self._words_matching(word):
+                        matched |= self._by_word[full]
+                    narrow(matched)
+                else:
+                    narrow(self._by_word.get(word, set()))
+
+            dates = self._date_index()
+            low = bisect_left(dates, (_day(start),)) if start else 0
+            high = bisect_right(dates, (_day(end), "\uffff")) if end else len(dates)
+            ids = [record_id for _, record_id in reversed(dates[low:high])
+                   if candidates is None or record_id in candidates]
+            if kind:
+                ids = [record_id for record_id in ids if self.records[record_id].get("kind") == kind]
+            return ids
+
+    def entries(self, limit=None, **filters):
+        ids = self.search_ids(**filters)
+        return [self.records[record_id] for record_id in (ids if limit is None else ids[:limit])]
+
+    def trade_table(self):
+        """כל העסקאות כ-DataFrame (אינדקס = id) עם pnl ו-return_pct; נבנה מחדש רק אחרי שינוי"""
+        with self._lock:
+            if self._trades is None:
+                rows = [record for record in self.records.values() if record.get("kind") == "trade"]
+                frame = pd.DataFrame(rows, columns=["id"] + TRADE_FIELDS).set_index("id")
+                for column in ("quantity", "entry_price", "exit_price", "fees"):
+                    frame[column] = pd.to_numeric(frame[column], errors="coerce")
+                frame["fees"] = frame["fees"].fillna(0.0)
+                sign = np.where(frame["side"] == "short", -1.0, 1.0)
+                frame["pnl"] = (frame["exit_price"] - frame["entry_price"]) * frame["quantity"] * sign - frame["fees"]
+                frame["return_pct"] = (frame["exit_price"] / frame["entry_price"] - 1) * sign * 100
+                frame["exposure"] = np.where(frame["exit_price"].isna(), frame["entry_price"] * frame["quantity"] * sign, 0.0)
+                self._trades = frame.sort_values("date", ascending=False, kind="stable")
+            return self._trades
+
+    def trades(self, **filters):
+        """טבלת העסקאות אחרי המסננים של search_ids"""
+        table = self.trade_table()
+        if not any(filters.values()):
+            return table
+        return table.loc[table.index.intersection(self.search_ids(kind="trade", **filters), sort=False)]
+
+# ==========================================
+# אגרגציות
+# ==========================================
+def trade_stats(trades):
+    """סיכום: עסקאות סגורות/פתוחות, רווח כולל, אחוז הצלחה, ממוצעי רווח/הפסד, profit factor וחשיפה"""
+    closed = trades[trades["exit_price"].notna()]
+    pnl = closed["pnl"]
+    wins, losses = pnl[pnl > 0], pnl[pnl < 0]
+    open_trades = trades[trades["exit_price"].isna()]
+    return {
+        "closed": int(len(closed)),
+        "open": int(len(open_trades)),
+        "total_pnl": float(pnl.sum()),
+        "win_rate": float(len(wins) / len(closed) * 100) if len(closed) else None,
+        "avg_win": float(wins.mean()) if len(wins) else None,
+        "avg_loss": float(losses.mean()) if len(losses) else None,
+        "profit_factor": float(wins.sum() / -losses.sum()) if len(losses) else None,
+        "gross_exposure": float(open_trades["exposure"].abs().sum()),
+        "net_exposure": float(open_trades["exposure"].sum()),
+    }
+
+def pnl_by(trades, key="symbol"):
+    """רווח, מספר עסקאות ואחוז הצלחה לפי symbol / month / side (עסקאות סגורות בלבד)"""
+    closed = trades[trades["exit_price"].notna()]
+    keys = closed["closed"].str[:7] if key == "month" else closed[key]
+    grouped = closed.assign(win=closed["pnl"] > 0).groupby(keys.rename(key))
+    summary = grouped.agg(pnl=("pnl", "sum"), trades=("pnl", "size"), win_rate=("win", "mean"))
+    summary["win_rate"] *= 100
+    return summary.sort_index() if key == "month" else summary.sort_values("pnl", ascending=False)
+
+def equity_curve(trades):
+    """רווח מצטבר לפי תאריך סגירה"""
+    closed = trades[trades["exit_price"].notna()]
+    daily = closed.groupby("closed")["pnl"].sum().sort_index()
+    return daily.cumsum()
+
+_default_journal = None
+_default_lock = threading.Lock()
+
+def get_journal():
+    """יומן יחיד לכל התהליך - ב-Streamlit כל rerun רק קורא את מה שנוסף ללוג"""
+    global _default_journal
+    with _default_lock:
+        if _default_journal is None:
+            _default_journal = Journal()
+    _default_journal.refresh()
+    return _default_journal
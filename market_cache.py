@@ -0,0 +1,142 @@
+# קובץ: market_cache.py
+# מטמון מקומי משותף למחירים חיים - משמש גם את app.py וגם את scheduler.py
+#
+# הנתונים נשמרים בקובץ SQLite אחד (WAL), כך שכמה תהליכים יכולים לקרוא ולכתוב במקביל.
+# TTL למחיר, פינוי לפי LRU (זמן גישה אחרון) ולפי מספר רשומות,
+# ו-stale-while-revalidate: ערך ישן מוחזר מיד ומתרענן ברקע.
+# נרות לא נשמרים כאן - הם נשמרים מצטברים בקבצים של history_store.py.
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+
+import settings
+
+class MarketCache:
+    """מטמון מחירים על הדיסק"""
+
+    def __init__(self, path=settings.CACHE_PATH, quote_ttl=settings.QUOTE_TTL,
+                 max_quotes=settings.CACHE_MAX_QUOTES):
+        self.path = path
+        self.quote_ttl = quote_ttl
+        self.max_quotes = max_quotes
+        self._refreshing = set()  # מפתחות שכבר מתרעננים ברקע
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._db() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS quotes (
+                symbol TEXT PRIMARY KEY, price REAL NOT NULL,
+                fetched_at REAL NOT NULL, accessed_at REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_quotes_accessed ON quotes(accessed_at)")
+            # טבלת הנרות מגרסאות קודמות - הנרות עברו ל-history_store
+            conn.execute("DROP TABLE IF EXISTS bars")
+
+    @contextmanager
+    def _db(self):
+        # חיבור קצר לכל פעולה - בטוח לשימוש מכמה threads ומכמה תהליכים
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+            with conn:
+                yield conn
+
+    # ------------------------------------------
+    # מחירים חיים
+    # ------------------------------------------
+    def get_quotes(self, symbols, fetch, stale_ok=False):
+        """
+        מחזיר (prices, failures) כמו fetch.
+        fetch(symbols) נקרא רק עבור סימולים שחסרים או שפג תוקפם.
+        stale_ok=True מחזיר מחיר ישן מיד ומרענן אותו ברקע.
+        """
+        symbols = sorted(set(symbols))
+        if not symbols:
+            return {}, {}
+        now = time.time()
+        cached = self._read_quotes(symbols, now)
+
+        prices, stale, missing = {}, [], []
+        for symbol in symbols:
+            if symbol not in cached:
+                missing.append(symbol)
+                continue
+            price, fetched_at = cached[symbol]
+            if now - fetched_at < self.quote_ttl:
+                prices[symbol] = price
+            elif stale_ok:
+                prices[symbol] = price
+                stale.append(symbol)
+            else:
+                missing.append(symbol)
+
+        failures = {}
+        if missing:
+            fetched, failures = fetch(missing)
+            self.put_quotes(fetched)
+            prices.update(fetched)
+        if stale:
+            self._revalidate(("quotes",) + tuple(stale), lambda: self.put_quotes(fetch(stale)[0]))
+        return prices, failures
+
+    def put_quotes(self, prices):
+        if not prices:
+            return
+        now = time.time()
+        with self._db() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO quotes (symbol, price, fetched_at, accessed_at) VALUES (?, ?, ?, ?)",
+                [(symbol, float(price), now, now) for symbol, price in prices.items()])
+        self.evict()
+
+    def _read_quotes(self, symbols, now):
+        result = {}
+        with self._db() as conn:
+            # SQLite מגביל את מספר הפרמטרים בשאילתה - קריאה במנות
+            for start in range(0, len(symbols), 500):
+                chunk = symbols[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                for symbol, price, fetched_at in conn.execute(
+                        f"SELECT symbol, price, fetched_at FROM quotes WHERE symbol IN ({marks})", chunk):
+                    result[symbol] = (price, fetched_at)
+                conn.execute(f"UPDATE quotes SET accessed_at = ? WHERE symbol IN ({marks})", [now] + chunk)
+        return result
+
+    # ------------------------------------------
+    # ריענון ברקע ופינוי
+    # ------------------------------------------
+    def _revalidate(self, key, refresh):
+        """הרצת refresh ב-thread רקע, פעם אחת בלבד לכל מפתח בו-זמנית"""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                refresh()
+            except Exception as e:
+                print(f"⚠️ Background refresh failed for {key[1:]}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def evict(self):
+        """פינוי המחירים שנגעו בהם הכי מזמן, עד שהמטמון חוזר לגבול מספר הרשומות"""
+        with self._db() as conn:
+            quotes = conn.execute("SELECT COUNT(*) FROM quotes").fetchone()[0]
+            if quotes > self.max_quotes:
+                conn.execute("""DELETE FROM quotes WHERE symbol IN (
+                    SELECT symbol FROM quotes ORDER BY accessed_at LIMIT ?)""", (quotes - self.max_quotes,))
+
+_default_cache = None
+
+def get_cache():
+    """מופע מטמון יחיד לכל התהליך"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = MarketCache()
+    return _default_cache
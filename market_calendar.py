@@ -0,0 +1,159 @@
+# קובץ: market_calendar.py
+# לוח מסחר: האם השוק של סימול פתוח עכשיו, ומתי הוא נפתח שוב
+#
+# מניות ארה"ב (ברירת המחדל): 9:30-16:00 שעון ניו יורק בימי חול, בלי חגי NYSE (מחושבים מהכללים,
+# כולל חג שנופל בסופ"ש) ועם סגירה מוקדמת ב-13:00. קריפטו (BTC-USD) נסחר 24/7,
+# מט"ח (=X) וחוזים (=F) מיום א' ב-17:00 עד שישי ב-17:00 (ניו יורק).
+# סימולים מבורסות אחרות (סיומת .TA, .L וכו') נחשבים תמיד פתוחים - עדיף לבדוק לשווא מאשר לפספס.
+
+from datetime import date, datetime, time as dtime, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+import settings
+
+NEW_YORK = ZoneInfo("America/New_York")
+US_OPEN, US_CLOSE, US_EARLY_CLOSE = dtime(9, 30), dtime(16, 0), dtime(13, 0)
+# מט"ח וחוזים: פתיחה ביום א' וסגירה ביום ו' באותה שעה
+WEEKLY_ROLLOVER = dtime(17, 0)
+
+# מטבעות הציטוט של זוגות קריפטו ב-Yahoo (BTC-USD, ETH-EUR). BRK-B הוא מניה, לא קריפטו
+CRYPTO_QUOTES = {"USD", "USDT", "USDC", "EUR", "GBP", "ILS", "JPY", "BTC", "ETH"}
+
+def market_for(symbol):
+    """'crypto' / 'fx' / 'futures' / 'us' / 'other'"""
+    symbol = symbol.upper()
+    if symbol.endswith("=X"):
+        return "fx"
+    if symbol.endswith("=F"):
+        return "futures"
+    if "-" in symbol and symbol.rsplit("-", 1)[1] in CRYPTO_QUOTES:
+        return "crypto"
+    if "." in symbol.lstrip("^"):
+        return "other"
+    return "us"
+
+# ==========================================
+# חגי NYSE
+# ==========================================
+def _easter(year):
+    """יום ראשון של הפסחא (האלגוריתם הגרגוריאני האנונימי)"""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return date(year, month, day)
+
+def _nth_weekday(year, month, weekday, n):
+    """היום ה-n (מ-1) בחודש עם weekday נתון; n=-1 = האחרון"""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _observed(day):
+    """חג בשבת נצפה ביום ו', חג בראשון - ביום ב'"""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+@lru_cache(maxsize=None)
+def us_holidays(year):
+    days = {
+        _nth_weekday(year, 1, 0, 3),       # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),       # Washington's Birthday
+        _easter(year) - timedelta(days=2), # Good Friday
+        _nth_weekday(year, 5, 0, -1),      # Memorial Day
+        _observed(date(year, 7, 4)),       # Independence Day
+        _nth_weekday(year, 9, 0, 1),       # Labor Day
+        _nth_weekday(year, 11, 3, 4),      # Thanksgiving
+        _observed(date(year, 12, 25)),     # Christmas
+    }
+    # ראש השנה בשבת לא נצפה ביום ו' (31/12 הוא יום מסחר רגיל)
+    if date(year, 1, 1).weekday() != 5:
+        days.add(_observed(date(year, 1, 1)))
+    if year >= 2022:
+        days.add(_observed(date(year, 6, 19))) # Juneteenth
+    # ימי סגירה מיוחדים (למשל יום אבל לאומי) מההגדרות
+    for text in settings.MARKET_EXTRA_HOLIDAYS.split(","):
+        text = text.strip()
+        if text.startswith(f"{year}-"):
+            days.add(date.fromisoformat(text))
+    return frozenset(days)
+
+@lru_cache(maxsize=None)
+def us_early_closes(year):
+    """ימי מסחר שנסגרים ב-13:00: 3/7, יום שישי אחרי חג ההודיה ו-24/12 (כשהם ימי חול רגילים)"""
+    days = {_nth_weekday(year, 11, 3, 4) + timedelta(days=1)}
+    for day in (date(year, 7, 3), date(year, 12, 24)):
+        if day.weekday() < 4:
+            days.add(day)
+    return frozenset(days - us_holidays(year))
+
+def us_session(day):
+    """(פתיחה, סגירה) כ-datetime בשעון ניו יורק ליום מסחר, או None ליום סגור"""
+    if day.weekday() >= 5 or day in us_holidays(day.year):
+        return None
+    close = US_EARLY_CLOSE if day in us_early_closes(day.year) else US_CLOSE
+    return datetime.combine(day, US_OPEN, NEW_YORK), datetime.combine(day, close, NEW_YORK)
+
+# ==========================================
+# שאילתות
+# ==========================================
+def _now(now):
+    if now is None:
+        return datetime.now(timezone.utc)
+    if isinstance(now, (int, float)):
+        return datetime.fromtimestamp(now, timezone.utc)
+    return now
+
+def _weekly_open(local):
+    """מט"ח/חוזים: פתוח מראשון 17:00 עד שישי 17:00. מחזיר את זמן הפתיחה הבא (או local אם פתוח)"""
+    weekday, clock = local.weekday(), local.time()
+    if weekday == 5 or (weekday == 4 and clock >= WEEKLY_ROLLOVER) or (weekday == 6 and clock < WEEKLY_ROLLOVER):
+        sunday = local.date() + timedelta(days=(6 - weekday) % 7)
+        return datetime.combine(sunday, WEEKLY_ROLLOVER, NEW_YORK)
+    return local
+
+def next_open(symbol, now=None, grace=None):
+    """
+    הזמן (datetime עם אזור זמן) שממנו כדאי לבדוק את הסימול שוב: now עצמו אם השוק פתוח,
+    אחרת הפתיחה הבאה. עד grace דקות אחרי הסגירה השוק עוד נחשב פתוח (כדי לקלוט את מחיר הסגירה).
+    """
+    now = _now(now)
+    if not settings.MARKET_HOURS:
+        return now
+    market = market_for(symbol)
+    if market in ("crypto", "other"):
+        return now
+    local = now.astimezone(NEW_YORK)
+    if market in ("fx", "futures"):
+        return max(now, _weekly_open(local))
+
+    grace = timedelta(minutes=settings.MARKET_CLOSE_GRACE_MINUTES if grace is None else grace)
+    day = local.date()
+    for offset in range(0, 15):
+        session = us_session(day + timedelta(days=offset))
+        if session is None:
+            continue
+        opens, closes = session
+        if local < closes + grace:
+            return max(now, opens)
+    return now # לא אמור לקרות (אין שבועיים רצופים בלי מסחר)
+
+def is_open(symbol, now=None, grace=None):
+    now = _now(now)
+    return next_open(symbol, now, grace) <= now
+
+def open_symbols(symbols, now=None):
+    """הסימולים שהשוק שלהם פתוח כרגע"""
+    now = _now(now)
+    return {symbol for symbol in symbols if is_open(symbol, now)}
@@ -0,0 +1,95 @@
+# קובץ: market_snapshot.py
+# תמונת מצב של מדדי השוק (S&P 500, NASDAQ, BTC, VIX) - אחת לכל התהליך
+#
+# thread ברקע מרענן את כל המדדים בהורדה מקובצת אחת כל MARKET_SNAPSHOT_SECONDS,
+# וכל סשן של Streamlit רק קורא את העותק שבזיכרון - טעינת עמוד לא מחכה לרשת,
+# ו-100 משתמשים עולים בדיוק כמו משתמש אחד (stale-while-revalidate).
+# אחרי MARKET_SNAPSHOT_IDLE_SECONDS בלי קוראים הרענון נעצר, וקריאה הבאה מעירה אותו.
+
+import threading
+import time
+
+import settings
+from indicators import daily_snapshot
+from yahoo_gateway import INTERACTIVE
+
+# שם תצוגה -> סימול ב-Yahoo
+INDEX_SYMBOLS = {"S&P 500": "^GSPC", "NASDAQ": "^NDX", "BTC": "BTC-USD", "VIX": "^VIX"}
+
+class MarketSnapshot:
+    """
+    get() מחזיר (values, updated_at): values = {שם: (מחיר, שינוי %)}, updated_at = epoch של הרענון המוצלח האחרון
+    (None לפני הרענון הראשון - ואז values ריק).
+    """
+
+    def __init__(self, symbols=None, refresh_seconds=None, idle_seconds=None, fetch=None):
+        self.symbols = dict(symbols or INDEX_SYMBOLS)
+        self.refresh_seconds = refresh_seconds or settings.MARKET_SNAPSHOT_SECONDS
+        self.idle_seconds = idle_seconds or settings.MARKET_SNAPSHOT_IDLE_SECONDS
+        self.fetch = fetch or (lambda symbols: daily_snapshot(symbols, period='5d', priority=INTERACTIVE))
+        self.values = {}
+        self.updated_at = None
+        self.error = None
+        self._last_read = time.time()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="market-snapshot", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def get(self):
+        self._last_read = time.time()
+        if self.is_stale():
+            self._wake.set() # ה-thread אולי ישן כי לא היו קוראים - רענון ברקע, בלי לחכות לו
+        return self.values, self.updated_at
+
+    def is_stale(self):
+        return self.updated_at is None or time.time() - self.updated_at >= self.refresh_seconds
+
+    def refresh(self):
+        """רענון אחד (בהורדה אחת לכל המדדים). בכישלון נשארים הערכים הקודמים"""
+        try:
+            snapshot = self.fetch(list(self.symbols.values()))
+            values = {}
+            for name, symbol in self.symbols.items():
+                if symbol in snapshot.index:
+                    row = snapshot.loc[symbol]
+                    values[name] = (float(row['price']), float(row['change_pct']))
+            if not values:
+                raise ValueError("no quotes returned")
+            # החלפה של המילון כולו - קורא במקביל רואה את הישן או את החדש, אף פעם לא חצי
+            self.values = {**self.values, **values}
+            self.updated_at = time.time()
+            self.error = None
+        except Exception as e:
+            self.error = str(e)
+            print(f"⚠️ Market snapshot refresh failed: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            if time.time() - self._last_read < self.idle_seconds:
+                self.refresh()
+                delay = self.refresh_seconds if self.error is None else min(self.refresh_seconds, 10)
+            else:
+                delay = None # אין קוראים - ישנים עד ה-get הבא
+            self._wake.wait(delay)
+            self._wake.clear()
+
+_default_snapshot = None
+_default_lock = threading.Lock()
+
+def get_market_snapshot():
+    """שירות יחיד לכל התהליך (ה-thread מתחיל בקריאה הראשונה)"""
+    global _default_snapshot
+    with _default_lock:
+        if _default_snapshot is None:
+            _default_snapshot = MarketSnapshot().start()
+    return _default_snapshot
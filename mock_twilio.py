@@ -0,0 +1,147 @@
+# קובץ: mock_twilio.py
+# שרת Twilio מדומה לבדיקות עומס של notifier.py - מקבל הודעות ב-Messages API בלי לשלוח כלום
+#
+# שרת בלבד (ואז להריץ את ה-scheduler עם TWILIO_API_URL=http://127.0.0.1:8765):
+#   python mock_twilio.py --port 8765 --latency 0.2 --error-rate 0.05
+# בדיקת עומס (שרת + שליחת הודעות דרך ה-Dispatcher):
+#   python mock_twilio.py --load 5000 --concurrency 32 --rate 200
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+MESSAGES_PATH = re.compile(r"^/2010-04-01/Accounts/(\w+)/Messages\.json$")
+
+class MockTwilio:
+    """
+    latency - השהיה לכל הודעה (שניות), error_rate - חלק מההודעות שיחזירו 429/500.
+    stats סופר את התשובות, ו-duplicates הודעות זהות (אותו נמען ואותו תוכן) שהתקבלו יותר מפעם אחת.
+    """
+
+    def __init__(self, port=8765, host="127.0.0.1", latency=0.0, error_rate=0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.stats = Counter()
+        self.seen = Counter()
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self._server.server_port if self._server else self.port}"
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.seen.values() if count > 1)
+
+    def _handle(self, account_sid, form):
+        if self.latency:
+            time.sleep(self.latency * random.uniform(0.5, 1.5))
+        if random.random() < self.error_rate:
+            status = random.choice((429, 500))
+            with self._lock:
+                self.stats[status] += 1
+            return status, {"code": 20429 if status == 429 else 20500, "status": status,
+                            "message": "Too Many Requests" if status == 429 else "Internal Server Error"}
+        to, body = form.get("To", [""])[0], form.get("Body", [""])[0]
+        with self._lock:
+            self.stats[201] += 1
+            self.seen[(to, body)] += 1
+        return 201, {"sid": "SM" + uuid.uuid4().hex, "account_sid": account_sid, "to": to,
+                     "from": form.get("From", [""])[0], "body": body, "status": "queued",
+                     "num_segments": "1", "direction": "outbound-api", "api_version": "2010-04-01"}
+
+    def start(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # keep-alive, כמו ה-API האמיתי
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                form = parse_qs(self.rfile.read(length).decode("utf-8"))
+                match = MESSAGES_PATH.match(self.path.split("?")[0])
+                if not match:
+                    status, payload = 404, {"code": 20404, "status": 404, "message": "Not found"}
+                else:
+                    status, payload = mock._handle(match.group(1), form)
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+async def load_test(mock, count, concurrency, rate, burst):
+    """שליחת count הודעות דרך Dispatcher אמיתי מול השרת המדומה ומדידת קצב"""
+    from notifier import Dispatcher, TwilioSender
+
+    sender = TwilioSender("AC" + "0" * 32, "token", "+15550000000", base_url=mock.url)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        dispatcher = Dispatcher(sender, log_path=os.path.join(tmpdir, "notifications.db"),
+                                concurrency=concurrency, rate=rate, burst=burst)
+        for i in range(count):
+            dispatcher.submit(f"load:{i}", f"rule-{i % 500}", f"+97250{i:07d}", f"🚀 SYM{i % 500} broke above {i}")
+        # הגשה חוזרת של אותם מפתחות - צריכה להיחסם ע"י מפתח ה-idempotency
+        for i in range(0, count, 10):
+            dispatcher.submit(f"load:{i}", f"rule-{i % 500}", f"+97250{i:07d}", f"🚀 SYM{i % 500} broke above {i}")
+        started = time.perf_counter()
+        await dispatcher.deliver_all()
+        elapsed = time.perf_counter() - started
+        dispatcher.close_log()
+
+    stats = dispatcher.stats
+    print(f"📨 {stats['sent']} sent, {stats['failed']} failed, {stats['duplicates']} duplicate submits blocked "
+          f"in {elapsed:.2f}s ({stats['sent'] / elapsed * 60:,.0f} msgs/min)")
+    print(f"🖥️ Server: {dict(mock.stats)}, duplicate deliveries: {mock.duplicates}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Twilio Messages API")
+    parser.add_argument("--port", type=int, default=8765, help="0 = any free port")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per message")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="fraction of requests answered with 429/500")
+    parser.add_argument("--load", type=int, default=0, help="run a load test with this many notifications and exit")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rate", type=float, default=500.0, help="dispatcher rate limit (messages per second)")
+    parser.add_argument("--burst", type=int, default=50)
+    args = parser.parse_args()
+
+    mock = MockTwilio(args.port, latency=args.latency, error_rate=args.error_rate).start()
+    print(f"🧪 Mock Twilio listening on {mock.url}")
+    try:
+        if args.load:
+            asyncio.run(load_test(mock, args.load, args.concurrency, args.rate, args.burst))
+        else:
+            threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+# קובץ: notifier.py
+# שליחת התראות וואטסאפ (Twilio) ברקע - במקום send_whatsapp_message שחוסם את הסריקה
+#
+# התראה שהופעלה נרשמת ביומן (SQLite, outbox) ונכנסת לתור. מספר קבוע של שולחים אסינכרוניים
+# מרוקן את התור, עם הגבלת קצב משותפת (token bucket) וניסיונות חוזרים עם המתנה מעריכית.
+# לכל התראה מפתח ייחודי (idempotency key): התראה שכבר נרשמה לא נשלחת שוב, והתראות שלא נשלחו
+# לפני נפילה נשלחות בהפעלה הבאה. כלל חוזר לא שולח שוב לפני שעבר זמן ה-cooldown.
+#
+# הגדרת Twilio במשתני סביבה: TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_WHATSAPP_FROM
+# ו-TWILIO_API_URL (אופציונלי - למשל שרת ה-mock מ-mock_twilio.py).
+
+import asyncio
+import os
+import random
+import re
+import sqlite3
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from twilio.base.exceptions import TwilioRestException
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client
+
+import scan_metrics
+import settings
+
+TWILIO_API_URL = "https://api.twilio.com"
+
+Notification = namedtuple("Notification", ["key", "rule_key", "phone", "body", "created_at"])
+
+class SendError(Exception):
+    """כישלון שליחה. retryable=False - אין טעם לנסות שוב (למשל מספר לא תקין)"""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+def whatsapp_address(phone):
+    """'+972 50-123-4567' / 972501234567 -> 'whatsapp:+972501234567' (None אם אין מספר)"""
+    phone = str(phone or '').strip()
+    if phone.startswith('whatsapp:'):
+        return phone
+    digits = re.sub(r"[^\d]", "", phone)
+    return f"whatsapp:+{digits}" if digits else None
+
+def alert_key(rule, side, when):
+    """
+    מפתח ההתראה. לכלל חד-פעמי הוא קבוע (הכלל יכול לפעול רק פעם אחת),
+    ולכלל חוזר הוא כולל את זמן ההפעלה.
+    """
+    threshold = {'min': rule.min_price, 'max': rule.max_price, 'change': rule.change_pct, 'volume': rule.min_volume}[side]
+    base = f"{rule.key}:{rule.symbol}:{side}:{threshold:g}:{rule.phone}"
+    return f"{base}:once" if rule.is_one_time else f"{base}:{when}"
+
+class _BaseUrlHttpClient(TwilioHttpClient):
+    """הפניית בקשות ה-API לכתובת אחרת (שרת mock)"""
+
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, url, *args, **kwargs):
+        if url.startswith(TWILIO_API_URL):
+            url = self.base_url + url[len(TWILIO_API_URL):]
+        return super().request(method, url, *args, **kwargs)
+
+class TwilioSender:
+    """שליחה דרך Twilio. send() חוסם ולכן רץ ב-thread"""
+
+    def __init__(self, account_sid, auth_token, from_number, base_url=None, timeout=10):
+        if base_url and base_url.rstrip('/') != TWILIO_API_URL:
+            http_client = _BaseUrlHttpClient(base_url, timeout=timeout)
+        else:
+            http_client = TwilioHttpClient(timeout=timeout)
+        self.client = Client(account_sid, auth_token, http_client=http_client)
+        self.from_ = whatsapp_address(from_number)
+
+    def send(self, notification):
+        """מחזיר את ה-sid של ההודעה, או זורק SendError"""
+        to = whatsapp_address(notification.phone)
+        if not to:
+            raise SendError("no phone number", retryable=False)
+        try:
+            return self.client.messages.create(to=to, from_=self.from_, body=notification.body).sid
+        except TwilioRestException as e:
+            # 429 ו-5xx זמניים; שאר שגיאות ה-4xx (מספר לא תקין וכו') סופיות
+            raise SendError(f"Twilio {e.status}: {e.msg}", retryable=e.status == 429 or e.status >= 500) from e
+        except Exception as e:
+            raise SendError(str(e)) from e # שגיאת רשת
+
+def make_sender():
+    """שולח לפי משתני הסביבה, או None אם Twilio לא מוגדר"""
+    sid = os.environ.get("TWILIO_ACCOUNT_SID")
+    token = os.environ.get("TWILIO_AUTH_TOKEN")
+    from_number = os.environ.get("TWILIO_WHATSAPP_FROM")
+    if not (sid and token and from_number):
+        return None
+    return TwilioSender(sid, token, from_number, base_url=os.environ.get("TWILIO_API_URL"))
+
+class TokenBucket:
+    """הגבלת קצב: rate אסימונים לשנייה, עד burst ברצף"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class Dispatcher:
+    """
+    תור ההתראות והשולחים שלו.
+    submit() סינכרוני ולא חוסם - אפשר לקרוא לו מתוך הסריקה. השליחה עצמה רצה ב-start()/deliver_all().
+    """
+
+    def __init__(self, sender, log_path=None, concurrency=None, rate=None, burst=None,
+                 max_retries=None, cooldown=None, max_age=None):
+        self.sender = sender
+        self.concurrency = concurrency or settings.NOTIFY_CONCURRENCY
+        self.max_retries = max_retries or settings.NOTIFY_MAX_RETRIES
+        self.cooldown = settings.NOTIFY_COOLDOWN_SECONDS if cooldown is None else cooldown
+        self.max_age = max_age or settings.NOTIFY_MAX_AGE_SECONDS
+        self.bucket = TokenBucket(rate or settings.NOTIFY_RATE, burst or settings.NOTIFY_BURST)
+        self.stats = Counter()
+        self._queue = None
+        self._workers = []
+        self._executor = None
+        self._warned = False
+
+        log_path = log_path or settings.NOTIFY_LOG_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+        self._conn = sqlite3.connect(log_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS notifications (
+                key TEXT PRIMARY KEY,
+                rule_key TEXT NOT NULL,
+                phone TEXT NOT NULL,
+                body TEXT NOT NULL,
+                status TEXT NOT NULL,          -- pending / sent / failed / expired / skipped
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                sid TEXT,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS notifications_status ON notifications (status);
+            CREATE INDEX IF NOT EXISTS notifications_rule ON notifications (rule_key, created_at);
+        """)
+        # יומן של שבוע מספיק גם ל-cooldown וגם לבדיקת כפילויות
+        self._conn.execute("DELETE FROM notifications WHERE created_at < ?", (time.time() - 7 * 24 * 3600,))
+        self._conn.commit()
+        self._last_sent = dict(self._conn.execute(
+            "SELECT rule_key, MAX(created_at) FROM notifications GROUP BY rule_key"))
+
+    @property
+    def running(self):
+        return bool(self._workers)
+
+    def in_cooldown(self, rule_key, now=None, last_alert=None):
+        """
+        האם הכלל שלח התראה בחלון ה-cooldown האחרון.
+        last_alert (epoch, מעמודת last_alert במאגר) הוא המקור הקובע - הוא שורד בין הרצות cron על מכונות נקיות.
+        היומן המקומי רק משלים אותו (התראה מהסריקה הנוכחית שעוד לא נכתבה למאגר).
+        """
+        last = max(filter(None, (self._last_sent.get(str(rule_key)), last_alert)), default=None)
+        return last is not None and (now or time.time()) - last < self.cooldown
+
+    def submit(self, key, rule_key, phone, body):
+        """רישום התראה ביומן והכנסתה לתור. מחזיר False אם המפתח כבר נרשם בעבר"""
+        now = time.time()
+        rule_key = str(rule_key)
+        status = 'pending' if self.sender and phone else 'skipped'
+        cursor = self._conn.execute(
+            """INSERT OR IGNORE INTO notifications (key, rule_key, phone, body, status, created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""", (key, rule_key, str(phone or ''), body, status, now, now))
+        if not cursor.rowcount:
+            self.stats['duplicates'] += 1
+            return False
+        self._last_sent[rule_key] = now
+        if status == 'skipped':
+            self.stats['skipped'] += 1
+        elif self._queue is not None:
+            self._queue.put_nowait(Notification(key, rule_key, phone, body, now))
+        return True
+
+    def commit(self):
+        self._conn.commit()
+
+    def close_log(self):
+        self._conn.close()
+
+    def pending(self):
+        """התראות שנרשמו ועוד לא נשלחו (כולל כאלה שנשארו מהפעלה קודמת)"""
+        rows = self._conn.execute(
+            "SELECT key, rule_key, phone, body, created_at FROM notifications WHERE status = 'pending' ORDER BY created_at")
+        return [Notification(*row) for row in rows]
+
+    async def start(self):
+        """הפעלת השולחים. התראות שממתינות ביומן נכנסות לתור"""
+        if self.running:
+            return
+        self.commit()
+        self._queue = asyncio.Queue()
+        # thread לכל שולח - send() של Twilio חוסם עד שמתקבלת תשובה
+        self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix="notify")
+        for notification in self.pending():
+            self._queue.put_nowait(notification)
+        if self.sender is None and not self._warned:
+            self._warned = True
+            print("📵 WhatsApp is not configured (TWILIO_* environment variables) - alerts are logged only.")
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def close(self, timeout=30.0):
+        """המתנה (עד timeout) לריקון התור ועצירת השולחים"""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ {self._queue.qsize()} notifications still queued - they will be sent on the next run.")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        self._executor.shutdown(wait=False)
+        self._executor = None
+        self.commit()
+
+    async def deliver_all(self, timeout=None):
+        """שליחת כל ההתראות הממתינות ויציאה - לסריקה חד-פעמית"""
+        await self.start()
+        await self.close(timeout)
+
+    async def _worker(self):
+        while True:
+            notification = await self._queue.get()
+            try:
+                await self._deliver(notification)
+            except Exception as e:
+                print(f"❌ Notification {notification.key} crashed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _mark(self, notification, status, attempts, sid=None, error=None):
+        self._conn.execute(
+            "UPDATE notifications SET status = ?, attempts = ?, sid = ?, error = ?, updated_at = ? WHERE key = ?",
+            (status, attempts, sid, error, time.time(), notification.key))
+        self.stats[status] += 1
+
+    async def _deliver(self, notification):
+        metrics = scan_metrics.current()
+        if time.time() - notification.created_at > self.max_age:
+            self._mark(notification, 'expired', 0)
+            return
+        for attempt in range(1, self.max_retries + 1):
+            await self.bucket.acquire()
+            try:
+                sid = await asyncio.get_running_loop().run_in_executor(self._executor, self.sender.send, notification)
+            except SendError as e:
+                if not e.retryable or attempt == self.max_retries:
+                    print(f"❌ WhatsApp to {notification.phone} failed after {attempt} attempts: {e}")
+                    self._mark(notification, 'failed', attempt, error=str(e))
+                    metrics.inc('notifications_failed')
+                    return
+                # המתנה מעריכית עם jitter כדי שהשולחים לא יחזרו יחד
+                await asyncio.sleep(min(60.0, 2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+                continue
+            self._mark(notification, 'sent', attempt, sid=sid)
+            metrics.inc('notifications_sent')
+            return
+
+_dispatcher = None
+
+def get_dispatcher():
+    """Dispatcher משותף לכל התהליך, עם שולח Twilio לפי משתני הסביבה"""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = Dispatcher(make_sender())
+    return _dispatcher
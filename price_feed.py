@@ -0,0 +1,209 @@
+# קובץ: price_feed.py
+# ספקי מחירים בזרימה (streaming) למצב --stream של ה-scheduler
+#
+# כל ספק (PriceFeed) דוחף Tick-ים ל-sink אסינכרוני. ה-sink הוא בדרך כלל TickCoalescer:
+# רצף tick-ים לאותו סימול מתאחד לאחרון בלבד, וכשיש יותר מדי סימולים ממתינים - הספק מחכה (backpressure).
+#
+# ספקים:
+# - yahoo:     WebSocket של Yahoo Finance (yf.AsyncWebSocket, בגרסאות yfinance שתומכות בו)
+# - polling:   משיכה תקופתית דרך fetch_prices - גיבוי כשאין ספק push
+# - replay:    הרצה חוזרת של קובץ CSV (timestamp,symbol,price) - לבדיקות
+# - simulated: הילוך מקרי לכל סימול בקצב קבוע - לבדיקות עומס
+
+import asyncio
+import csv
+import random
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import yfinance as yf
+
+Tick = namedtuple("Tick", ["symbol", "price", "ts"])
+
+class TickCoalescer:
+    """
+    חוצץ בין הספק לבודק הכללים.
+    מחזיק רק את ה-tick האחרון לכל סימול; put() ממתין רק כשמספר הסימולים הממתינים מגיע ל-max_pending.
+    """
+
+    def __init__(self, max_pending=5000):
+        self.max_pending = max_pending
+        self.received = 0
+        self.coalesced = 0
+        self._latest = {}
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+
+    def __len__(self):
+        return len(self._latest)
+
+    async def put(self, tick):
+        self.received += 1
+        while tick.symbol not in self._latest and len(self._latest) >= self.max_pending:
+            self._space.clear()
+            await self._space.wait()
+        if tick.symbol in self._latest:
+            self.coalesced += 1
+        self._latest[tick.symbol] = tick
+        self._ready.set()
+
+    def take(self):
+        """כל ה-tick-ים הממתינים (אחד לכל סימול), בלי המתנה"""
+        ticks = list(self._latest.values())
+        self._latest = {}
+        self._ready.clear()
+        self._space.set()
+        return ticks
+
+    async def drain(self):
+        """ממתין לפחות ל-tick אחד ומחזיר את כל הממתינים"""
+        await self._ready.wait()
+        return self.take()
+
+    def take_counts(self):
+        """(received, coalesced) מאז הקריאה הקודמת - לצורך המדדים"""
+        counts = (self.received, self.coalesced)
+        self.received = self.coalesced = 0
+        return counts
+
+class PriceFeed:
+    """ממשק ספק מחירים. run() רץ עד שמבטלים אותו ושולח כל Tick ל-sink"""
+
+    name = "base"
+
+    def __init__(self):
+        self.symbols = set()
+
+    async def set_symbols(self, symbols):
+        """עדכון רשימת הסימולים שהספק עוקב אחריהם"""
+        self.symbols = set(symbols)
+
+    async def run(self, sink):
+        raise NotImplementedError
+
+class PollingFeed(PriceFeed):
+    """משיכה תקופתית: fetch(symbols) -> (prices, failures), כמו scheduler.fetch_prices"""
+
+    name = "polling"
+
+    def __init__(self, fetch, interval=15.0):
+        super().__init__()
+        self.fetch = fetch
+        self.interval = interval
+
+    async def run(self, sink):
+        while True:
+            started = time.monotonic()
+            if self.symbols:
+                prices, _ = await asyncio.to_thread(self.fetch, set(self.symbols))
+                now = time.time()
+                for symbol, price in prices.items():
+                    await sink(Tick(symbol, float(price), now))
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+class YahooStreamFeed(PriceFeed):
+    """מחירים בזמן אמת מה-WebSocket של Yahoo Finance"""
+
+    name = "yahoo"
+
+    def __init__(self):
+        super().__init__()
+        if not hasattr(yf, "AsyncWebSocket"):
+            raise RuntimeError("this yfinance version has no AsyncWebSocket - use the polling feed")
+        self._ws = yf.AsyncWebSocket(verbose=False)
+
+    async def set_symbols(self, symbols):
+        symbols = set(symbols)
+        added, removed = symbols - self.symbols, self.symbols - symbols
+        self.symbols = symbols
+        if added:
+            await self._ws.subscribe(sorted(added))
+        if removed:
+            await self._ws.unsubscribe(sorted(removed))
+
+    async def run(self, sink):
+        async def handle(message):
+            symbol, price = message.get("id"), message.get("price")
+            if symbol and price:
+                # Yahoo שולח זמן במילישניות
+                ts = float(message.get("time", time.time() * 1000)) / 1000
+                await sink(Tick(symbol, float(price), ts))
+
+        try:
+            await self._ws.listen(handle)
+        finally:
+            await self._ws.close()
+
+class ReplayFeed(PriceFeed):
+    """
+    הרצה חוזרת של tick-ים מקובץ CSV עם עמודות timestamp,symbol,price.
+    speed=1 שומר על המרווחים המקוריים, speed=10 מהיר פי 10, speed=0 בלי המתנה בכלל.
+    """
+
+    name = "replay"
+
+    def __init__(self, path, speed=1.0):
+        super().__init__()
+        self.path = path
+        self.speed = speed
+
+    def _rows(self):
+        with open(self.path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                ts = row["timestamp"]
+                try:
+                    ts = float(ts)
+                except ValueError:
+                    ts = datetime.fromisoformat(ts).timestamp()
+                yield Tick(row["symbol"].strip().upper(), float(row["price"]), ts)
+
+    async def run(self, sink):
+        previous = None
+        for tick in self._rows():
+            if self.symbols and tick.symbol not in self.symbols:
+                continue
+            if previous is not None and self.speed:
+                await asyncio.sleep(max(0.0, (tick.ts - previous) / self.speed))
+            previous = tick.ts
+            await sink(tick)
+        print("⏹️ Replay finished.")
+
+class SimulatedFeed(PriceFeed):
+    """הילוך מקרי לכל סימול במעקב, rate tick-ים לשנייה בסך הכל"""
+
+    name = "simulated"
+
+    def __init__(self, base_prices=None, rate=100.0, volatility=0.002, seed=None):
+        super().__init__()
+        self.prices = dict(base_prices or {})
+        self.rate = rate
+        self.volatility = volatility
+        self.random = random.Random(seed)
+
+    async def run(self, sink):
+        while True:
+            symbols = sorted(self.symbols)
+            if not symbols:
+                await asyncio.sleep(0.1)
+                continue
+            symbol = self.random.choice(symbols)
+            price = self.prices.get(symbol, 100.0) * (1 + self.random.gauss(0, self.volatility))
+            self.prices[symbol] = price
+            await sink(Tick(symbol, price, time.time()))
+            await asyncio.sleep(1.0 / self.rate)
+
+def make_feed(kind, fetch=None, replay_file=None, speed=1.0, poll_interval=15.0, rate=100.0):
+    """יצירת ספק לפי שם"""
+    if kind == "yahoo":
+        return YahooStreamFeed()
+    if kind == "polling":
+        return PollingFeed(fetch, interval=poll_interval)
+    if kind == "replay":
+        if not replay_file:
+            raise ValueError("the replay feed needs --replay-file")
+        return ReplayFeed(replay_file, speed=speed)
+    if kind == "simulated":
+        return SimulatedFeed(rate=rate)
+    raise ValueError(f"Unknown price feed: {kind}")
@@ -0,0 +1,214 @@
+# קובץ: rule_index.py
+# אינדקס ספים ממוין - הכללים מקומפלים פעם אחת, וכל מחיר חדש נבדק ב-bisect ולא בסריקה של כל השורות
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+class CompiledRule:
+    """כלל התראה פעיל אחרי המרה חד-פעמית למספרים"""
+    __slots__ = ('row', 'rule_id', 'symbol', 'min_price', 'max_price', 'is_one_time', 'phone', 'change_pct', 'min_volume',
+                 'last_alert')
+
+    def __init__(self, row, symbol, min_price, max_price, is_one_time, rule_id=None, phone='',
+                 change_pct=None, min_volume=None, last_alert=None):
+        self.row = row                  # מספר השורה בגיליון (None בכלל שלא הגיע מגיליון)
+        self.rule_id = rule_id          # מזהה יציב של הכלל, אם יש
+        self.symbol = symbol
+        self.min_price = min_price      # None אם אין סף תחתון
+        self.max_price = max_price      # None אם אין סף עליון
+        self.is_one_time = is_one_time
+        self.phone = phone              # יעד התראת הוואטסאפ ('' אם אין)
+        self.change_pct = change_pct    # יעד שינוי יומי ב-% (+5 = עלייה של 5% לפחות, -3 = ירידה של 3% לפחות)
+        self.min_volume = min_volume    # ווליום יומי מינימלי - תנאי לכל ההתראות של הכלל (או התראה בפני עצמו)
+        self.last_alert = last_alert    # epoch של ההתראה האחרונה (עמודת last_alert) - בסיס ה-cooldown, None אם אין
+
+    @property
+    def needs_signals(self):
+        """האם הכלל תלוי בנתוני מסחר יומיים (שינוי % / ווליום) ולא רק במחיר"""
+        return self.change_pct is not None or self.min_volume is not None
+
+    @property
+    def key(self):
+        """מזהה לצורך מעקב: rule_id אם יש, אחרת מספר השורה"""
+        return self.rule_id or self.row
+
+    def __repr__(self):
+        return (f"CompiledRule({self.symbol}, id={self.rule_id}, row={self.row}, min={self.min_price}, max={self.max_price}, "
+                f"change={self.change_pct}, volume={self.min_volume})")
+
+def _parse_threshold(value):
+    # ערך ריק או 0 = אין סף (כמו `if min_p` בלוגיקה המקורית); ערך לא מספרי זורק ValueError
+    if value is None or value == '' or value == 0:
+        return None
+    value = float(value)
+    return value or None
+
+def _parse_change(value):
+    # '+5%', '-3', 5.0 -> מספר עם סימן; ריק או 0 = אין יעד
+    if isinstance(value, str):
+        value = value.strip().rstrip('%').strip()
+    return _parse_threshold(value)
+
+VOLUME_SUFFIXES = {'K': 1e3, 'M': 1e6, 'B': 1e9}
+
+def parse_volume(value):
+    """ווליום כמו בטופס: '10M', '2.5k', '1,200,000' או מספר. ריק/0 = None; ערך לא תקין זורק ValueError"""
+    if isinstance(value, str):
+        text = value.strip().upper().replace(',', '')
+        if not text:
+            return None
+        multiplier = VOLUME_SUFFIXES.get(text[-1], 1)
+        if multiplier != 1:
+            text = text[:-1]
+        value = float(text) * multiplier
+    value = _parse_threshold(value)
+    if value is not None and value < 0:
+        raise ValueError(f"Negative volume: {value}")
+    return value
+
+def _parse_phone(value):
+    # מספר טלפון בלי עיצוב מגיע מהגיליון כמספר (972501234567.0)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value or '').strip()
+
+def parse_rule_id(value):
+    """מזהה כלל מספרי מתוך תא, או None"""
+    try:
+        return int(float(value)) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+# הפורמט שבו last_alert נכתב (scheduler) ונשמר ב-SQLite.
+# מהגיליון תאריכים נקראים כמספר סידורי (SERIAL_NUMBER) - מחרוזת בעיצוב של ה-locale (18/10 או 10/18)
+# היא דו-משמעית, ולכן לא מנסים לפענח אותה
+ALERT_TIME_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M')
+SHEETS_EPOCH = datetime(1899, 12, 30)
+
+def _sheets_datetime(serial):
+    """תאריך של Sheets כמספר סידורי (ימים מ-30/12/1899) -> datetime, מעוגל לשנייה"""
+    return SHEETS_EPOCH + timedelta(seconds=round(float(serial) * 86400))
+
+def format_sheet_time(value):
+    """תא תאריך שנקרא כמספר סידורי -> מחרוזת בפורמט שה-scheduler כותב; ערך אחר חוזר כמו שהוא"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return _sheets_datetime(value).strftime(ALERT_TIME_FORMATS[0])
+    return value
+
+def parse_alert_time(value):
+    """last_alert כ-epoch (שעון מקומי, כמו שנכתב), או None לתא ריק / לא מזוהה"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return _sheets_datetime(value).timestamp()
+    text = str(value).strip()
+    for fmt in ALERT_TIME_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            continue
+    return None
+
+def compile_rule(record, row=None):
+    """
+    המרת שורת גיליון (dict) לכלל מקומפל.
+    מחזיר None לשורה לא פעילה, בלי סימול, בלי ספים או עם נתונים לא תקינים.
+    """
+    if str(record.get('status')) != 'Active':
+        return None
+    symbol = str(record.get('symbol') or '').strip().upper()
+    if not symbol:
+        return None
+    try:
+        min_price = _parse_threshold(record.get('min_price'))
+        max_price = _parse_threshold(record.get('max_price'))
+        change_pct = _parse_change(record.get('change_pct'))
+        min_volume = parse_volume(record.get('min_volume'))
+    except (TypeError, ValueError):
+        return None # נתונים לא תקינים בשורה
+    if min_price is None and max_price is None and change_pct is None and min_volume is None:
+        return None
+    is_one_time = str(record.get('is_one_time')).upper() in ('TRUE', '1')
+    return CompiledRule(row, symbol, min_price, max_price, is_one_time,
+                        rule_id=parse_rule_id(record.get('rule_id')), phone=_parse_phone(record.get('phone')),
+                        change_pct=change_pct, min_volume=min_volume,
+                        last_alert=parse_alert_time(record.get('last_alert')))
+
+class SymbolRules:
+    """
+    הכללים של סימול אחד: מערכי ספים ממוינים (array של double) וכללים מקבילים.
+    מחיר מפעיל את כל הכללים עם min >= מחיר ואת כל הכללים עם max <= מחיר.
+    כללים בלי ספי מחיר (רק שינוי % / ווליום) נשמרים בנפרד ב-signal_rules ונבדקים ב-indicators.
+    """
+    __slots__ = ('mins', 'min_rules', 'maxs', 'max_rules', 'signal_rules')
+
+    def __init__(self, rules):
+        by_min = sorted((r for r in rules if r.min_price is not None), key=lambda r: r.min_price)
+        by_max = sorted((r for r in rules if r.max_price is not None), key=lambda r: r.max_price)
+        self.mins = array('d', (r.min_price for r in by_min))
+        self.min_rules = by_min
+        self.maxs = array('d', (r.max_price for r in by_max))
+        self.max_rules = by_max
+        self.signal_rules = [r for r in rules if r.min_price is None and r.max_price is None]
+
+    def __len__(self):
+        # כלל עם שני ספים מופיע בשני המערכים
+        return len({id(r) for r in self.min_rules} | {id(r) for r in self.max_rules}) + len(self.signal_rules)
+
+    def __iter__(self):
+        """כל כלל פעם אחת"""
+        seen = set()
+        for rule in self.min_rules + self.max_rules + self.signal_rules:
+            if id(rule) not in seen:
+                seen.add(id(rule))
+                yield rule
+
+    def triggered(self, price):
+        """רשימת (rule, 'min'/'max') שהמחיר חצה. סף תחתון קודם לעליון באותו כלל"""
+        below = self.min_rules[bisect_left(self.mins, price):]
+        hits = [(rule, 'min') for rule in below]
+        above = self.max_rules[:bisect_right(self.maxs, price)]
+        if above:
+            seen = {id(rule) for rule in below}
+            hits.extend((rule, 'max') for rule in above if id(rule) not in seen)
+        return hits
+
+class RuleIndex:
+    """אינדקס לפי סימול של כל הכללים הפעילים"""
+
+    def __init__(self, rules=()):
+        grouped = {}
+        for rule in rules:
+            grouped.setdefault(rule.symbol, []).append(rule)
+        self._by_symbol = {symbol: SymbolRules(group) for symbol, group in grouped.items()}
+        self._signals = None
+
+    @classmethod
+    def from_records(cls, records, first_row=2):
+        """בנייה מתוצאת get_all_records (שורה 1 היא כותרת, לכן הנתונים מתחילים בשורה 2)"""
+        compiled = (compile_rule(record, first_row + i) for i, record in enumerate(records))
+        return cls(rule for rule in compiled if rule is not None)
+
+    def __len__(self):
+        return sum(len(rules) for rules in self._by_symbol.values())
+
+    def __iter__(self):
+        for rules in self._by_symbol.values():
+            yield from rules
+
+    def symbols(self):
+        return set(self._by_symbol)
+
+    def signal_rules(self):
+        """כל הכללים שתלויים בשינוי % / ווליום (נבנה פעם אחת לכל אינדקס)"""
+        if self._signals is None:
+            self._signals = [rule for rule in self if rule.needs_signals]
+        return self._signals
+
+    def rules_for(self, symbol):
+        return self._by_symbol.get(symbol)
+
+    def triggered(self, symbol, price):
+        rules = self._by_symbol.get(symbol)
+        return rules.triggered(price) if rules else []
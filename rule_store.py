@@ -0,0 +1,633 @@
+# קובץ: rule_store.py
+# שכבת אחסון הכללים - ממשק אחד ל-check_alerts (ובהמשך לטופס ההתראות ב-app.py)
+#
+# שני מימושים:
+# - SheetRuleStore: גיליון StockWatcherDB/Rules (ברירת המחדל, כמו קודם).
+# - SQLiteRuleStore: קובץ SQLite מקומי (WAL) עם אינדקסים על status ו-symbol ועדכונים בטרנזקציה אחת.
+# sync_with_sheet() מסנכרן בין SQLite לגיליון בשני הכיוונים, למשתמשים שעדיין עורכים בגיליון.
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import settings
+from rule_index import CompiledRule, RuleIndex, compile_rule, format_sheet_time, parse_rule_id, parse_volume
+from sharding import SheetLeaseManager
+from sheet_sync import SheetWriteBuffer, RulesMirror, STATUS_COL, LAST_ALERT_COL, column_letter
+
+# השדות שעוברים בין הגיליון ל-SQLite (לפי שם הכותרת)
+SYNC_FIELDS = ['symbol', 'min_price', 'max_price', 'is_one_time', 'phone', 'created_at', 'status', 'last_alert',
+               'change_pct', 'min_volume', 'notes']
+# השדות שמשתמש עורך - רק הם קובעים אם שורה "השתנתה בגיליון" (חותמות זמן מתפרמטות אחרת בכל צד)
+EDITABLE_FIELDS = ['symbol', 'min_price', 'max_price', 'is_one_time', 'phone', 'status']
+# שדות שנוספו אחרי EDITABLE_FIELDS - נכנסים ל-hash רק כשיש בהם ערך, כדי שה-hash של כללים קיימים לא ישתנה
+OPTIONAL_FIELDS = ['change_pct', 'min_volume', 'notes']
+# שדות תאריך - נקראים מהגיליון כמספר סידורי
+DATE_FIELDS = ['created_at', 'last_alert']
+# השדות שלוח ההתראות מציג
+LIST_FIELDS = ['rule_id', 'symbol', 'min_price', 'max_price', 'change_pct', 'min_volume', 'is_one_time', 'phone',
+               'notes', 'created_at', 'status', 'last_alert']
+
+# חלוקת מזהים בגיליון (max(rule_id)+1 ואז כתיבה) רצה תחת lease אחד - גם בטופס של הדשבורד וגם ב-shard 0
+RULE_IDS_LEASE = "rule-ids"
+RULE_IDS_LEASE_TTL = 60
+# כמה זמן הטופס מחכה ל-lease שתפוס (ה-scheduler מחזיק בו לכל היותר כמה שניות)
+RULE_IDS_WAIT_SECONDS = 30
+
+class RuleStore:
+    """
+    ממשק אחסון כללים.
+    sync() מרענן את index (RuleIndex של הכללים הפעילים) ומחזיר True אם משהו השתנה.
+    record_trigger/archive נאספים בזיכרון ונכתבים ב-flush() בסוף הסריקה.
+    """
+
+    index = RuleIndex()
+
+    def sync(self):
+        raise NotImplementedError
+
+    def record_trigger(self, rule, when):
+        raise NotImplementedError
+
+    def archive(self, rule):
+        raise NotImplementedError
+
+    def flush(self):
+        """כתיבת כל העדכונים שנאספו. מחזיר את מספר העדכונים"""
+        raise NotImplementedError
+
+    def add_rule(self, symbol, min_price=None, max_price=None, is_one_time=True, phone='', change_pct=None, min_volume=None,
+                 notes=''):
+        """הוספת כלל חדש. מחזיר את מזהה הכלל (אם יש)"""
+        raise NotImplementedError
+
+    def list_rules(self, symbol=None, status=None, offset=0, limit=None):
+        """
+        כללים לתצוגה (כולל לא פעילים), החדשים קודם. symbol - סינון לפי תחילת הסימול, status - סטטוס מדויק.
+        מחזיר (records, total): עמוד אחד של dict-ים עם LIST_FIELDS, ומספר הכללים שעברו את הסינון.
+        """
+        raise NotImplementedError
+
+    def set_status(self, rule_id, status):
+        """שינוי סטטוס של כלל (למשל Archived כשהמשתמש סוגר התראה), נכתב מיד"""
+        raise NotImplementedError
+
+# ==========================================
+# Google Sheet
+# ==========================================
+class SheetRuleStore(RuleStore):
+    """
+    כללים בגיליון. get_sheet מחזיר worksheet (למשל SheetSession.sheet, שמתחבר מחדש לפי הצורך).
+    העדכונים מכוונים לפי rule_id: ב-flush נקראת עמודת rule_id ומספר השורה הנוכחי של כל כלל נמצא מחדש,
+    כך ששורות שזזו בגיליון (מחיקה/מיון) בין הסנכרון לכתיבה לא גורמות לכתיבה לשורה הלא נכונה.
+    """
+
+    # כמה זמן להשתמש ברשימת הכללים של הלוח בלי לבדוק שוב את זמן העדכון של הגיליון
+    LIST_TTL_SECONDS = 5
+
+    def __init__(self, get_sheet, leases=None):
+        self.get_sheet = get_sheet
+        self.leases = leases  # LeaseManager לחלוקת מזהים; ברירת מחדל - לשונית Leases באותו קובץ
+        self.mirror = RulesMirror()
+        self._pending = {}  # rule -> {field: value}
+        self._listing = None  # (revision, checked_at, records) - כל השורות לתצוגה בלוח
+        self._listing_lock = threading.Lock()
+        # ה-lease שייך לתהליך (owner אחד לכל הסשנים של הדשבורד) - בתוך התהליך מחכים לנעילה הזו
+        self._id_lock = threading.Lock()
+
+    @property
+    def index(self):
+        return self.mirror.index
+
+    def sync(self):
+        return self.mirror.sync(self.get_sheet())
+
+    def record_trigger(self, rule, when):
+        self._pending.setdefault(rule, {})['last_alert'] = when
+
+    def archive(self, rule):
+        self._pending.setdefault(rule, {})['status'] = "Archived"
+
+    def _current_rows(self, sheet, rules, headers=None):
+        """
+        rule -> מספר השורה שלו עכשיו בגיליון (בקריאה אחת של עמודות הסימול וה-rule_id).
+        כלל עם rule_id נמצא לפי המזהה. כלל בלי מזהה נשאר בשורה שלו רק אם הסימול בה עדיין זהה.
+        headers - כותרות הגיליון, אם ידועות טוב יותר מאלה של הסנכרון האחרון.
+        """
+        headers = headers or self.mirror.headers
+        symbol_letter = column_letter(headers.index('symbol') + 1 if 'symbol' in headers else 1)
+        ranges = [f"{symbol_letter}2:{symbol_letter}"]
+        id_col = headers.index('rule_id') + 1 if 'rule_id' in headers else None
+        if id_col:
+            id_letter = column_letter(id_col)
+            ranges.append(f"{id_letter}2:{id_letter}")
+        columns = sheet.batch_get(ranges, value_render_option="UNFORMATTED_VALUE")
+        symbols = [str(cell[0]).strip().upper() if cell else '' for cell in columns[0]]
+        ids = [parse_rule_id(cell[0]) if cell else None for cell in columns[1]] if id_col else []
+        by_id = {rule_id: i + 2 for i, rule_id in enumerate(ids) if rule_id is not None}
+
+        rows = {}
+        for rule in rules:
+            if rule.rule_id is not None:
+                row = by_id.get(rule.rule_id)
+            else:
+                i = rule.row - 2
+                same = i < len(symbols) and symbols[i] == rule.symbol and (i >= len(ids) or ids[i] is None)
+                row = rule.row if same else None
+            if row is not None:
+                rows[rule] = row
+        return rows
+
+    def flush(self):
+        if not self._pending:
+            return 0
+        sheet = self.get_sheet()
+        rows = self._current_rows(sheet, self._pending)
+        writes = SheetWriteBuffer(sheet)
+        defaults = {'last_alert': LAST_ALERT_COL, 'status': STATUS_COL}
+        for rule, fields in self._pending.items():
+            row = rows.get(rule)
+            if row is None:
+                print(f"⚠️ Rule {rule.key} ({rule.symbol}) is no longer in the sheet - update skipped.")
+                continue
+            for field, value in fields.items():
+                writes.set(row, self.mirror.column(field, defaults[field]), value)
+        self._pending = {}
+        written = writes.flush()
+        if written:
+            # זמן העדכון ב-Drive מתעדכן באיחור - מכריחים סנכרון בסריקה הבאה כדי לא להפעיל שוב כלל שהועבר לארכיון
+            self.mirror.invalidate()
+        return written
+
+    @contextmanager
+    def _id_lease(self, wait):
+        """
+        lease על חלוקת המזהים. מחזיר False אם הוא נשאר תפוס גם אחרי wait שניות.
+        acquire() של אותו owner רק מאריך את ה-lease, ולכן שני סשנים באותו תהליך נחסמים קודם ב-_id_lock.
+        """
+        if self.leases is None:
+            self.leases = SheetLeaseManager(self.get_sheet)
+        deadline = time.monotonic() + wait
+        if not self._id_lock.acquire(timeout=wait):
+            self.leases.holder = "another session in this process"
+            yield False
+            return
+        try:
+            while not self.leases.acquire(RULE_IDS_LEASE, RULE_IDS_LEASE_TTL):
+                if time.monotonic() >= deadline:
+                    yield False
+                    return
+                time.sleep(1)
+            try:
+                yield True
+            finally:
+                try:
+                    self.leases.release(RULE_IDS_LEASE)
+                except Exception as e:
+                    print(f"⚠️ Could not release the rule id lease (it will expire): {e}")
+        finally:
+            self._id_lock.release()
+
+    def assign_rule_ids(self):
+        """
+        מזהה לכל שורה בלי rule_id (עמודת rule_id נוספת אם חסרה). מחזיר את מספר המזהים שנכתבו.
+        רץ רק ב-shard 0, ותחת ה-lease של המזהים - כדי שהטופס לא יחלק באותו זמן את אותו מזהה.
+        """
+        with self._id_lease(wait=0) as held:
+            if not held:
+                print(f"⏭️ Rule ids are being assigned by {self.leases.holder} - skipping.")
+                return 0
+            return self._assign_rule_ids()
+
+    def _assign_rule_ids(self):
+        sheet = self.get_sheet()
+        headers = [str(h) for h in sheet.row_values(1)]
+        writes = SheetWriteBuffer(sheet)
+        if 'rule_id' not in headers:
+            headers.append('rule_id')
+            if sheet.col_count < len(headers):
+                sheet.add_cols(len(headers) - sheet.col_count)
+            writes.set(1, len(headers), 'rule_id')
+        symbol_letter = column_letter(headers.index('symbol') + 1 if 'symbol' in headers else 1)
+        id_letter = column_letter(headers.index('rule_id') + 1)
+        symbols, ids = sheet.batch_get([f"{symbol_letter}2:{symbol_letter}", f"{id_letter}2:{id_letter}"],
+                                       value_render_option="UNFORMATTED_VALUE")
+        ids = [parse_rule_id(cell[0]) if cell else None for cell in ids]
+        next_id = max((i for i in ids if i is not None), default=0) + 1
+        assigned = 0
+        for i, cell in enumerate(symbols):
+            if cell and str(cell[0]).strip() and (i >= len(ids) or ids[i] is None):
+                writes.set(i + 2, headers.index('rule_id') + 1, next_id)
+                next_id += 1
+                assigned += 1
+        if writes.flush():
+            self.mirror.invalidate()
+            self._listing = None
+        return assigned
+
+    def add_rule(self, symbol, min_price=None, max_price=None, is_one_time=True, phone='', change_pct=None, min_volume=None,
+                 notes=''):
+        sheet = self.get_sheet()
+        headers = self.mirror.headers or sheet.row_values(1)
+        headers = self._ensure_columns(sheet, headers, [f for f, v in (('change_pct', change_pct), ('min_volume', min_volume),
+                                                                       ('notes', notes)) if v])
+        values = {'symbol': symbol.upper(), 'min_price': min_price or '', 'max_price': max_price or '',
+                  'is_one_time': 'TRUE' if is_one_time else 'FALSE', 'phone': phone,
+                  'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'status': 'Active',
+                  'change_pct': change_pct or '', 'min_volume': min_volume or '', 'notes': notes or ''}
+        rule_id = None
+        if 'rule_id' not in headers:
+            sheet.append_row([values.get(h, '') for h in headers], value_input_option='USER_ENTERED')
+        else:
+            with self._id_lease(wait=RULE_IDS_WAIT_SECONDS) as held:
+                if not held:
+                    raise RuntimeError(f"rule ids are locked by {self.leases.holder}, try again")
+                id_letter = column_letter(headers.index('rule_id') + 1)
+                ids = sheet.batch_get([f"{id_letter}2:{id_letter}"], value_render_option="UNFORMATTED_VALUE")[0]
+                rule_id = max((parse_rule_id(cell[0]) or 0 for cell in ids if cell), default=0) + 1
+                values['rule_id'] = rule_id
+                sheet.append_row([values.get(h, '') for h in headers], value_input_option='USER_ENTERED')
+        self.mirror.invalidate()
+        self._listing = None
+        return rule_id
+
+    def _all_records(self):
+        """
+        כל השורות בגיליון (לכל סטטוס) כ-dict-ים, עם 'row'. נקרא מחדש רק כשהגיליון השתנה -
+        rerun של הלוח עולה לכל היותר בדיקת זמן עדכון אחת (ואף אחת בתוך LIST_TTL_SECONDS).
+        """
+        with self._listing_lock:
+            now = time.monotonic()
+            if self._listing is not None and now - self._listing[1] < self.LIST_TTL_SECONDS:
+                return self._listing[2]
+            sheet = self.get_sheet()
+            try:
+                revision = sheet.spreadsheet.get_lastUpdateTime()
+            except Exception:
+                revision = None
+            if revision is not None and self._listing is not None and self._listing[0] == revision:
+                self._listing = (revision, now, self._listing[2])
+                return self._listing[2]
+
+            values = sheet.get_all_values(value_render_option="UNFORMATTED_VALUE",
+                                          date_time_render_option="FORMATTED_STRING")
+            headers = [str(h) for h in values[0]] if values else []
+            records = []
+            for i, row in enumerate(values[1:]):
+                record = dict(zip(headers, row))
+                if not str(record.get('symbol', '')).strip():
+                    continue
+                record['rule_id'] = parse_rule_id(record.get('rule_id'))
+                record['row'] = i + 2
+                records.append(record)
+            # החדשים קודם: לפי מזהה, ושורות בלי מזהה לפי המיקום בגיליון
+            records.sort(key=lambda r: (r['rule_id'] or 0, r['row']), reverse=True)
+            self._listing = (revision, now, records)
+            return records
+
+    def list_rules(self, symbol=None, status=None, offset=0, limit=None):
+        records = _filter_records(self._all_records(), symbol, status)
+        end = None if limit is None else offset + limit
+        return [{**{f: r.get(f, '') for f in LIST_FIELDS}, 'row': r['row']} for r in records[offset:end]], len(records)
+
+    def set_status(self, rule_id, status, row=None, symbol=None):
+        """לפי rule_id; שורה בלי מזהה - לפי row, רק אם הסימול בה עדיין symbol"""
+        sheet = self.get_sheet()
+        headers = self.mirror.headers or [str(h) for h in sheet.row_values(1)]
+        status_col = headers.index('status') + 1 if 'status' in headers else STATUS_COL
+        if rule_id is not None:
+            rule = CompiledRule(None, '', None, None, False, rule_id=rule_id)
+        else:
+            rule = CompiledRule(row, str(symbol or '').strip().upper(), None, None, False)
+        target = self._current_rows(sheet, [rule], headers).get(rule)
+        if target is None:
+            print(f"⚠️ Rule {rule.key} is no longer in the sheet - status not changed.")
+            return False
+        sheet.update([[status]], f"{column_letter(status_col)}{target}", raw=True)
+        self.mirror.invalidate()
+        self._listing = None
+        return True
+
+    def _ensure_columns(self, sheet, headers, fields):
+        """הוספת עמודות חסרות (למשל change_pct) בסוף שורת הכותרת. מחזיר את הכותרות המעודכנות"""
+        missing = [f for f in fields if f not in headers]
+        if not missing:
+            return headers
+        headers = list(headers) + missing
+        if sheet.col_count < len(headers):
+            sheet.add_cols(len(headers) - sheet.col_count)
+        sheet.update([missing], f"{column_letter(len(headers) - len(missing) + 1)}1")
+        return headers
+
+# ==========================================
+# SQLite
+# ==========================================
+class SQLiteRuleStore(RuleStore):
+    """
+    כללים בקובץ SQLite מקומי.
+    מונה גרסה (שמתעדכן ע"י trigger) מאפשר ל-sync() לדלג על בנייה מחדש כשהכללים לא השתנו.
+    """
+
+    def __init__(self, path=settings.RULES_DB_PATH):
+        self.path = path
+        self.index = RuleIndex()
+        self._version = None
+        self._pending = {}  # rule_id -> {column: value}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS rules (
+                    rule_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    symbol TEXT NOT NULL,
+                    min_price REAL,
+                    max_price REAL,
+                    is_one_time INTEGER NOT NULL DEFAULT 1,
+                    phone TEXT NOT NULL DEFAULT '',
+                    created_at TEXT NOT NULL DEFAULT '',
+                    status TEXT NOT NULL DEFAULT 'Active',
+                    last_alert TEXT NOT NULL DEFAULT '',
+                    change_pct REAL,                    -- יעד שינוי יומי ב-% (עם סימן)
+                    min_volume REAL,                    -- ווליום יומי מינימלי
+                    notes TEXT,                         -- הערות המשתמש מלוח ההתראות
+                    updated_at REAL NOT NULL DEFAULT 0,
+                    dirty INTEGER NOT NULL DEFAULT 1,   -- שונה מקומית מאז הסנכרון האחרון עם הגיליון
+                    sheet_hash TEXT                     -- תוכן השורה בגיליון בסנכרון האחרון
+                );
+                CREATE INDEX IF NOT EXISTS idx_rules_status_symbol ON rules(status, symbol);
+                CREATE INDEX IF NOT EXISTS idx_rules_symbol ON rules(symbol);
+
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+                INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+
+                -- רק שינוי בשדות שמשפיעים על האינדקס מקדם את הגרסה (לא last_alert)
+                CREATE TRIGGER IF NOT EXISTS rules_version_insert AFTER INSERT ON rules
+                BEGIN UPDATE meta SET value = value + 1 WHERE key = 'version'; END;
+                CREATE TRIGGER IF NOT EXISTS rules_version_delete AFTER DELETE ON rules
+                BEGIN UPDATE meta SET value = value + 1 WHERE key = 'version'; END;
+            """)
+            # קבצים מגרסה קודמת: עמודות השינוי והווליום נוספות, וה-trigger של העדכון נבנה מחדש עם העמודות החדשות
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(rules)")}
+            for column, kind in (('change_pct', 'REAL'), ('min_volume', 'REAL'), ('notes', 'TEXT')):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE rules ADD COLUMN {column} {kind}")
+            self._conn.executescript("""
+                DROP TRIGGER IF EXISTS rules_version_update;
+                CREATE TRIGGER rules_version_update
+                AFTER UPDATE OF symbol, min_price, max_price, is_one_time, status, phone, change_pct, min_volume ON rules
+                BEGIN UPDATE meta SET value = value + 1 WHERE key = 'version'; END;
+                CREATE TRIGGER IF NOT EXISTS rules_version_delete AFTER DELETE ON rules
+                BEGIN UPDATE meta SET value = value + 1 WHERE key = 'version'; END;
+            """)
+
+    def close(self):
+        self._conn.close()
+
+    def sync(self):
+        with self._lock:
+            version = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+            if version == self._version:
+                return False
+            cursor = self._conn.execute(
+                "SELECT rule_id, symbol, min_price, max_price, is_one_time, phone, status, change_pct, min_volume, "
+                "last_alert FROM rules WHERE status = 'Active'")
+            columns = [c[0] for c in cursor.description]
+            rules = (compile_rule(dict(zip(columns, row))) for row in cursor)
+            self.index = RuleIndex(rule for rule in rules if rule is not None)
+            self._version = version
+        return True
+
+    def record_trigger(self, rule, when):
+        self._pending.setdefault(rule.rule_id, {})['last_alert'] = when
+
+    def archive(self, rule):
+        self._pending.setdefault(rule.rule_id, {})['status'] = 'Archived'
+
+    def flush(self):
+        """כל העדכונים בטרנזקציה אחת, מקובצים לפי סט העמודות כדי להשתמש ב-executemany"""
+        if not self._pending:
+            return 0
+        groups = {}
+        now = time.time()
+        for rule_id, changes in self._pending.items():
+            columns = tuple(sorted(changes))
+            groups.setdefault(columns, []).append([changes[c] for c in columns] + [now, rule_id])
+        with self._lock, self._conn:
+            for columns, params in groups.items():
+                assignments = ", ".join(f"{c} = ?" for c in columns)
+                self._conn.executemany(
+                    f"UPDATE rules SET {assignments}, dirty = 1, updated_at = ? WHERE rule_id = ?", params)
+        count = len(self._pending)
+        self._pending = {}
+        return count
+
+    def add_rule(self, symbol, min_price=None, max_price=None, is_one_time=True, phone='', change_pct=None, min_volume=None,
+                 notes=''):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                """INSERT INTO rules (symbol, min_price, max_price, is_one_time, phone, created_at, status, updated_at,
+                                      change_pct, min_volume, notes)
+                   VALUES (?, ?, ?, ?, ?, ?, 'Active', ?, ?, ?, ?)""",
+                (symbol.upper(), min_price, max_price, int(bool(is_one_time)), phone,
+                 datetime.now().strftime('%Y-%m-%d %H:%M:%S'), time.time(), change_pct, min_volume, notes or ''))
+        return cursor.lastrowid
+
+    def list_rules(self, symbol=None, status=None, offset=0, limit=None):
+        where, params = [], []
+        if symbol:
+            # טווח על האינדקס של symbol במקום LIKE (שלא משתמש באינדקס)
+            prefix = symbol.strip().upper()
+            where.append("symbol >= ? AND symbol < ?")
+            params += [prefix, prefix + '\uffff']
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        clause = f" WHERE {' AND '.join(where)}" if where else ""
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM rules{clause}", params).fetchone()[0]
+            cursor = self._conn.execute(f"SELECT {', '.join(LIST_FIELDS)} FROM rules{clause} ORDER BY rule_id DESC "
+                                        f"LIMIT ? OFFSET ?", params + [-1 if limit is None else limit, offset])
+            records = [dict(zip(LIST_FIELDS, row)) for row in cursor]
+        return records, total
+
+    def set_status(self, rule_id, status):
+        with self._lock, self._conn:
+            cursor = self._conn.execute("UPDATE rules SET status = ?, dirty = 1, updated_at = ? WHERE rule_id = ?",
+                                        (status, time.time(), rule_id))
+        return cursor.rowcount > 0
+
+    # --- עזרים לסנכרון מול הגיליון ---
+    def rules_for_sync(self):
+        with self._lock:
+            cursor = self._conn.execute(f"SELECT rule_id, {', '.join(SYNC_FIELDS)}, dirty, sheet_hash FROM rules")
+            columns = [c[0] for c in cursor.description]
+            return {row[0]: dict(zip(columns, row)) for row in cursor}
+
+    def apply_sheet_changes(self, upserts, synced):
+        """
+        upserts: רשימת (rule_id או None, fields, sheet_hash) - שורות שהגיליון הוא המקור שלהן.
+        synced: רשימת (rule_id, sheet_hash) - כללים שנדחפו לגיליון ועכשיו מסונכרנים.
+        מחזיר את מזהי הכללים שנוצרו (לפי סדר ה-upserts שה-rule_id שלהם None).
+        """
+        created = []
+        now = time.time()
+        with self._lock, self._conn:
+            for rule_id, fields, sheet_hash in upserts:
+                values = [fields.get(f) for f in SYNC_FIELDS]
+                if rule_id is None:
+                    cursor = self._conn.execute(
+                        f"INSERT INTO rules ({', '.join(SYNC_FIELDS)}, updated_at, dirty, sheet_hash) "
+                        f"VALUES ({', '.join('?' * len(SYNC_FIELDS))}, ?, 0, ?)", values + [now, sheet_hash])
+                    created.append(cursor.lastrowid)
+                else:
+                    self._conn.execute(
+                        f"INSERT OR REPLACE INTO rules (rule_id, {', '.join(SYNC_FIELDS)}, updated_at, dirty, sheet_hash) "
+                        f"VALUES (?, {', '.join('?' * len(SYNC_FIELDS))}, ?, 0, ?)", [rule_id] + values + [now, sheet_hash])
+            self._conn.executemany("UPDATE rules SET dirty = 0, sheet_hash = ? WHERE rule_id = ?",
+                                   [(sheet_hash, rule_id) for rule_id, sheet_hash in synced])
+        return created
+
+# ==========================================
+# סנכרון דו-כיווני SQLite <-> Sheet
+# ==========================================
+def _normalize(field, value):
+    """ערך בצורה אחידה לשני הצדדים (גיליון מחזיר מחרוזות/מספרים, SQLite מחזיר REAL/INTEGER)"""
+    if field in ('min_price', 'max_price', 'change_pct'):
+        try:
+            return float(str(value).strip().rstrip('%')) if value not in (None, '') else None
+        except (TypeError, ValueError):
+            return None
+    if field == 'min_volume':
+        try:
+            return parse_volume(value)
+        except (TypeError, ValueError):
+            return None
+    if field == 'is_one_time':
+        return str(value).upper() in ('TRUE', '1')
+    return '' if value is None else str(value).strip()
+
+def _fields_hash(fields):
+    normalized = tuple(_normalize(f, fields.get(f)) for f in EDITABLE_FIELDS)
+    optional = tuple((f, _normalize(f, fields.get(f))) for f in OPTIONAL_FIELDS if _normalize(f, fields.get(f)) not in (None, ''))
+    if optional:
+        normalized += optional
+    return hashlib.blake2b(repr(normalized).encode("utf-8"), digest_size=16).hexdigest()
+
+def _sheet_value(field, value):
+    value = _normalize(field, value)
+    if field == 'is_one_time':
+        return 'TRUE' if value else 'FALSE'
+    return '' if value is None else value
+
+def sync_with_sheet(store, sheet):
+    """
+    סנכרון דו-כיווני לפי עמודת rule_id בגיליון (נוספת אוטומטית אם חסרה).
+    - שורה בגיליון בלי rule_id או עם מזהה לא מוכר -> כלל חדש ב-SQLite (והמזהה נכתב לגיליון).
+    - שורה שהשתנתה בגיליון מאז הסנכרון הקודם -> הגיליון גובר.
+    - כלל ששונה רק ב-SQLite (למשל Archived ע"י הסורק) -> נדחף לגיליון.
+    - כלל שקיים רק ב-SQLite -> נוסף כשורה בסוף הגיליון; כלל שנמחק מהגיליון -> מסומן Deleted.
+    """
+    # תאריכים כמספר סידורי ולא בעיצוב של ה-locale של הגיליון (18/10 מול 10/18) - ומכאן לפורמט אחיד
+    values = sheet.get_all_values(value_render_option="UNFORMATTED_VALUE", date_time_render_option="SERIAL_NUMBER")
+    headers = [str(h) for h in values[0]] if values else []
+    rows = values[1:]
+    writes = SheetWriteBuffer(sheet)
+
+    local = store.rules_for_sync()
+    # עמודות חסרות: rule_id תמיד, ועמודות אופציונליות (שינוי/ווליום/הערות) רק כשיש כלל מקומי שמשתמש בהן
+    used = {f for current in local.values() for f in OPTIONAL_FIELDS if _normalize(f, current.get(f)) not in (None, '')}
+    missing = [f for f in ['rule_id'] + OPTIONAL_FIELDS if f not in headers and (f == 'rule_id' or f in used)]
+    if missing:
+        headers.extend(missing)
+        if sheet.col_count < len(headers):
+            sheet.add_cols(len(headers) - sheet.col_count)
+        for i, name in enumerate(missing):
+            writes.set(1, len(headers) - len(missing) + i + 1, name)
+    column = {name: i + 1 for i, name in enumerate(headers)}
+    fields_in_sheet = [f for f in SYNC_FIELDS if f in column]
+
+    seen = set()
+    upserts, new_rows, synced = [], [], []
+
+    for i, row in enumerate(rows):
+        record = dict(zip(headers, list(row) + [''] * (len(headers) - len(row))))
+        if not any(str(v).strip() for v in record.values()):
+            continue # שורה ריקה
+        fields = {f: record.get(f, '') for f in fields_in_sheet}
+        for f in DATE_FIELDS:
+            if f in fields:
+                fields[f] = format_sheet_time(fields[f])
+        sheet_hash = _fields_hash(fields)
+        rule_id = parse_rule_id(record.get('rule_id'))
+
+        if rule_id is None or rule_id not in local:
+            upserts.append((rule_id, {f: _normalize(f, v) for f, v in fields.items()}, sheet_hash))
+            if rule_id is None:
+                new_rows.append(i + 2)
+            else:
+                seen.add(rule_id)
+            continue
+
+        seen.add(rule_id)
+        current = local[rule_id]
+        if sheet_hash != current['sheet_hash']:
+            # השורה נערכה בגיליון - הגיליון גובר
+            merged = {f: current[f] for f in SYNC_FIELDS}
+            merged.update({f: _normalize(f, v) for f, v in fields.items()})
+            upserts.append((rule_id, merged, sheet_hash))
+        elif current['dirty']:
+            # שינוי מקומי בלבד - דחיפה לגיליון של השדות שהשתנו
+            for f in fields_in_sheet:
+                if _normalize(f, current[f]) != _normalize(f, fields[f]):
+                    writes.set(i + 2, column[f], _sheet_value(f, current[f]))
+            synced.append((rule_id, _fields_hash({f: current[f] for f in fields_in_sheet})))
+
+    # כללים שקיימים רק מקומית
+    appended = []
+    for rule_id, current in local.items():
+        if rule_id in seen:
+            continue
+        if current['sheet_hash'] is not None:
+            # היה בגיליון ונמחק משם
+            if current['status'] != 'Deleted':
+                store.set_status(rule_id, 'Deleted')
+            continue
+        fields = {f: current[f] for f in fields_in_sheet}
+        appended.append([_sheet_value(h, current.get(h)) if h in SYNC_FIELDS else (rule_id if h == 'rule_id' else '')
+                         for h in headers])
+        synced.append((rule_id, _fields_hash(fields)))
+
+    created = store.apply_sheet_changes(upserts, synced)
+    for row_number, rule_id in zip(new_rows, created):
+        writes.set(row_number, column['rule_id'], rule_id)
+
+    writes.flush()
+    if appended:
+        sheet.append_rows(appended, value_input_option='USER_ENTERED')
+    print(f"🔁 Sheet sync: {len(upserts)} from sheet, {len(synced) - len(appended)} pushed, {len(appended)} appended.")
+
+def _filter_records(records, symbol=None, status=None):
+    """סינון שורות לתצוגה כמו ב-list_rules של SQLite (תחילת סימול, סטטוס מדויק)"""
+    prefix = (symbol or '').strip().upper()
+    return [r for r in records
+            if (not prefix or str(r.get('symbol', '')).strip().upper().startswith(prefix))
+            and (not status or str(r.get('status', '')) == status)]
+
+def open_store(kind=None, get_sheet=None):
+    """יצירת מאגר הכללים לפי ההגדרה (sheet / sqlite)"""
+    kind = kind or settings.RULE_STORE
+    if kind == 'sqlite':
+        return SQLiteRuleStore()
+    if kind == 'sheet':
+        return SheetRuleStore(get_sheet)
+    raise ValueError(f"Unknown rule store: {kind}")
@@ -0,0 +1,209 @@
+# קובץ: scan_metrics.py
+# מדידה לסריקות ה-scheduler: זמן לכל שלב, מונים והיסטוגרמות של זמני משיכת מחירים
+#
+# כל סריקה נמדדת ב-ScanMetrics משלה ונפלטת בסופה כשורת JSON אחת בלוג.
+# המדדים המצטברים (לאורך כל חיי התהליך) נשמרים ב-registry ונחשפים בפורמט Prometheus -
+# כקובץ טקסט (ל-textfile collector של node_exporter) ו/או ב-HTTP מקומי (/metrics).
+
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "stockwatcher"
+
+# גבולות הדליים של היסטוגרמת זמני משיכה (שניות)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# תיאור המונים - גם קובע את הסדר שלהם בפלט
+COUNTERS = {
+    "rules_scanned": "Active rules evaluated",
+    "rules_skipped": "Active rules skipped because their symbol had no price",
+    "rules_deferred": "Active rules not checked this scan because their symbol was not due or its market was closed",
+    "alerts_triggered": "Alerts triggered",
+    "alerts_suppressed": "Recurring alerts skipped because the rule is in its notification cooldown",
+    "notifications_sent": "WhatsApp notifications delivered",
+    "notifications_failed": "WhatsApp notifications that failed after all retries",
+    "fetch_failures": "Symbols whose price could not be fetched",
+    "symbols_blocked": "Symbols not fetched because they are in the unresolvable-symbol cache",
+    "batch_fallbacks": "Batch downloads that failed and fell back to single fetches",
+    "history_fallbacks": "Single fetches where fast_info failed and history() was used",
+    "store_updates": "Updates written to the rule store",
+    "ticks_received": "Price ticks received from the stream feed",
+    "ticks_coalesced": "Ticks replaced by a newer tick for the same symbol before evaluation",
+}
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    def cumulative(self):
+        total, result = 0, []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def summary(self):
+        return {"count": self.count, "sum": round(self.sum, 4),
+                "avg": round(self.sum / self.count, 4) if self.count else None}
+
+class ScanMetrics:
+    """המדדים של סריקה אחת"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.phases = defaultdict(float)
+        self.counters = Counter()
+        self.histograms = defaultdict(Histogram)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.phases[name] += elapsed
+
+    def inc(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def observe(self, name, value):
+        with self._lock:
+            self.histograms[name].observe(value)
+
+    def to_dict(self):
+        return {
+            "event": "scan_metrics",
+            "started": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+            "duration_seconds": round(time.time() - self.started, 4),
+            "phases": {name: round(value, 4) for name, value in self.phases.items()},
+            "counters": {name: self.counters.get(name, 0) for name in COUNTERS},
+            "latency": {name: h.summary() for name, h in self.histograms.items()},
+        }
+
+class MetricsRegistry:
+    """מדדים מצטברים לכל חיי התהליך + הסריקה הנוכחית"""
+
+    def __init__(self):
+        self.current = ScanMetrics()
+        self.scans = 0
+        self.last_scan = None
+        self.phase_totals = defaultdict(float)
+        self.counters = Counter()
+        self.histograms = defaultdict(Histogram)
+        self._lock = threading.Lock()
+
+    def start_scan(self):
+        self.current = ScanMetrics()
+        return self.current
+
+    def finish_scan(self):
+        """מיזוג הסריקה הנוכחית למדדים המצטברים ופליטת שורת JSON"""
+        scan = self.current
+        with self._lock:
+            self.scans += 1
+            self.last_scan = scan
+            for name, value in scan.phases.items():
+                self.phase_totals[name] += value
+            self.counters.update(scan.counters)
+            for name, h in scan.histograms.items():
+                self.histograms[name].merge(h)
+        print(json.dumps(scan.to_dict(), ensure_ascii=False))
+        return scan
+
+    def prometheus(self):
+        """המדדים בפורמט הטקסט של Prometheus"""
+        lines = []
+        with self._lock:
+            lines += [f"# HELP {PREFIX}_scans_total Completed scans",
+                      f"# TYPE {PREFIX}_scans_total counter",
+                      f"{PREFIX}_scans_total {self.scans}"]
+            if self.last_scan is not None:
+                lines += [f"# HELP {PREFIX}_last_scan_timestamp_seconds Start time of the last completed scan",
+                          f"# TYPE {PREFIX}_last_scan_timestamp_seconds gauge",
+                          f"{PREFIX}_last_scan_timestamp_seconds {self.last_scan.started:.3f}",
+                          f"# HELP {PREFIX}_scan_phase_seconds Duration of each phase in the last scan",
+                          f"# TYPE {PREFIX}_scan_phase_seconds gauge"]
+                lines += [f'{PREFIX}_scan_phase_seconds{{phase="{name}"}} {value:.6f}'
+                          for name, value in sorted(self.last_scan.phases.items())]
+            lines += [f"# HELP {PREFIX}_scan_phase_seconds_total Total time spent in each phase",
+                      f"# TYPE {PREFIX}_scan_phase_seconds_total counter"]
+            lines += [f'{PREFIX}_scan_phase_seconds_total{{phase="{name}"}} {value:.6f}'
+                      for name, value in sorted(self.phase_totals.items())]
+            for name, help_text in COUNTERS.items():
+                lines += [f"# HELP {PREFIX}_{name}_total {help_text}",
+                          f"# TYPE {PREFIX}_{name}_total counter",
+                          f"{PREFIX}_{name}_total {self.counters.get(name, 0)}"]
+            lines += [f"# HELP {PREFIX}_price_fetch_seconds Latency of price fetches",
+                      f"# TYPE {PREFIX}_price_fetch_seconds histogram"]
+            for name, h in sorted(self.histograms.items()):
+                for bound, count in h.cumulative():
+                    lines.append(f'{PREFIX}_price_fetch_seconds_bucket{{kind="{name}",le="{bound}"}} {count}')
+                lines += [f'{PREFIX}_price_fetch_seconds_bucket{{kind="{name}",le="+Inf"}} {h.count}',
+                          f'{PREFIX}_price_fetch_seconds_sum{{kind="{name}"}} {h.sum:.6f}',
+                          f'{PREFIX}_price_fetch_seconds_count{{kind="{name}"}} {h.count}']
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """כתיבה אטומית (קובץ זמני + rename) כדי שה-collector לא יקרא קובץ חצוי"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)
+
+    def serve(self, port, host="127.0.0.1"):
+        """שרת HTTP מקומי שמחזיר את המדדים ב-/metrics (ב-thread רקע)"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass # בלי שורת לוג לכל scrape
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"📈 Metrics available at http://{host}:{port}/metrics")
+        return server
+
+# מופע יחיד לכל התהליך
+registry = MetricsRegistry()
+
+def current():
+    """המדדים של הסריקה הנוכחית"""
+    return registry.current
@@ -1,18 +1,48 @@
 # קובץ: scheduler.py
 # מנוע בדיקת התראות - גרסה 8.2 (עם Yahoo Finance)
+# הרצה: python scheduler.py (סריקה אחת) | python scheduler.py --daemon --interval 30 (סריקה מתמשכת)
+#        python scheduler.py --stream --feed yahoo (בדיקה לכל tick)
 
+import argparse
+import asyncio
+import heapq
+import math
+import os
+import signal
 import time
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime
-import yfinance as yf # חובה לוודא שמותקן
+import pandas as pd
+
+import indicators
+import market_calendar
+from market_cache import get_cache
+from notifier import alert_key, get_dispatcher
+from price_feed import PollingFeed, TickCoalescer, make_feed
+import scan_metrics
+import settings
+from symbols import get_symbol_registry
+from trigger_history import get_trigger_history
+from yahoo_gateway import SCHEDULER, get_gateway
+from rule_store import SheetRuleStore, SQLiteRuleStore, open_store, sync_with_sheet
+from sharding import ShardedStore, open_leases, parse_shard
+from sheet_sync import CREDENTIALS_FILE, SCOPE, SheetSession
+
+# כמה סימולים לבקש בכל הורדה מקובצת מ-Yahoo
+PRICE_BATCH_SIZE = 50
+
+# סיבת הכישלון של סימול שבמטמון השלילי (לא נמשך בכלל)
+UNRESOLVABLE = "unresolvable"
+
+# במצב daemon: מרווח בין סריקות
+SCAN_INTERVAL = int(os.environ.get("SCAN_INTERVAL", "60"))
 
 def init_connection():
     """חיבור לגיליון - משתמש בקובץ ה-JSON המקומי"""
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
     try:
         # כאן המנוע רץ מקומית, אז הוא משתמש בקובץ JSON
-        creds = ServiceAccountCredentials.from_json_keyfile_name("secrets.json", scope)
+        creds = ServiceAccountCredentials.from_json_keyfile_name(CREDENTIALS_FILE, SCOPE)
         client = gspread.authorize(creds)
         return client.open("StockWatcherDB").worksheet("Rules")
     except Exception as e:
@@ -21,99 +51,827 @@ def init_connection():
 
 def get_live_price(ticker):
     """משיכת מחיר בזמן אמת"""
+    metrics = scan_metrics.current()
+    started = time.perf_counter()
+    gateway = get_gateway()
     try:
-        # שימוש ב-yfinance כדי לקבל מחיר עדכני
-        ticker_obj = yf.Ticker(ticker)
-        # fast_info הוא המהיר ביותר, או history אם רוצים דיוק של סגירה
-        price = ticker_obj.fast_info['last_price']
+        # fast_info הוא המהיר ביותר, או history אם רוצים דיוק של סגירה (שניהם דרך השער ל-Yahoo)
+        price = gateway.last_price(ticker, priority=SCHEDULER)
         return price
     except:
         # גיבוי למקרה של כישלון במשיכה מהירה
+        metrics.inc('history_fallbacks')
         try:
-            return yf.Ticker(ticker).history(period='1d')['Close'].iloc[-1]
+            return gateway.history(ticker, priority=SCHEDULER, period='1d')['Close'].iloc[-1]
         except:
             return None
+    finally:
+        metrics.observe('single', time.perf_counter() - started)
 
-def check_alerts():
-    print(f"\n--- 🔄 Starting Scan: {datetime.now().strftime('%H:%M:%S')} ---")
-    sheet = init_connection()
-    if not sheet:
+def _last_close(data, symbol):
+    """מחיר הסגירה האחרון (הלא ריק) של סימול מתוך תוצאת yf.download"""
+    try:
+        if isinstance(data.columns, pd.MultiIndex):
+            closes = data[symbol]['Close']
+        else:
+            closes = data['Close']
+        closes = closes.dropna()
+        return float(closes.iloc[-1]) if len(closes) else None
+    except KeyError:
+        return None
+
+def resolve_prices(symbols, chunk_size=PRICE_BATCH_SIZE):
+    """
+    שלב משיכת המחירים: מוריד את כל הסימולים בבקשות מקובצות (chunks).
+    מחזיר (prices, failures) - מילון סימול->מחיר ומילון סימול->סיבת כישלון.
+    """
+    symbols = sorted(set(symbols))
+    prices, failures = {}, {}
+    metrics = scan_metrics.current()
+    unknown = []
+
+    for start in range(0, len(symbols), chunk_size):
+        chunk = symbols[start:start + chunk_size]
+        started = time.perf_counter()
+        try:
+            # נר יומי של היום מתעדכן בזמן אמת, ו-5d מכסה סופ"ש וחגים
+            data = get_gateway().download(chunk, priority=SCHEDULER, period='5d', interval='1d',
+                                          group_by='ticker', progress=False, threads=True)
+            metrics.observe('batch', time.perf_counter() - started)
+        except Exception as e:
+            # כישלון של כל הקבוצה - גיבוי למשיכה בודדת כדי שסימול אחד לא יפיל את השאר
+            metrics.inc('batch_fallbacks')
+            print(f"⚠️ Batch download failed ({e}), falling back to single fetch for {len(chunk)} symbols")
+            for symbol in chunk:
+                price = get_live_price(symbol)
+                if price is None:
+                    failures[symbol] = "fetch failed"
+                else:
+                    prices[symbol] = price
+            continue
+
+        chunk_prices = {}
+        for symbol in chunk:
+            price = _last_close(data, symbol) if data is not None and not data.empty else None
+            if price is None:
+                failures[symbol] = "no data"
+            else:
+                chunk_prices[symbol] = price
+        # "no data" נחשב לסימול לא קיים רק אם סימולים אחרים באותה בקשה כן קיבלו מחיר -
+        # אחרת זו כנראה תקלת רשת, ואסור להכניס את כל הסימולים למטמון השלילי
+        if chunk_prices:
+            unknown.extend(symbol for symbol in chunk if symbol not in chunk_prices)
+        prices.update(chunk_prices)
+
+    registry = get_symbol_registry()
+    if unknown:
+        registry.mark_unresolvable(unknown, "no data")
+    registry.mark_resolved(prices)
+    return prices, failures
+
+def fetch_prices(symbols):
+    """
+    מחירים דרך המטמון המשותף - רשת רק לסימולים שאין להם מחיר טרי.
+    סימולים שבמטמון השלילי (נכשלו לאחרונה) לא נמשכים בכלל ומוחזרים ככישלון UNRESOLVABLE.
+    """
+    blocked = get_symbol_registry().unresolvable(symbols)
+    prices, failures = get_cache().get_quotes(set(symbols) - blocked.keys(), resolve_prices)
+    failures.update((symbol, UNRESOLVABLE) for symbol in blocked)
+    return prices, failures
+
+def fetch_signals(index, symbols=None):
+    """
+    שינוי % וווליום יומיים לסימולים שיש להם כללים כאלה (None אם אין כללים כאלה).
+    symbols מגביל את ההורדה לסימולים שנבדקים בסריקה הזו.
+    """
+    rules = index.signal_rules()
+    if not rules:
+        return None
+    wanted = {rule.symbol for rule in rules}
+    if symbols is not None:
+        wanted &= symbols
+    return indicators.daily_snapshot(wanted) if wanted else indicators.empty_snapshot()
+
+def fire_alert(store, rule, side, ticker, price, now, signal=None):
+    """
+    הפעלת התראה אחת: וואטסאפ (לתור השליחה), עדכון last_alert וארכוב של כלל חד-פעמי (נכתבים ב-flush).
+    side: 'min' / 'max' (סף מחיר), 'change' / 'volume' (signal = שורת המצב היומי מ-indicators).
+    מחזיר None אם כלל חוזר עדיין ב-cooldown מההתראה הקודמת שלו.
+    """
+    dispatcher = get_dispatcher()
+    if not rule.is_one_time and dispatcher.in_cooldown(rule.key, last_alert=rule.last_alert):
+        scan_metrics.current().inc('alerts_suppressed')
+        return None
+
+    if side == 'min':
+        msg = f"📉 {ticker} dropped below {rule.min_price:g} (Price: {price:.2f})"
+    elif side == 'max':
+        msg = f"🚀 {ticker} broke above {rule.max_price:g} (Price: {price:.2f})"
+    elif side == 'change':
+        icon = "🚀" if signal['change_pct'] > 0 else "📉"
+        msg = f"{icon} {ticker} moved {signal['change_pct']:+.2f}% today, target {rule.change_pct:+g}% (Price: {price:.2f})"
+    else:
+        msg = f"📊 {ticker} volume {signal['volume']:,.0f} passed {rule.min_volume:,.0f} (Price: {price:.2f})"
+    print(f"🔥 ALERT TRIGGERED: {msg}")
+
+    # א. שליחת הוואטסאפ - נכנסת לתור ונשלחת ברקע, כך ששליחה איטית לא מעכבת את שאר הכללים
+    dispatcher.submit(alert_key(rule, side, now), rule.key, rule.phone, msg)
+
+    # ב. עדכון זמן שליחה אחרון (עמודת last_alert) ורישום בהיסטוריית ההתראות (נכתבת ב-flush)
+    store.record_trigger(rule, now)
+    get_trigger_history().record(rule, side, ticker, price, msg)
+
+    # ג. טיפול ב-One Time
+    if rule.is_one_time:
+        store.archive(rule)
+        print(f"-> {ticker} (rule {rule.key}) moved to Archive.")
+    else:
+        print("-> Recurring alert (remains Active).")
+    return msg
+
+def evaluate_rules(store, prices, snapshot=None, symbols=None):
+    """
+    בדיקת הכללים מול מפת המחירים דרך האינדקס הממוין של המאגר.
+    לכל סימול נמצאים הכללים שהופעלו ב-bisect, והעדכונים נרשמים במאגר (ונכתבים ב-flush).
+    כללי שינוי % / ווליום נבדקים כולם יחד מול snapshot (תוצאת fetch_signals) ב-SignalTable.
+    symbols: רק הסימולים שנבדקים בסריקה הזו (scan_targets); השאר נספרים כ-rules_deferred.
+    מחזיר את מספר ההתראות שהופעלו.
+    """
+    index = store.index
+    metrics = scan_metrics.current()
+    if symbols is not None:
+        for ticker in index.symbols() - symbols:
+            metrics.inc('rules_deferred', len(index.rules_for(ticker)))
+    symbols = index.symbols() if symbols is None else symbols & index.symbols()
+    fired = 0
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    signal_hits, blocked = [], set()
+    fired_keys = set() # כלל מופעל לכל היותר פעם אחת בסריקה (גם כשגם סף המחיר וגם השינוי/הווליום שלו עברו)
+    if index.signal_rules():
+        # בלי נתונים יומיים כללי השינוי לא מופעלים, וכללי מחיר עם ווליום מינימלי נחסמים
+        snapshot = snapshot if snapshot is not None else indicators.empty_snapshot()
+        signal_hits, blocked = indicators.signal_table(index).evaluate(snapshot)
+    for ticker in sorted(symbols):
+        rule_count = len(index.rules_for(ticker))
+        # מחיר חי מתוך המפה שנמשכה מראש
+        current_price = prices.get(ticker)
+        if current_price is None:
+            metrics.inc('rules_skipped', rule_count)
+            continue
+        metrics.inc('rules_scanned', rule_count)
+
+        print(f"Checking {ticker}: ${current_price:.2f} ({rule_count} rules)")
+
+        for rule, side in index.triggered(ticker, current_price):
+            if rule.key in blocked or rule.key in fired_keys:
+                continue # הווליום היומי עוד לא הגיע למינימום של הכלל, או שהכלל כבר הופעל בסריקה הזו
+            if fire_alert(store, rule, side, ticker, current_price, now):
+                fired_keys.add(rule.key)
+                fired += 1
+
+    for rule, side, signal in signal_hits:
+        if rule.key in fired_keys:
+            continue
+        price = prices.get(rule.symbol, signal['price'])
+        if fire_alert(store, rule, side, rule.symbol, price, now, signal):
+            fired_keys.add(rule.key)
+            fired += 1
+    get_dispatcher().commit()
+    metrics.inc('alerts_triggered', fired)
+    return fired
+
+def flush_store(store):
+    """כתיבה מרוכזת של כל העדכונים ושל ההתראות שהופעלו בסריקה"""
+    try:
+        written = store.flush()
+        scan_metrics.current().inc('store_updates', written)
+        if written:
+            print(f"📝 Flushed {written} updates to rule store.")
+    except Exception as e:
+        print(f"Error writing updates: {e}")
+    try:
+        recorded = get_trigger_history().flush()
+        if recorded:
+            print(f"🗂️ Recorded {recorded} triggers in history.")
+    except Exception as e:
+        print(f"Error writing trigger history: {e}")
+
+def deliver_notifications():
+    """סריקה חד-פעמית: שליחת כל ההתראות שבתור לפני היציאה (במצב daemon השולחים רצים ברקע)"""
+    dispatcher = get_dispatcher()
+    if dispatcher.running:
+        return
+    try:
+        asyncio.run(dispatcher.deliver_all())
+    except Exception as e:
+        print(f"Error sending notifications: {e}")
+
+def report_failures(failures):
+    metrics = scan_metrics.current()
+    blocked = sorted(symbol for symbol, reason in failures.items() if reason == UNRESOLVABLE)
+    if blocked:
+        # שורה אחת לסריקה במקום אזהרה לכל סימול שכבר ידוע כלא קיים
+        metrics.inc('symbols_blocked', len(blocked))
+        shown = ", ".join(blocked[:10]) + (" ..." if len(blocked) > 10 else "")
+        print(f"🚫 Skipping {len(blocked)} symbols that recently failed to resolve: {shown}")
+    metrics.inc('fetch_failures', len(failures) - len(blocked))
+    for symbol, reason in failures.items():
+        if reason != UNRESOLVABLE:
+            print(f"⚠️ Could not fetch price for {symbol} ({reason})")
+
+def export_metrics():
+    """סיום מדידת הסריקה: שורת JSON בלוג + קובץ Prometheus אם הוגדר"""
+    scan_metrics.registry.finish_scan()
+    if settings.METRICS_FILE:
+        try:
+            scan_metrics.registry.write_textfile(settings.METRICS_FILE)
+        except OSError as e:
+            print(f"⚠️ Could not write metrics file: {e}")
+
+def ensure_rule_ids(store):
+    """
+    בגיליון: מזהה לכל כלל פעיל שאין לו rule_id, כדי שהעדכונים יכוונו לפי מזהה ולא לפי מספר שורה.
+    נקרא רק מ-shard 0.
+    """
+    base = store.store if isinstance(store, ShardedStore) else store
+    if not isinstance(base, SheetRuleStore):
+        return
+    if all(rule.rule_id is not None for rule in base.index):
         return
+    assigned = base.assign_rule_ids()
+    if assigned:
+        print(f"🆔 Assigned rule_id to {assigned} rules.")
+        base.sync()
 
+def check_alerts(store=None, shard=None):
+    """
+    סריקה אחת (של shard אחד, אם הוגדר). מחזיר את מספר ההתראות שהופעלו
+    (None אם הסריקה נכשלה או שה-shard תפוס ע"י הרצה אחרת).
+    """
+    shard = shard or parse_shard(settings.SHARD, settings.SHARD_BY)
+    label = f" (shard {shard})" if shard.count > 1 else ""
+    print(f"\n--- 🔄 Starting Scan{label}: {datetime.now().strftime('%H:%M:%S')} ---")
+    metrics = scan_metrics.registry.start_scan()
     try:
-        # משיכת כל הנתונים
-        rows = sheet.get_all_records()
+        return _run_scan(store, metrics, shard)
+    finally:
+        export_metrics()
+
+def _run_scan(store, metrics, shard):
+    leases = None
+    if store is None:
+        with metrics.phase('connect'):
+            if settings.RULE_STORE == 'sheet':
+                sheet = init_connection()
+                if not sheet:
+                    return None
+                store = open_store('sheet', get_sheet=lambda: sheet)
+                leases = open_leases('sheet', get_sheet=lambda: sheet)
+            else:
+                store = open_store()
+                leases = open_leases(settings.RULE_STORE)
+
+    if leases is None:
+        return _scan_shard(store, metrics, shard)
+
+    # הרצה חופפת (cron איטי + הרצה ידנית) לא סורקת את אותו shard פעמיים
+    try:
+        with metrics.phase('lease'):
+            acquired = leases.acquire(shard.lease_name, settings.LEASE_TTL_SECONDS)
+    except Exception as e:
+        print(f"Error acquiring lease: {e}")
+        return None
+    if not acquired:
+        print(f"⏭️ Shard {shard} is held by {leases.holder} - skipping this run.")
+        return None
+    try:
+        return _scan_shard(store, metrics, shard)
+    finally:
+        try:
+            leases.release(shard.lease_name)
+        except Exception as e:
+            print(f"⚠️ Could not release lease (it will expire): {e}")
+
+def _scan_shard(store, metrics, shard):
+    if shard.count > 1:
+        store = ShardedStore(store, shard)
+
+    try:
+        # משיכת הכללים הפעילים בלבד
+        with metrics.phase('sync'):
+            store.sync()
     except Exception as e:
         print(f"Error reading rows: {e}")
-        return
-    
-    for i, row in enumerate(rows):
-        # אינדקס שורה אמיתי בגיליון (מתחיל ב-2 כי 1 זה כותרת)
-        real_row_index = i + 2
-        
-        # 1. דילוג על מה שלא פעיל
-        if str(row.get('status')) != 'Active':
-            continue
-            
-        ticker = row.get('symbol')
-        min_p = row.get('min_price')
-        max_p = row.get('max_price')
-        is_one_time = str(row.get('is_one_time')).upper() == 'TRUE'
-        
-        if not ticker: continue
-
-        # 2. בדיקת מחיר חי
-        current_price = get_live_price(ticker)
-        if current_price is None:
-            print(f"⚠️ Could not fetch price for {ticker}")
+        return None
+    if shard.index == 0:
+        ensure_rule_ids(store)
+
+    # שלב מקדים: משיכת מחירים מרוכזת לכל הסימולים הייחודיים של השורות הפעילות (שהשוק שלהם פתוח)
+    targets = scan_targets(store.index.symbols())
+    with metrics.phase('prices'):
+        prices, failures = fetch_prices(targets)
+    report_failures(failures)
+    # שינוי % וווליום - רק לסימולים שיש להם כללים כאלה
+    with metrics.phase('signals'):
+        snapshot = fetch_signals(store.index, targets)
+
+    with metrics.phase('evaluate'):
+        fired = evaluate_rules(store, prices, snapshot, targets)
+    with metrics.phase('flush'):
+        flush_store(store)
+    with metrics.phase('notify'):
+        deliver_notifications()
+    return fired
+
+# ==========================================
+# תזמון אדפטיבי - אילו סימולים לבדוק בכל סריקה
+# ==========================================
+# שניות מסחר ביום (6.5 שעות) - להמרת התנודתיות היומית לתנודתיות לשנייה
+TRADING_SECONDS_PER_DAY = 6.5 * 60 * 60
+
+def threshold_distance(rules, price, signal=None):
+    """
+    המרחק היחסי (0.01 = 1%) מהמחיר לסף הקרוב ביותר בכללים של הסימול (SymbolRules); 0 אם סף כבר נחצה.
+    כלל שינוי %: המרחק בין השינוי היומי (signal) ליעד. כלל ווליום, או בלי נתונים יומיים: 0.
+    """
+    if price is None or price <= 0:
+        return 0.0
+    distances = []
+    if rules.mins:
+        distances.append(max(price - rules.mins[-1], 0.0) / price)
+    if rules.maxs:
+        distances.append(max(rules.maxs[0] - price, 0.0) / price)
+    change = signal.get('change_pct') if signal else None
+    for rule in rules:
+        if rule.change_pct is None:
+            if rule.min_price is None and rule.max_price is None:
+                return 0.0 # כלל ווליום בלבד
             continue
-            
-        print(f"Checking {ticker}: ${current_price:.2f} (Min: {min_p}, Max: {max_p})")
+        if change is None or math.isnan(change):
+            return 0.0
+        gap = rule.change_pct - change if rule.change_pct > 0 else change - rule.change_pct
+        distances.append(max(gap, 0.0) / 100)
+    return min(distances) if distances else 0.0
 
-        triggered = False
-        msg = ""
+class AdaptivePlanner:
+    """
+    תור עדיפויות (heap) של סימולים לפי זמן הבדיקה הבא שלהם.
+    המרווח של סימול הוא הזמן המשוער עד שתנועה אקראית של המחיר תגיע לסף הקרוב -
+    (מרחק / תנודתיות)^2 - כפול safety, בין min_interval (כל סריקה) ל-max_interval.
+    התנודתיות לשנייה נמדדת מהמחירים שנמשכו (EWMA של תשואות בריבוע) ולא יורדת מתחת לרבע
+    מברירת המחדל, כי ציטוט מהמטמון או ציטוט מושהה נראה כמו "אין תנועה".
+    כשהשוק של הסימול סגור הבדיקה הבאה נקבעת לפתיחה (market_calendar) - קריפטו ממשיך כרגיל.
+    """
 
-        # 3. לוגיקת בדיקה
-        # המרה למספרים בזהירות
-        try:
-            if min_p and current_price <= float(min_p):
-                msg = f"📉 {ticker} dropped below {min_p} (Price: {current_price:.2f})"
-                triggered = True
-            elif max_p and current_price >= float(max_p):
-                msg = f"🚀 {ticker} broke above {max_p} (Price: {current_price:.2f})"
-                triggered = True
-        except ValueError:
-            continue # נתונים לא תקינים בשורה
-
-        # 4. ביצוע פעולה
-        if triggered:
-            print(f"🔥 ALERT TRIGGERED: {msg}")
-            
-            # א. כאן תהיה שליחת הוואטסאפ בעתיד
-            # send_whatsapp_message(row['phone'], msg)
-            
-            # ב. עדכון זמן שליחה אחרון (עמודה F - created_at/last_alert)
-            # אנחנו נעדכן את זה כדי שנדע מתי נשלח
-            # שים לב: זה תלוי במיקום העמודות שלך. בקוד ההוספה שלנו זה עמודה 6.
-            
-            # ג. טיפול ב-One Time
-            if is_one_time:
-                # עדכון סטטוס ל-Archived (עמודה H - עמודה מס' 8)
-                sheet.update_cell(real_row_index, 8, "Archived")
-                print(f"-> {ticker} moved to Archive.")
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, min_interval, max_interval=None, safety=None, daily_volatility=None, clock=time.time):
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval or settings.ADAPTIVE_MAX_INTERVAL, min_interval)
+        self.safety = safety or settings.ADAPTIVE_SAFETY
+        volatility = daily_volatility or settings.ADAPTIVE_DEFAULT_VOLATILITY
+        self.default_rate = volatility ** 2 / TRADING_SECONDS_PER_DAY # שונות לשנייה
+        self.clock = clock
+        self._heap = []    # (זמן הבדיקה, symbol) - רשומות ישנות מדולגות לפי _due
+        self._due = {}     # symbol -> זמן הבדיקה הבא (epoch)
+        self._last = {}    # symbol -> (מחיר, זמן) מהבדיקה הקודמת
+        self._rate = {}    # symbol -> שונות לשנייה (EWMA)
+
+    def __len__(self):
+        return len(self._due)
+
+    def _schedule(self, symbol, when):
+        opens = market_calendar.next_open(symbol, when).timestamp()
+        if opens > when + 1: # השוק סגור (הסבילות - עיגול ה-datetime למיקרו-שניות)
+            when = opens
+        self._due[symbol] = when
+        heapq.heappush(self._heap, (when, symbol))
+
+    def due(self, symbols, now=None):
+        """
+        הסימולים מתוך symbols שהגיע זמנם. סימול חדש נבדק מיד (אם השוק שלו פתוח).
+        כל סימול שהוחזר נקבע זמנית לעוד min_interval, עד ש-observe יקבע לו מרווח אמיתי.
+        """
+        now = self.clock() if now is None else now
+        for symbol in symbols:
+            if symbol not in self._due:
+                self._schedule(symbol, now)
+        ready = set()
+        while self._heap and self._heap[0][0] <= now:
+            when, symbol = heapq.heappop(self._heap)
+            if self._due.get(symbol) != when:
+                continue
+            if symbol not in symbols: # אין לו יותר כללים פעילים
+                del self._due[symbol]
+                self._last.pop(symbol, None)
+                self._rate.pop(symbol, None)
+                continue
+            ready.add(symbol)
+        for symbol in ready:
+            self._schedule(symbol, now + self.min_interval)
+        return ready
+
+    def _observe_price(self, symbol, price, now):
+        previous = self._last.get(symbol)
+        self._last[symbol] = (price, now)
+        if previous is None:
+            return
+        last_price, last_time = previous
+        elapsed = now - last_time
+        # פער ארוך (לילה, סופ"ש) הוא לא מדידה של התנודתיות התוך-יומית
+        if last_price <= 0 or not 0 < elapsed <= 2 * self.max_interval:
+            return
+        sample = math.log(price / last_price) ** 2 / elapsed
+        rate = self._rate.get(symbol, self.default_rate)
+        self._rate[symbol] = max((1 - self.EWMA_ALPHA) * rate + self.EWMA_ALPHA * sample, self.default_rate / 4)
+
+    def interval_for(self, distance, rate=None):
+        if distance <= 0:
+            return self.min_interval
+        expected = distance ** 2 / (rate or self.default_rate)
+        return min(max(self.safety * expected, self.min_interval), self.max_interval)
+
+    def observe(self, index, prices, symbols, snapshot=None, now=None):
+        """קביעת הבדיקה הבאה לכל סימול שנבדק עכשיו, לפי המחיר שנמשך (סימול בלי מחיר - בסריקה הבאה)"""
+        now = self.clock() if now is None else now
+        signals = snapshot.to_dict('index') if snapshot is not None and len(snapshot) else {}
+        for symbol in symbols:
+            rules = index.rules_for(symbol)
+            price = prices.get(symbol)
+            if rules is None or price is None or price <= 0:
+                interval = self.min_interval
             else:
-                print("-> Recurring alert (remains Active).")
+                self._observe_price(symbol, price, now)
+                distance = threshold_distance(rules, price, signals.get(symbol))
+                interval = self.interval_for(distance, self._rate.get(symbol))
+            self._schedule(symbol, now + interval)
 
-# --- סוף קובץ scheduler.py המעודכן ל-GitHub Actions ---
+def scan_targets(symbols, planner=None):
+    """הסימולים לבדוק בסריקה הזו: לפי התור האדפטיבי, או (בלעדיו) כל סימול שהשוק שלו פתוח"""
+    targets = planner.due(symbols) if planner is not None else market_calendar.open_symbols(symbols)
+    if len(targets) < len(symbols):
+        print(f"⏱️ Checking {len(targets)}/{len(symbols)} symbols (the rest are not due or their market is closed)")
+    return targets
 
-if __name__ == "__main__":
-    print("🚀 Running One-Time Scan via GitHub Actions...")
+# ==========================================
+# מצב DAEMON - לולאה מתמשכת על asyncio
+# ==========================================
+async def scan_async(store, planner=None):
+    """
+    סריקה אחת במצב daemon.
+    משיכת המחירים של הסימולים מהסריקה הקודמת רצה במקביל לסנכרון הכללים מול המאגר,
+    ורק סימולים חדשים נמשכים אחרי הסנכרון.
+    עם planner (AdaptivePlanner) נמשכים ונבדקים רק הסימולים שהגיע זמנם.
+    """
+    print(f"\n--- 🔄 Starting Scan: {datetime.now().strftime('%H:%M:%S')} ---")
+    metrics = scan_metrics.registry.start_scan()
+    try:
+        def timed(phase, func, *args):
+            with metrics.phase(phase):
+                return func(*args)
+
+        # השלבים sync ו-prefetch חופפים בזמן, ולכן נמדדים בנפרד
+        targets = scan_targets(store.index.symbols(), planner)
+        prefetch = asyncio.create_task(asyncio.to_thread(timed, 'prefetch', fetch_prices, targets))
+        try:
+            await asyncio.to_thread(timed, 'sync', store.sync)
+        except Exception:
+            prefetch.cancel()
+            raise
+        prices, failures = await prefetch
+
+        symbols = store.index.symbols()
+        # סימולים חדשים מהסנכרון (ב-planner הם מגיעים כ-due מיד)
+        if planner is not None:
+            targets = (targets & symbols) | planner.due(symbols)
+        else:
+            targets = market_calendar.open_symbols(symbols)
+        missing = targets - prices.keys() - failures.keys()
+        if missing:
+            more_prices, more_failures = await asyncio.to_thread(timed, 'prices', fetch_prices, missing)
+            prices.update(more_prices)
+            failures.update(more_failures)
+        report_failures({s: r for s, r in failures.items() if s in symbols})
+        snapshot = await asyncio.to_thread(timed, 'signals', fetch_signals, store.index, targets)
+
+        with metrics.phase('evaluate'):
+            evaluate_rules(store, prices, snapshot, targets)
+            if planner is not None:
+                planner.observe(store.index, prices, targets, snapshot)
+        await asyncio.to_thread(timed, 'flush', flush_store, store)
+    finally:
+        export_metrics()
+
+async def sync_sheet_async(store, session):
+    """סנכרון דו-כיווני של מאגר SQLite מול הגיליון (ברקע לסריקות)"""
+    try:
+        sheet = await asyncio.to_thread(session.sheet)
+        await asyncio.to_thread(sync_with_sheet, store, sheet)
+    except Exception as e:
+        print(f"⚠️ Sheet sync failed: {e}")
+        session.reset()
+
+def _stop_event():
+    """אירוע שנקבע ב-SIGTERM/SIGINT, לעצירה נקייה של הלולאה"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass  # Windows - אין תמיכה ב-signal handlers בלולאה
+    return stop
+
+async def _hold_lease(leases, shard, ttl):
+    """תפיסה/הארכה של ה-lease על ה-shard. False אם worker אחר מחזיק בו (או שה-leases לא זמינים)"""
     try:
-        check_alerts() # מריץ בדיקה אחת ומסיים
-        print("✅ Scan Complete.")
+        if await asyncio.to_thread(leases.acquire, shard.lease_name, ttl):
+            return True
+        print(f"⏭️ Shard {shard} is held by {leases.holder} - waiting.")
     except Exception as e:
-        print(f"❌ Error: {e}")
-        
-        # המתנה של 60 שניות בין סריקות
-        time.sleep(60)
+        print(f"⚠️ Lease check failed: {e}")
+    return False
 
+async def _release_lease(leases, shard):
+    try:
+        await asyncio.to_thread(leases.release, shard.lease_name)
+    except Exception as e:
+        print(f"⚠️ Could not release lease (it will expire): {e}")
+
+async def run_daemon(interval=SCAN_INTERVAL, store_kind=None, shard=None):
+    """לולאת סריקות עם חיבור קבוע למאגר. נעצרת בצורה נקייה ב-SIGTERM/SIGINT"""
+    store_kind = store_kind or settings.RULE_STORE
+    shard = shard or parse_shard(settings.SHARD, settings.SHARD_BY)
+    print(f"🚀 Running scheduler daemon (every {interval}s, store: {store_kind}, shard: {shard})...")
+    session = SheetSession()
+    base_store = open_store(store_kind, get_sheet=session.sheet)
+    store = ShardedStore(base_store, shard) if shard.count > 1 else base_store
+    leases = open_leases(store_kind, get_sheet=session.sheet)
+    # ה-lease מוארך בכל סריקה, ופג רק אם ה-daemon נתקע או נפל
+    lease_ttl = max(settings.LEASE_TTL_SECONDS, 3 * interval)
+    # עם SQLite - סנכרון תקופתי מול הגיליון, אם הוגדר (רק ב-shard 0, כדי שלא ירוצו כמה סנכרונים במקביל)
+    sheet_sync_enabled = store_kind == 'sqlite' and settings.SHEET_SYNC_SECONDS > 0 and shard.index == 0
+    last_sheet_sync = None
+    stop = _stop_event()
+    metrics_server = scan_metrics.registry.serve(settings.METRICS_PORT) if settings.METRICS_PORT else None
+    # שולחי הוואטסאפ רצים ברקע לאורך כל חיי ה-daemon
+    dispatcher = get_dispatcher()
+    await dispatcher.start()
+    # כל סריקה בודקת רק את הסימולים שהגיע זמנם; interval הוא המרווח של סימול שקרוב לסף
+    planner = AdaptivePlanner(interval) if settings.ADAPTIVE_SCAN else None
+
+    while not stop.is_set():
+        started = time.monotonic()
+        if await _hold_lease(leases, shard, lease_ttl):
+            if sheet_sync_enabled and (last_sheet_sync is None or started - last_sheet_sync >= settings.SHEET_SYNC_SECONDS):
+                await sync_sheet_async(base_store, session)
+                last_sheet_sync = started
+            try:
+                await scan_async(store, planner)
+                if shard.index == 0:
+                    await asyncio.to_thread(ensure_rule_ids, store)
+                print("✅ Scan Complete.")
+            except Exception as e:
+                print(f"❌ Error: {e}")
+                session.reset()
+
+        # המתנה עד הסריקה הבאה, או יציאה מיידית אם התקבל אות עצירה
+        remaining = max(0.0, interval - (time.monotonic() - started))
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=remaining)
+        except asyncio.TimeoutError:
+            pass
+
+    await dispatcher.close()
+    await _release_lease(leases, shard)
+    if metrics_server:
+        metrics_server.shutdown()
+    print("👋 Scheduler daemon stopped.")
+
+# ==========================================
+# מצב STREAM - בדיקת הכללים לכל tick שמגיע מספק המחירים
+# ==========================================
+class StreamEvaluator:
+    """
+    בדיקת כללים לכל tick.
+    כלל חוזר מופעל רק כשהמחיר חוצה את הסף (מעבר מ"לא מתקיים" ל"מתקיים"), ולא בכל tick שבו המחיר נשאר מעבר לסף.
+    כלל חד-פעמי שהופעל מושתק עד שהסנכרון הבא מוציא אותו מהאינדקס.
+    כללי שינוי % / ווליום נבדקים ב-on_signals (בכל סנכרון), עם אותו היגיון של מעבר סף.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._crossed = {}       # symbol -> {(rule key, side)} שהתנאי שלהם מתקיים כרגע
+        self._fired_once = set()
+        self._signals_on = set() # (rule key, side) של כללי שינוי/ווליום שהתנאי שלהם מתקיים כרגע
+        self._blocked = set()    # כללי מחיר שהווליום שלהם מתחת למינימום (מה-snapshot האחרון)
+
+    def on_sync(self):
+        live = {rule.key for rule in self.store.index}
+        self._fired_once &= live
+
+    def on_signals(self, snapshot, prices=None):
+        index = self.store.index
+        if not index.signal_rules():
+            self._signals_on, self._blocked = set(), set()
+            return 0
+        snapshot = snapshot if snapshot is not None else indicators.empty_snapshot()
+        hits, self._blocked = indicators.signal_table(index).evaluate(snapshot)
+        fired = 0
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        signals_on = set()
+        for rule, side, signal in hits:
+            signals_on.add((rule.key, side))
+            if (rule.key, side) in self._signals_on or rule.key in self._fired_once:
+                continue
+            price = (prices or {}).get(rule.symbol, signal['price'])
+            if not fire_alert(self.store, rule, side, rule.symbol, price, now, signal):
+                continue
+            fired += 1
+            if rule.is_one_time:
+                self._fired_once.add(rule.key)
+        self._signals_on = signals_on
+        get_dispatcher().commit()
+        scan_metrics.current().inc('alerts_triggered', fired)
+        return fired
+
+    def on_ticks(self, ticks):
+        index = self.store.index
+        metrics = scan_metrics.current()
+        fired = 0
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        for tick in ticks:
+            metrics.inc('rules_scanned', len(index.rules_for(tick.symbol) or ()))
+            previous = self._crossed.get(tick.symbol, ())
+            crossed = set()
+            for rule, side in index.triggered(tick.symbol, tick.price):
+                if rule.key in self._blocked:
+                    continue
+                crossed.add((rule.key, side))
+                if (rule.key, side) in previous or rule.key in self._fired_once:
+                    continue
+                if not fire_alert(self.store, rule, side, tick.symbol, tick.price, now):
+                    continue
+                fired += 1
+                if rule.is_one_time:
+                    self._fired_once.add(rule.key)
+            if crossed:
+                self._crossed[tick.symbol] = crossed
+            else:
+                self._crossed.pop(tick.symbol, None)
+        get_dispatcher().commit()
+        metrics.inc('alerts_triggered', fired)
+        return fired
+
+async def run_stream(feed_kind=None, store_kind=None, replay_file=None, speed=1.0, interval=SCAN_INTERVAL, shard=None):
+    """
+    לולאת stream: ספק המחירים דוחף tick-ים, רצפים לאותו סימול מתאחדים, וכל מנה נבדקת מיד מול האינדקס.
+    העדכונים נכתבים למאגר כל STREAM_FLUSH_SECONDS, והכללים נטענים מחדש כל STREAM_SYNC_SECONDS.
+    אם ספק ה-push נופל - ממשיכים עם polling של yfinance.
+    """
+    feed_kind = feed_kind or settings.STREAM_FEED
+    store_kind = store_kind or settings.RULE_STORE
+    shard = shard or parse_shard(settings.SHARD, settings.SHARD_BY)
+    print(f"📡 Running scheduler in stream mode (feed: {feed_kind}, store: {store_kind}, shard: {shard})...")
+    session = SheetSession()
+    base_store = open_store(store_kind, get_sheet=session.sheet)
+    store = ShardedStore(base_store, shard) if shard.count > 1 else base_store
+    leases = open_leases(store_kind, get_sheet=session.sheet)
+    lease_ttl = max(settings.LEASE_TTL_SECONDS, 3 * settings.STREAM_SYNC_SECONDS)
+    if not await _hold_lease(leases, shard, lease_ttl):
+        return
+    sheet_sync_enabled = store_kind == 'sqlite' and settings.SHEET_SYNC_SECONDS > 0 and shard.index == 0
+    stop = _stop_event()
+    metrics_server = scan_metrics.registry.serve(settings.METRICS_PORT) if settings.METRICS_PORT else None
+    metrics = scan_metrics.registry.start_scan()
+    dispatcher = get_dispatcher()
+    await dispatcher.start()
+
+    if sheet_sync_enabled:
+        await sync_sheet_async(base_store, session)
+    with metrics.phase('sync'):
+        await asyncio.to_thread(store.sync)
+    print(f"👀 Watching {len(store.index)} rules on {len(store.index.symbols())} symbols.")
+    evaluator = StreamEvaluator(store)
+    with metrics.phase('signals'):
+        evaluator.on_signals(await asyncio.to_thread(fetch_signals, store.index))
+
+    feed = make_feed(feed_kind, fetch=fetch_prices, replay_file=replay_file, speed=speed, poll_interval=interval)
+    await feed.set_symbols(market_calendar.open_symbols(store.index.symbols()))
+    coalescer = TickCoalescer(settings.STREAM_MAX_PENDING)
+    feed_task = asyncio.create_task(feed.run(coalescer.put))
+    stop_task = asyncio.create_task(stop.wait())
+    drain = None
+    last_flush = last_sync = last_sheet_sync = time.monotonic()
+
+    async def report():
+        received, coalesced = coalescer.take_counts()
+        metrics.inc('ticks_received', received)
+        metrics.inc('ticks_coalesced', coalesced)
+        with metrics.phase('flush'):
+            await asyncio.to_thread(flush_store, store)
+
+    while not stop.is_set():
+        drain = drain or asyncio.create_task(coalescer.drain())
+        done, _ = await asyncio.wait({drain, stop_task, feed_task}, timeout=settings.STREAM_FLUSH_SECONDS,
+                                     return_when=asyncio.FIRST_COMPLETED)
+        if drain in done:
+            with metrics.phase('evaluate'):
+                evaluator.on_ticks(drain.result())
+            drain = None
+
+        if feed_task in done:
+            error = feed_task.exception()
+            if error is None:
+                stop.set() # ה-replay הסתיים
+            elif isinstance(feed, PollingFeed):
+                print(f"❌ Price feed failed: {error}")
+                stop.set()
+            else:
+                print(f"⚠️ {feed.name} feed failed ({error}), falling back to polling")
+                feed = PollingFeed(fetch_prices, interval=interval)
+                await feed.set_symbols(market_calendar.open_symbols(store.index.symbols()))
+                feed_task = asyncio.create_task(feed.run(coalescer.put))
+
+        now = time.monotonic()
+        if now - last_flush >= settings.STREAM_FLUSH_SECONDS:
+            await report()
+            last_flush = now
+        if now - last_sync >= settings.STREAM_SYNC_SECONDS:
+            # הכתיבות כבר במאגר, כך שהסנכרון מוציא מהאינדקס את הכללים החד-פעמיים שהופעלו
+            if not await _hold_lease(leases, shard, lease_ttl):
+                print("❌ Lost the shard lease - stopping.")
+                stop.set()
+                continue
+            if sheet_sync_enabled and now - last_sheet_sync >= settings.SHEET_SYNC_SECONDS:
+                await sync_sheet_async(base_store, session)
+                last_sheet_sync = now
+            try:
+                with metrics.phase('sync'):
+                    await asyncio.to_thread(store.sync)
+                evaluator.on_sync()
+                await feed.set_symbols(market_calendar.open_symbols(store.index.symbols()))
+                with metrics.phase('signals'):
+                    evaluator.on_signals(await asyncio.to_thread(fetch_signals, store.index))
+            except Exception as e:
+                print(f"❌ Error reading rows: {e}")
+                session.reset()
+            export_metrics()
+            metrics = scan_metrics.registry.start_scan()
+            last_sync = now
+
+    for task in (feed_task, stop_task, drain):
+        if task is not None:
+            task.cancel()
+    await asyncio.gather(feed_task, stop_task, *([drain] if drain else []), return_exceptions=True)
+    # tick-ים שהגיעו לפני העצירה עדיין נבדקים ונכתבים
+    with metrics.phase('evaluate'):
+        evaluator.on_ticks(coalescer.take())
+    await report()
+    await dispatcher.close()
+    await _release_lease(leases, shard)
+    export_metrics()
+    if metrics_server:
+        metrics_server.shutdown()
+    print("👋 Scheduler stream stopped.")
+
+# --- סוף קובץ scheduler.py המעודכן ל-GitHub Actions ---
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="StockWatcher alert scheduler")
+    parser.add_argument("--daemon", action="store_true", help="run scans continuously instead of once")
+    parser.add_argument("--interval", type=int, default=SCAN_INTERVAL, help="seconds between scans in daemon mode")
+    parser.add_argument("--store", choices=["sheet", "sqlite"], default=settings.RULE_STORE, help="where rules are stored")
+    parser.add_argument("--stream", action="store_true", help="evaluate rules on every tick from a price feed instead of scanning")
+    parser.add_argument("--feed", choices=["polling", "yahoo", "replay", "simulated"], default=settings.STREAM_FEED, help="price feed for --stream")
+    parser.add_argument("--replay-file", help="CSV of timestamp,symbol,price ticks for --feed replay")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="replay speed factor (0 = as fast as possible)")
+    parser.add_argument("--shard", default=settings.SHARD, help="scan only shard i of N (i/N, e.g. 2/4) under a lease")
+    parser.add_argument("--shard-by", choices=["symbol", "rule"], default=settings.SHARD_BY, help="what rules are sharded by")
+    parser.add_argument("--sync-sheet", action="store_true", help="two-way sync of the SQLite store with the Rules sheet, then exit")
+    parser.add_argument("--metrics-file", default=settings.METRICS_FILE, help="write Prometheus text-format metrics to this file after each scan")
+    parser.add_argument("--metrics-port", type=int, default=settings.METRICS_PORT, help="serve /metrics on this local port (daemon mode)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    settings.RULE_STORE = args.store
+    settings.METRICS_FILE = args.metrics_file
+    settings.METRICS_PORT = args.metrics_port
+    settings.SHARD, settings.SHARD_BY = args.shard, args.shard_by
+    parse_shard(settings.SHARD, settings.SHARD_BY) # בדיקת תקינות לפני שמתחילים
+    if args.sync_sheet:
+        sheet = init_connection()
+        if sheet:
+            sync_with_sheet(SQLiteRuleStore(), sheet)
+    elif args.stream:
+        asyncio.run(run_stream(args.feed, args.store, args.replay_file, args.replay_speed, args.interval))
+    elif args.daemon:
+        asyncio.run(run_daemon(args.interval, args.store))
+    else:
+        print("🚀 Running One-Time Scan via GitHub Actions...")
+        try:
+            check_alerts() # מריץ בדיקה אחת ומסיים
+            print("✅ Scan Complete.")
+        except Exception as e:
+            print(f"❌ Error: {e}")
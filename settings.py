@@ -0,0 +1,100 @@
+# קובץ: settings.py
+# הגדרות משותפות ל-app.py ול-scheduler.py (ניתן לדרוס דרך משתני סביבה)
+
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# תיקיית הנתונים המקומית (מטמון, היסטוריה וכו')
+DATA_DIR = os.environ.get("STOCKWATCHER_DATA_DIR", os.path.join(BASE_DIR, ".data"))
+
+# מטמון מחירים משותף
+CACHE_PATH = os.environ.get("STOCKWATCHER_CACHE", os.path.join(DATA_DIR, "market_cache.db"))
+QUOTE_TTL = int(os.environ.get("STOCKWATCHER_QUOTE_TTL", "60"))         # שניות - מחיר חי
+CACHE_MAX_QUOTES = int(os.environ.get("STOCKWATCHER_CACHE_MAX_QUOTES", "20000"))
+
+# היסטוריית נרות מצטברת (קובץ לכל סימול ואינטרוול): כמה סימולים להחזיק גם בזיכרון, TTL ונפח מרבי בדיסק
+HISTORY_DIR = os.environ.get("STOCKWATCHER_HISTORY_DIR", os.path.join(DATA_DIR, "history"))
+HISTORY_MEMORY_ITEMS = int(os.environ.get("STOCKWATCHER_HISTORY_MEMORY_ITEMS", "64"))
+BARS_TTL = int(os.environ.get("STOCKWATCHER_BARS_TTL", str(15 * 60)))   # שניות - מתי לבדוק שוב נרות יומיים
+HISTORY_MAX_BYTES = int(os.environ.get("STOCKWATCHER_HISTORY_MAX_BYTES", str(512 * 1024 * 1024)))  # נפח הקבצים בדיסק
+
+# תקציב הנקודות בגרף הנרות - מעבר לזה נרות סמוכים מאוחדים בצד השרת
+CHART_MAX_POINTS = int(os.environ.get("STOCKWATCHER_CHART_MAX_POINTS", "800"))
+
+# תמונת מצב מדדי השוק בדשבורד: כל כמה שניות לרענן ברקע, ואחרי כמה שניות בלי צופים לעצור
+MARKET_SNAPSHOT_SECONDS = int(os.environ.get("STOCKWATCHER_MARKET_SNAPSHOT_SECONDS", "30"))
+MARKET_SNAPSHOT_IDLE_SECONDS = int(os.environ.get("STOCKWATCHER_MARKET_SNAPSHOT_IDLE_SECONDS", "600"))
+
+# מאגר הסימולים (מטא-דאטה והשלמה בטופס), ותוקף המטמון השלילי לסימול שלא נמצא (שניות) -
+# מוכפל בכל כישלון נוסף עד המקסימום
+SYMBOLS_DB_PATH = os.environ.get("STOCKWATCHER_SYMBOLS_DB", os.path.join(DATA_DIR, "symbols.db"))
+SYMBOL_NEGATIVE_TTL = int(os.environ.get("STOCKWATCHER_SYMBOL_NEGATIVE_TTL", str(60 * 60)))
+SYMBOL_NEGATIVE_MAX_TTL = int(os.environ.get("STOCKWATCHER_SYMBOL_NEGATIVE_MAX_TTL", str(7 * 24 * 60 * 60)))
+
+# השער ל-Yahoo Finance (משותף לכל התהליך): קצב בקשות לשנייה ופרץ, בקשות במקביל, ניסיונות חוזרים
+# אחרי 429, וההמתנה אחרי 429 (שניות - מוכפלת בכל חסימה נוספת עד המקסימום). הקובץ משתף את ההמתנה בין תהליכים
+YAHOO_RATE = float(os.environ.get("STOCKWATCHER_YAHOO_RATE", "4"))
+YAHOO_BURST = int(os.environ.get("STOCKWATCHER_YAHOO_BURST", "8"))
+YAHOO_WORKERS = int(os.environ.get("STOCKWATCHER_YAHOO_WORKERS", "4"))
+YAHOO_MAX_RETRIES = int(os.environ.get("STOCKWATCHER_YAHOO_RETRIES", "3"))
+YAHOO_BACKOFF_SECONDS = float(os.environ.get("STOCKWATCHER_YAHOO_BACKOFF", "5"))
+YAHOO_BACKOFF_MAX_SECONDS = float(os.environ.get("STOCKWATCHER_YAHOO_BACKOFF_MAX", "300"))
+YAHOO_BACKOFF_PATH = os.environ.get("STOCKWATCHER_YAHOO_BACKOFF_FILE", os.path.join(DATA_DIR, "yahoo_backoff"))
+
+# היסטוריית ההתראות שהופעלו, וחלון ההתראות האחרונות בדשבורד: כמה שורות וכל כמה שניות לבדוק חדשות
+TRIGGER_HISTORY_PATH = os.environ.get("STOCKWATCHER_TRIGGER_HISTORY", os.path.join(DATA_DIR, "triggers.db"))
+TRIGGER_FEED_SIZE = int(os.environ.get("STOCKWATCHER_TRIGGER_FEED_SIZE", "30"))
+TRIGGER_FEED_SECONDS = int(os.environ.get("STOCKWATCHER_TRIGGER_FEED_SECONDS", "15"))
+
+# יומן המסחר (לוג JSONL שרק מוסיפים לו)
+JOURNAL_PATH = os.environ.get("STOCKWATCHER_JOURNAL", os.path.join(DATA_DIR, "journal.jsonl"))
+
+# מאגר הכללים: "sheet" (גיליון StockWatcherDB/Rules) או "sqlite" (קובץ מקומי)
+RULE_STORE = os.environ.get("STOCKWATCHER_STORE", "sheet")
+RULES_DB_PATH = os.environ.get("STOCKWATCHER_RULES_DB", os.path.join(DATA_DIR, "rules.db"))
+# במצב daemon עם sqlite: כל כמה שניות לסנכרן מול הגיליון (0 = בלי סנכרון)
+SHEET_SYNC_SECONDS = int(os.environ.get("STOCKWATCHER_SHEET_SYNC", "300"))
+
+# מדדי סריקה בפורמט Prometheus: קובץ טקסט (ריק = כבוי) ו/או פורט HTTP מקומי במצב daemon (0 = כבוי)
+METRICS_FILE = os.environ.get("STOCKWATCHER_METRICS_FILE", "")
+METRICS_PORT = int(os.environ.get("STOCKWATCHER_METRICS_PORT", "0"))
+
+# מצב stream: ספק המחירים (polling/yahoo/replay/simulated), כל כמה שניות לכתוב עדכונים למאגר,
+# וכל כמה שניות לטעון מחדש את הכללים (ולעדכן את רשימת הסימולים בספק)
+STREAM_FEED = os.environ.get("STOCKWATCHER_FEED", "polling")
+STREAM_FLUSH_SECONDS = float(os.environ.get("STOCKWATCHER_STREAM_FLUSH", "5"))
+STREAM_SYNC_SECONDS = float(os.environ.get("STOCKWATCHER_STREAM_SYNC", "60"))
+# מקסימום סימולים שממתינים לבדיקה לפני שהספק נעצר (backpressure)
+STREAM_MAX_PENDING = int(os.environ.get("STOCKWATCHER_STREAM_MAX_PENDING", "5000"))
+
+# התראות וואטסאפ: מספר שולחים במקביל, קצב מקסימלי (הודעות לשנייה) ופרץ, ניסיונות חוזרים,
+# והשהיה בין התראות של אותו כלל חוזר (שניות)
+NOTIFY_LOG_PATH = os.environ.get("STOCKWATCHER_NOTIFY_LOG", os.path.join(DATA_DIR, "notifications.db"))
+NOTIFY_CONCURRENCY = int(os.environ.get("STOCKWATCHER_NOTIFY_CONCURRENCY", "8"))
+NOTIFY_RATE = float(os.environ.get("STOCKWATCHER_NOTIFY_RATE", "10"))
+NOTIFY_BURST = int(os.environ.get("STOCKWATCHER_NOTIFY_BURST", "20"))
+NOTIFY_MAX_RETRIES = int(os.environ.get("STOCKWATCHER_NOTIFY_RETRIES", "5"))
+NOTIFY_COOLDOWN_SECONDS = int(os.environ.get("STOCKWATCHER_NOTIFY_COOLDOWN", str(60 * 60)))
+# הודעה שלא נשלחה תוך פרק זמן זה (למשל אחרי נפילה) כבר לא נשלחת
+NOTIFY_MAX_AGE_SECONDS = int(os.environ.get("STOCKWATCHER_NOTIFY_MAX_AGE", str(60 * 60)))
+
+# חלוקה ל-shards: "i/N" (ה-shard של ה-worker הזה), לפי symbol או rule, ותוקף ה-lease על ה-shard (שניות)
+SHARD = os.environ.get("STOCKWATCHER_SHARD", "0/1")
+SHARD_BY = os.environ.get("STOCKWATCHER_SHARD_BY", "symbol")
+LEASE_TTL_SECONDS = int(os.environ.get("STOCKWATCHER_LEASE_TTL", str(15 * 60)))
+LEASES_DB_PATH = os.environ.get("STOCKWATCHER_LEASES_DB", os.path.join(DATA_DIR, "leases.db"))
+
+# לוח המסחר: לא לסרוק סימולים שהשוק שלהם סגור (קריפטו נסרק תמיד), כמה דקות אחרי הסגירה
+# עוד לבדוק (מחיר הסגירה), וימי סגירה מיוחדים של NYSE שאי אפשר לחשב (YYYY-MM-DD מופרדים בפסיק)
+MARKET_HOURS = os.environ.get("STOCKWATCHER_MARKET_HOURS", "1") != "0"
+MARKET_CLOSE_GRACE_MINUTES = int(os.environ.get("STOCKWATCHER_MARKET_CLOSE_GRACE", "20"))
+MARKET_EXTRA_HOLIDAYS = os.environ.get("STOCKWATCHER_MARKET_EXTRA_HOLIDAYS", "")
+
+# סריקה אדפטיבית במצב daemon: כל סימול נבדק לפי המרחק מהסף הקרוב ולפי התנודתיות שלו -
+# קרוב לסף = כל סריקה, רחוק = לכל היותר כל ADAPTIVE_MAX_INTERVAL שניות.
+# SAFETY מקטין את המרווח המשוער (זהירות), VOLATILITY היא התנודתיות היומית עד שנמדדת אחרת
+ADAPTIVE_SCAN = os.environ.get("STOCKWATCHER_ADAPTIVE", "1") != "0"
+ADAPTIVE_MAX_INTERVAL = int(os.environ.get("STOCKWATCHER_ADAPTIVE_MAX_INTERVAL", "900"))
+ADAPTIVE_SAFETY = float(os.environ.get("STOCKWATCHER_ADAPTIVE_SAFETY", "0.25"))
+ADAPTIVE_DEFAULT_VOLATILITY = float(os.environ.get("STOCKWATCHER_ADAPTIVE_VOLATILITY", "0.02"))
@@ -0,0 +1,203 @@
+# קובץ: sharding.py
+# חלוקת הסריקה בין כמה workers (תהליכים או jobs של GitHub Actions)
+#
+# כל worker מריץ shard אחד מתוך N: python scheduler.py --shard 2/4
+# - כלל שייך ל-shard לפי crc32 של הסימול (ברירת מחדל - כך גם משיכת המחירים מתחלקת) או של מזהה הכלל.
+# - כל shard נתפס ב-lease עם תפוגה לפני הסריקה, כך ששתי הרצות חופפות (cron + הרצה ידנית)
+#   לא סורקות את אותם כללים. worker שנפל משחרר את ה-shard כשה-lease פג.
+# - leases: טבלת SQLite (workers על אותה מכונה) או גיליון "Leases" (runners על מכונות שונות).
+
+import os
+import socket
+import sqlite3
+import time
+import uuid
+import zlib
+
+import gspread
+
+import settings
+from rule_index import RuleIndex
+
+class ShardSpec:
+    """shard מספר index (מ-0) מתוך count"""
+
+    def __init__(self, index=0, count=1, by='symbol'):
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f"Invalid shard {index}/{count}")
+        if by not in ('symbol', 'rule'):
+            raise ValueError(f"Unknown shard key: {by}")
+        self.index = index
+        self.count = count
+        self.by = by
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+    @property
+    def lease_name(self):
+        return f"shard-{self.index}-of-{self.count}"
+
+    def owns_symbol(self, symbol):
+        return self.count == 1 or zlib.crc32(symbol.encode("utf-8")) % self.count == self.index
+
+    def owns(self, rule):
+        if self.by == 'symbol':
+            return self.owns_symbol(rule.symbol)
+        return self.count == 1 or zlib.crc32(str(rule.key).encode("utf-8")) % self.count == self.index
+
+def parse_shard(text, by='symbol'):
+    """'2/4' -> ShardSpec(2, 4)"""
+    try:
+        index, count = (int(part) for part in str(text).split('/'))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N, got {text!r}")
+    return ShardSpec(index, count, by)
+
+class ShardedStore:
+    """
+    מאגר כללים שרואה רק את הכללים של ה-shard שלו.
+    האינדקס המסונן נבנה מחדש רק כשהאינדקס של המאגר עצמו התחלף (אחרי sync שמצא שינוי).
+    """
+
+    def __init__(self, store, shard):
+        self.store = store
+        self.shard = shard
+        self._source = None
+        self._index = RuleIndex()
+
+    @property
+    def index(self):
+        source = self.store.index
+        if source is not self._source:
+            self._source = source
+            if self.shard.count == 1:
+                self._index = source
+            else:
+                self._index = RuleIndex(rule for rule in source if self.shard.owns(rule))
+        return self._index
+
+    def __getattr__(self, name):
+        # sync / record_trigger / archive / flush וכל השאר - ישירות למאגר
+        return getattr(self.store, name)
+
+# ==========================================
+# Leases
+# ==========================================
+def worker_id():
+    """מזהה ה-worker הנוכחי (הרצת GitHub Actions אם יש, אחרת מחשב+תהליך)"""
+    run_id = os.environ.get("GITHUB_RUN_ID")
+    if run_id:
+        return f"gha-{run_id}-{os.environ.get('GITHUB_RUN_ATTEMPT', '1')}-{os.environ.get('GITHUB_JOB', '')}-{uuid.uuid4().hex[:6]}"
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+class LeaseManager:
+    """
+    ממשק leases.
+    acquire() תופס lease פנוי או שפג (או מאריך lease שכבר שלנו) ומחזיר True אם הוא שלנו.
+    """
+
+    def __init__(self, owner=None):
+        self.owner = owner or worker_id()
+        self.holder = None # מי מחזיק ב-lease אחרי acquire שנכשל
+
+    def acquire(self, name, ttl):
+        raise NotImplementedError
+
+    def release(self, name):
+        raise NotImplementedError
+
+class SQLiteLeaseManager(LeaseManager):
+    """leases בקובץ SQLite משותף - BEGIN IMMEDIATE הופך את הבדיקה והתפיסה לפעולה אטומית"""
+
+    def __init__(self, path=None, owner=None):
+        super().__init__(owner)
+        path = path or settings.LEASES_DB_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def acquire(self, name, ttl):
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            if row and row[0] != self.owner and row[1] > now:
+                self.holder = row[0]
+                return False
+            self._conn.execute("INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                               (name, self.owner, now + ttl))
+            return True
+        finally:
+            self._conn.execute("COMMIT")
+
+    def release(self, name):
+        self._conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, self.owner))
+
+class SheetLeaseManager(LeaseManager):
+    """
+    leases בגיליון "Leases" (name, owner, expires_at) באותו קובץ StockWatcherDB.
+    ל-Sheets אין compare-and-swap, אז התפיסה היא כתיבה, המתנה קצרה וקריאה חוזרת:
+    אם שני workers כתבו יחד, רק האחרון שכתב ימצא את עצמו בשורה.
+    """
+
+    HEADERS = ['name', 'owner', 'expires_at']
+
+    def __init__(self, get_sheet, owner=None, settle_seconds=2.0):
+        super().__init__(owner)
+        self.get_sheet = get_sheet
+        self.settle_seconds = settle_seconds
+        self._leases = None
+
+    def _worksheet(self):
+        if self._leases is None:
+            spreadsheet = self.get_sheet().spreadsheet
+            try:
+                self._leases = spreadsheet.worksheet("Leases")
+            except gspread.WorksheetNotFound:
+                self._leases = spreadsheet.add_worksheet("Leases", rows=100, cols=len(self.HEADERS))
+                self._leases.update([self.HEADERS], "A1")
+        return self._leases
+
+    def _find(self, leases, name):
+        """(מספר שורה, owner, expires_at) של ה-lease, או (None, None, 0)"""
+        for i, row in enumerate(leases.get_all_values()[1:], start=2):
+            if row and row[0] == name:
+                try:
+                    expires = float(row[2]) if len(row) > 2 and row[2] else 0.0
+                except ValueError:
+                    expires = 0.0
+                return i, (row[1] if len(row) > 1 else ''), expires
+        return None, None, 0.0
+
+    def acquire(self, name, ttl):
+        leases = self._worksheet()
+        row, owner, expires = self._find(leases, name)
+        if owner and owner != self.owner and expires > time.time():
+            self.holder = owner
+            return False
+        values = [[name, self.owner, f"{time.time() + ttl:.3f}"]]
+        if row is None:
+            leases.append_rows(values, value_input_option='RAW')
+        else:
+            leases.update(values, f"A{row}:C{row}", raw=True)
+        if owner == self.owner:
+            return True # הארכה של lease שכבר שלנו
+        time.sleep(self.settle_seconds)
+        _, owner, _ = self._find(leases, name)
+        self.holder = owner
+        return owner == self.owner
+
+    def release(self, name):
+        leases = self._worksheet()
+        row, owner, _ = self._find(leases, name)
+        if row is not None and owner == self.owner:
+            leases.update([[name, '', '0']], f"A{row}:C{row}", raw=True)
+
+def open_leases(kind=None, get_sheet=None):
+    """leases לפי מאגר הכללים: גיליון ל-sheet (runners שונים), SQLite מקומי ל-sqlite"""
+    kind = kind or settings.RULE_STORE
+    if kind == 'sheet':
+        return SheetLeaseManager(get_sheet)
+    return SQLiteLeaseManager()
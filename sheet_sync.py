@@ -0,0 +1,217 @@
+# קובץ: sheet_sync.py
+# עבודה מול גיליון ה-Rules: חיבור מתמשך, באפר כתיבה מרוכזת,
+# ומראה (mirror) מקומית של הכללים הפעילים - במקום get_all_records מלא בכל סריקה
+#
+# סנכרון המראה מושך רק את מה שצריך:
+# 1. בדיקת זמן העדכון האחרון של הקובץ (Drive metadata) - אם לא השתנה, אין קריאה בכלל.
+# 2. שורת הכותרות ועמודת הסטטוס בלבד, בבקשה אחת - כדי לדעת אילו שורות פעילות.
+# 3. טווחי השורות הפעילות בלבד (batch_get אחד). שורות Archived לא יורדות שוב.
+# טווח שהתוכן שלו (hash) לא השתנה מאז הסנכרון הקודם לא מקומפל מחדש.
+
+import hashlib
+import re
+import time
+
+import gspread
+from gspread.utils import rowcol_to_a1
+from oauth2client.service_account import ServiceAccountCredentials
+
+from rule_index import RuleIndex, compile_rule
+
+# פרטי החיבור לגיליון
+CREDENTIALS_FILE = "secrets.json"
+SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+
+# כל כמה זמן לחדש את האישור (טוקן גוגל תקף לשעה)
+TOKEN_REFRESH_SECONDS = 45 * 60
+
+# מיקומי ברירת מחדל של עמודות (אם אין כותרת מתאימה בגיליון)
+STATUS_COL = 8       # עמודה H
+LAST_ALERT_COL = 6   # עמודה F - created_at/last_alert
+
+# שורות ארכיון בודדות בין שורות פעילות - עדיף למשוך אותן מאשר לפצל לעוד טווח
+RANGE_GAP = 20
+# סנכרון מלא בכל מקרה אחרי פרק זמן זה (ליתר ביטחון)
+FULL_SYNC_SECONDS = 10 * 60
+
+class SheetSession:
+    """
+    חיבור מתמשך לגיליון עבור מצב daemon.
+    שומר את ה-client וה-credentials בין סריקות, ומתחבר מחדש לפני שהטוקן פג או אחרי שגיאה.
+    """
+
+    def __init__(self):
+        self.creds = None
+        self._sheet = None
+        self._connected_at = 0.0
+
+    def sheet(self):
+        if self._sheet is None or time.monotonic() - self._connected_at > TOKEN_REFRESH_SECONDS:
+            self._connect()
+        return self._sheet
+
+    def reset(self):
+        """סימון החיבור כלא תקף - הסריקה הבאה תתחבר מחדש"""
+        self._sheet = None
+
+    def _connect(self):
+        if self.creds is None:
+            self.creds = ServiceAccountCredentials.from_json_keyfile_name(CREDENTIALS_FILE, SCOPE)
+        client = gspread.authorize(self.creds)
+        self._sheet = client.open("StockWatcherDB").worksheet("Rules")
+        self._connected_at = time.monotonic()
+
+def _is_quota_error(e):
+    """האם השגיאה היא חריגה ממכסת ה-API של Sheets (429)"""
+    response = getattr(e, 'response', None)
+    if getattr(response, 'status_code', None) == 429:
+        return True
+    text = str(e)
+    return '429' in text or 'RATE_LIMIT_EXCEEDED' in text or 'Quota exceeded' in text
+
+class SheetWriteBuffer:
+    """
+    באפר כתיבה מאוחרת (write-behind) לגיליון.
+    אוסף את כל עדכוני התאים במהלך הסריקה וכותב אותם בסופה ב-batch_update אחד (או כמה).
+    כתיבה חוזרת לאותו תא דורסת את הקודמת, כך שנשלח רק הערך האחרון.
+    """
+
+    def __init__(self, sheet, batch_size=500, max_retries=5):
+        self.sheet = sheet
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self._cells = {}  # (row, col) -> value
+
+    def __len__(self):
+        return len(self._cells)
+
+    def set(self, row, col, value):
+        self._cells[(row, col)] = value
+
+    def flush(self):
+        """כתיבת כל העדכונים שנאספו. מחזיר את מספר התאים שנכתבו"""
+        if not self._cells:
+            return 0
+        data = [{'range': rowcol_to_a1(row, col), 'values': [[value]]}
+                for (row, col), value in sorted(self._cells.items())]
+        for start in range(0, len(data), self.batch_size):
+            self._write_with_retry(data[start:start + self.batch_size])
+        self._cells.clear()
+        return len(data)
+
+    def _write_with_retry(self, data):
+        # ניסיון חוזר של כל ה-batch עם המתנה מעריכית במקרה של חריגה ממכסה
+        for attempt in range(self.max_retries):
+            try:
+                # raw=False - כמו update_cell, כך שתאריכים מתפרשים כתאריכים
+                self.sheet.batch_update(data, raw=False)
+                return
+            except Exception as e:
+                if not _is_quota_error(e) or attempt == self.max_retries - 1:
+                    raise
+                delay = 2 ** attempt
+                print(f"⏳ Sheets quota hit, retrying batch of {len(data)} in {delay}s...")
+                time.sleep(delay)
+
+def column_letter(col):
+    return re.sub(r"\d", "", rowcol_to_a1(1, col))
+
+def _row_ranges(rows, gap=RANGE_GAP):
+    """איחוד מספרי שורות ממוינים לטווחים רציפים (start, end), עם סבילות לפערים קטנים"""
+    ranges = []
+    for row in rows:
+        if ranges and row - ranges[-1][1] <= gap + 1:
+            ranges[-1][1] = row
+        else:
+            ranges.append([row, row])
+    return [tuple(r) for r in ranges]
+
+def _digest(values):
+    return hashlib.blake2b(repr(values).encode("utf-8"), digest_size=16).digest()
+
+class RulesMirror:
+    """
+    עותק מקומי של הכללים הפעילים בגיליון, בצורה מקומפלת (RuleIndex).
+    sync() מחזיר True אם הנתונים השתנו מאז הסנכרון הקודם.
+    """
+
+    def __init__(self, full_sync_seconds=FULL_SYNC_SECONDS):
+        self.full_sync_seconds = full_sync_seconds
+        self.headers = []
+        self.index = RuleIndex()
+        self.active_rows = []       # מספרי השורות הפעילות בסנכרון האחרון
+        self._revision = None
+        self._synced_at = 0.0
+        self._blocks = {}           # (start, end) -> (digest, [CompiledRule])
+        self.reads = 0              # מספר קריאות ה-API שבוצעו (לצורך מעקב)
+
+    def column(self, name, default):
+        """מספר עמודה לפי כותרת, או ברירת המחדל"""
+        try:
+            return self.headers.index(name) + 1
+        except ValueError:
+            return default
+
+    def invalidate(self):
+        """הסנכרון הבא יקרא את הגיליון גם אם זמן העדכון לא השתנה (למשל אחרי כתיבה שלנו)"""
+        self._revision = None
+
+    def _fetch_revision(self, sheet):
+        try:
+            self.reads += 1
+            return sheet.spreadsheet.get_lastUpdateTime()
+        except Exception:
+            return None # אין מידע - מסנכרנים תמיד
+
+    def sync(self, sheet):
+        revision = self._fetch_revision(sheet)
+        fresh = time.monotonic() - self._synced_at < self.full_sync_seconds
+        if revision is not None and revision == self._revision and fresh:
+            return False
+
+        # כותרות + עמודת הסטטוס בקריאה אחת (מיקום הסטטוס לפי הכותרות מהסנכרון הקודם)
+        status_letter = column_letter(self.column('status', STATUS_COL))
+        self.reads += 1
+        header_range, status_range = sheet.batch_get(["1:1", f"{status_letter}2:{status_letter}"])
+        headers = [str(h) for h in (header_range[0] if header_range else [])]
+        if headers != self.headers:
+            # מבנה העמודות השתנה - קריאה חוזרת של הסטטוס לפי המיקום החדש
+            self.headers = headers
+            self._blocks = {}
+            status_letter = column_letter(self.column('status', STATUS_COL))
+            self.reads += 1
+            status_range = sheet.batch_get([f"{status_letter}2:{status_letter}"])[0]
+
+        active_rows = [i + 2 for i, cell in enumerate(status_range) if cell and str(cell[0]) == 'Active']
+        ranges = _row_ranges(active_rows)
+
+        blocks = {}
+        if ranges:
+            last_letter = column_letter(max(len(self.headers), 1))
+            self.reads += 1
+            values = sheet.batch_get([f"A{start}:{last_letter}{end}" for start, end in ranges],
+                                     value_render_option="UNFORMATTED_VALUE",
+                                     date_time_render_option="SERIAL_NUMBER")  # last_alert בלי תלות ב-locale
+            for (start, end), block in zip(ranges, values):
+                digest = _digest(block)
+                cached = self._blocks.get((start, end))
+                if cached and cached[0] == digest:
+                    blocks[(start, end)] = cached
+                    continue
+                rules = []
+                for offset, row in enumerate(block):
+                    record = dict(zip(self.headers, list(row) + [''] * (len(self.headers) - len(row))))
+                    rule = compile_rule(record, start + offset)
+                    if rule is not None:
+                        rules.append(rule)
+                blocks[(start, end)] = (digest, rules)
+
+        changed = blocks.keys() != self._blocks.keys() or any(
+            blocks[key][0] != self._blocks[key][0] for key in blocks)
+        self._blocks = blocks
+        self.active_rows = active_rows
+        if changed:
+            self.index = RuleIndex(rule for _, rules in blocks.values() for rule in rules)
+        self._revision = revision
+        self._synced_at = time.monotonic()
+        return changed
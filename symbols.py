@@ -0,0 +1,295 @@
+# קובץ: symbols.py
+# מאגר הסימולים: מטא-דאטה (בורסה, מטבע, סוג נכס), אינדקס קידומות להשלמה ולאימות, ומטמון שלילי
+#
+# היקום נשמר ב-SQLite (משותף ל-app.py ול-scheduler.py) ונטען לזיכרון כרשימות ממוינות - חיפוש
+# לפי קידומת של סימול או של מילה בשם החברה הוא bisect, בלי רשת. סימול שלא ביקום נבדק מול Yahoo
+# פעם אחת: אם הוא קיים הוא נוסף ליקום, ואם לא - נכנס למטמון השלילי עם תוקף שמתארך בכל כישלון,
+# כך שה-scheduler לא מנסה אותו שוב ושוב בכל סריקה.
+# הקובץ ב-.data: ב-cron של GitHub Actions (runner חדש בכל הרצה) הוא נשמר בין ההרצות ב-actions/cache
+# (.github/workflows/main.yml), כך שגם שם סימול שנכשל לא נבדק שוב עד שהתוקף שלו פג.
+# ריענון היקום מרשימות ה-NASDAQ Trader: python symbols.py --refresh
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+from bisect import bisect_left, insort
+from contextlib import closing, contextmanager
+
+import settings
+from yahoo_gateway import INTERACTIVE, get_gateway
+
+# סימול שתמיד קיים - יורד יחד עם הסימול הנבדק, כדי להבדיל בין "סימול לא קיים" ל"Yahoo לא זמין"
+REFERENCE_SYMBOL = "SPY"
+
+NASDAQ_LISTED_URL = "https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqlisted.txt"
+OTHER_LISTED_URL = "https://www.nasdaqtrader.com/dynamic/SymDir/otherlisted.txt"
+OTHER_EXCHANGES = {"A": "NYSE American", "N": "NYSE", "P": "NYSE Arca", "Z": "Cboe BZX", "V": "IEX"}
+
+# סימולים שתמיד מוכרים (גם בלי ריענון וגם בלי רשת): המדדים שבדשבורד וקריפטו נפוץ
+SEED_SYMBOLS = [
+    ("^GSPC", "S&P 500", "SNP", "USD", "INDEX"),
+    ("^NDX", "NASDAQ 100", "NIM", "USD", "INDEX"),
+    ("^VIX", "CBOE Volatility Index", "CBO", "USD", "INDEX"),
+    ("BTC-USD", "Bitcoin USD", "CCC", "USD", "CRYPTOCURRENCY"),
+    ("ETH-USD", "Ethereum USD", "CCC", "USD", "CRYPTOCURRENCY"),
+    ("SOL-USD", "Solana USD", "CCC", "USD", "CRYPTOCURRENCY"),
+    ("SPY", "SPDR S&P 500 ETF Trust", "NYSE Arca", "USD", "ETF"),
+    ("QQQ", "Invesco QQQ Trust", "NASDAQ", "USD", "ETF"),
+]
+
+FIELDS = ("symbol", "name", "exchange", "currency", "asset_type")
+
+def normalize(symbol):
+    return (symbol or "").strip().upper()
+
+class SymbolRegistry:
+    """
+    get(symbol) - המטא-דאטה של סימול מוכר (dict) או None; search(query) - השלמה לפי קידומת;
+    resolve(symbol) - כמו get, ואם הסימול לא מוכר בודק אותו מול Yahoo (ומעדכן את היקום / המטמון השלילי).
+    """
+
+    def __init__(self, path=None, negative_ttl=None, max_negative_ttl=None, lookup=None):
+        self.path = path or settings.SYMBOLS_DB_PATH
+        self.negative_ttl = negative_ttl or settings.SYMBOL_NEGATIVE_TTL
+        self.max_negative_ttl = max_negative_ttl or settings.SYMBOL_NEGATIVE_MAX_TTL
+        self.lookup = lookup or lookup_yahoo
+        self._lock = threading.Lock()
+        # (meta, symbols, words): symbol -> dict, סימולים ממוינים, (מילה בשם באותיות קטנות, symbol) ממוינים.
+        # לא משתנה במקום - add() בונה עותק ומחליף את כולו, כך שקורא בלי נעילה תמיד רואה אינדקס שלם
+        self._index = None
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._db() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS symbols (
+                symbol TEXT PRIMARY KEY, name TEXT NOT NULL DEFAULT '', exchange TEXT NOT NULL DEFAULT '',
+                currency TEXT NOT NULL DEFAULT '', asset_type TEXT NOT NULL DEFAULT '', updated_at REAL NOT NULL)""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS unresolvable (
+                symbol TEXT PRIMARY KEY, reason TEXT NOT NULL, failures INTEGER NOT NULL,
+                failed_at REAL NOT NULL, expires_at REAL NOT NULL)""")
+
+    @contextmanager
+    def _db(self):
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+            with conn:
+                yield conn
+
+    # ------------------------------------------
+    # היקום והאינדקס בזיכרון
+    # ------------------------------------------
+    def _loaded(self):
+        """האינדקס הנוכחי (נטען מהדיסק בקריאה הראשונה) - הקורא משתמש רק בעותק שקיבל"""
+        index = self._index
+        if index is not None:
+            return index
+        with self._lock:
+            if self._index is None:
+                with self._db() as conn:
+                    rows = conn.execute(f"SELECT {', '.join(FIELDS)} FROM symbols").fetchall()
+                meta = {row[0]: dict(zip(FIELDS, row)) for row in rows}
+                for row in SEED_SYMBOLS:
+                    meta.setdefault(row[0], dict(zip(FIELDS, row)))
+                words = sorted((word, symbol) for symbol, info in meta.items() for word in _name_words(info["name"]))
+                self._index = (meta, sorted(meta), words)
+            return self._index
+
+    def __len__(self):
+        return len(self._loaded()[0])
+
+    def get(self, symbol):
+        return self._loaded()[0].get(normalize(symbol))
+
+    def search(self, query, limit=8):
+        """
+        סימולים שמתחילים ב-query (התאמה מדויקת ראשונה), ואחריהם חברות שמילה בשמן מתחילה ב-query.
+        רשימת dict-ים, לכל היותר limit.
+        """
+        meta, symbols, words = self._loaded()
+        query = (query or "").strip()
+        if not query:
+            return []
+        prefix, found = query.upper(), []
+        for symbol in symbols[bisect_left(symbols, prefix):]:
+            if not symbol.startswith(prefix) or len(found) >= limit:
+                break
+            found.append(symbol)
+        word = query.lower()
+        position = bisect_left(words, (word, ""))
+        while len(found) < limit and position < len(words) and words[position][0].startswith(word):
+            symbol = words[position][1]
+            if symbol not in found:
+                found.append(symbol)
+            position += 1
+        return [meta[symbol] for symbol in found]
+
+    def add(self, records):
+        """הוספה/עדכון של סימולים ביקום (רשימת dict עם FIELDS) - גם בדיסק וגם באינדקס שבזיכרון"""
+        records = [{field: record.get(field) or "" for field in FIELDS} for record in records]
+        records = [dict(record, symbol=normalize(record["symbol"])) for record in records if record["symbol"]]
+        if not records:
+            return 0
+        now = time.time()
+        with self._db() as conn:
+            conn.executemany(
+                f"""INSERT INTO symbols ({', '.join(FIELDS)}, updated_at) VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(symbol) DO UPDATE SET name=excluded.name, exchange=excluded.exchange,
+                    currency=excluded.currency, asset_type=excluded.asset_type, updated_at=excluded.updated_at""",
+                [tuple(record[field] for field in FIELDS) + (now,) for record in records])
+        with self._lock:
+            # אינדקס שעוד לא נטען ייטען מהדיסק יחד עם הרשומות החדשות
+            if self._index is not None and len(records) > 100:
+                self._index = None # ריענון גדול - בנייה מחדש של האינדקס בקריאה הבאה
+            elif self._index is not None:
+                # עותק חדש של האינדקס, שמוחלף בבת אחת - קוראים באמצע ממשיכים עם הקודם
+                meta, symbols, words = self._index
+                meta, symbols, words = dict(meta), list(symbols), list(words)
+                for record in records:
+                    if record["symbol"] not in meta:
+                        insort(symbols, record["symbol"])
+                        for word in _name_words(record["name"]):
+                            insort(words, (word, record["symbol"]))
+                    meta[record["symbol"]] = record
+                self._index = (meta, symbols, words)
+        return len(records)
+
+    # ------------------------------------------
+    # מטמון שלילי
+    # ------------------------------------------
+    def unresolvable(self, symbols=None, now=None):
+        """{symbol: expires_at} של הסימולים שנכשלו ועדיין בתוקף (מתוך symbols, אם ניתן)"""
+        now = now or time.time()
+        with self._db() as conn:
+            rows = conn.execute("SELECT symbol, expires_at FROM unresolvable WHERE expires_at > ?", (now,)).fetchall()
+        blocked = dict(rows)
+        if symbols is not None:
+            blocked = {symbol: blocked[symbol] for symbol in symbols if symbol in blocked}
+        return blocked
+
+    def mark_unresolvable(self, symbols, reason="no data"):
+        """כל כישלון נוסף מכפיל את התוקף (negative_ttl, 2x, 4x... עד max_negative_ttl)"""
+        now = time.time()
+        with self._db() as conn:
+            for symbol in {normalize(s) for s in symbols}:
+                row = conn.execute("SELECT failures FROM unresolvable WHERE symbol=?", (symbol,)).fetchone()
+                failures = (row[0] if row else 0) + 1
+                ttl = min(self.negative_ttl * 2 ** (failures - 1), self.max_negative_ttl)
+                conn.execute("""INSERT OR REPLACE INTO unresolvable (symbol, reason, failures, failed_at, expires_at)
+                                VALUES (?, ?, ?, ?, ?)""", (symbol, reason, failures, now, now + ttl))
+
+    def mark_resolved(self, symbols):
+        """סימולים שהחזירו מחיר יוצאים מהמטמון השלילי (והספירה שלהם מתאפסת)"""
+        symbols = [normalize(s) for s in symbols]
+        if symbols:
+            with self._db() as conn:
+                conn.executemany("DELETE FROM unresolvable WHERE symbol=?", [(s,) for s in symbols])
+
+    # ------------------------------------------
+    # אימות
+    # ------------------------------------------
+    def resolve(self, symbol):
+        """
+        המטא-דאטה של הסימול, או None אם הוא לא קיים (מוכר כלא קיים, או ש-Yahoo לא החזיר עליו כלום).
+        זורק חריגה אם Yahoo לא זמין - אז אי אפשר לדעת.
+        """
+        symbol = normalize(symbol)
+        info = self.get(symbol)
+        if info is not None:
+            return info
+        if self.unresolvable([symbol]):
+            return None
+        info = self.lookup(symbol)
+        if info is None:
+            self.mark_unresolvable([symbol], "unknown symbol")
+            return None
+        self.add([info])
+        self.mark_resolved([symbol])
+        return self.get(symbol)
+
+def _name_words(name):
+    return {word for word in (name or "").lower().replace(",", " ").replace(".", " ").split() if len(word) > 1}
+
+def lookup_yahoo(symbol):
+    """
+    בדיקת סימול מול Yahoo: dict של מטא-דאטה אם יש לו נתונים, None אם אין.
+    הסימול יורד יחד עם REFERENCE_SYMBOL בבקשה אחת; אם גם הוא ריק - Yahoo לא זמין וזורקים חריגה.
+    """
+    gateway = get_gateway()
+    data = gateway.download([symbol, REFERENCE_SYMBOL], priority=INTERACTIVE, period='5d', interval='1d',
+                            group_by='ticker', progress=False, threads=True)
+
+    def has_rows(name):
+        try:
+            return data is not None and not data.empty and data[name]['Close'].notna().any()
+        except KeyError:
+            return False
+
+    if not has_rows(REFERENCE_SYMBOL):
+        raise ConnectionError("Yahoo Finance is not reachable")
+    if symbol != REFERENCE_SYMBOL and not has_rows(symbol):
+        return None
+
+    info = {"symbol": symbol}
+    try:
+        fast = gateway.info(symbol, priority=INTERACTIVE)
+        info.update(exchange=fast['exchange'], currency=fast['currency'], asset_type=fast['quoteType'])
+    except Exception:
+        pass # המטא-דאטה היא תוספת - הסימול עצמו כבר אומת
+    return info
+
+# ==========================================
+# ריענון היקום
+# ==========================================
+def _read_listing(url):
+    with urllib.request.urlopen(url, timeout=60) as response:
+        text = response.read().decode("utf-8", errors="replace")
+    lines = [line for line in text.splitlines() if line and not line.startswith("File Creation Time")]
+    header = lines[0].split("|")
+    return [dict(zip(header, line.split("|"))) for line in lines[1:]]
+
+def download_universe():
+    """מניות ו-ETF-ים בבורסות ארה"ב מרשימות ה-NASDAQ Trader (סימולים בפורמט של Yahoo: BRK.B -> BRK-B)"""
+    records = []
+    for row in _read_listing(NASDAQ_LISTED_URL):
+        if row.get("Test Issue") == "N":
+            records.append({"symbol": row["Symbol"].replace(".", "-"), "name": row["Security Name"],
+                            "exchange": "NASDAQ", "currency": "USD",
+                            "asset_type": "ETF" if row.get("ETF") == "Y" else "EQUITY"})
+    for row in _read_listing(OTHER_LISTED_URL):
+        if row.get("Test Issue") == "N":
+            records.append({"symbol": row["ACT Symbol"].replace(".", "-"), "name": row["Security Name"],
+                            "exchange": OTHER_EXCHANGES.get(row.get("Exchange"), row.get("Exchange", "")),
+                            "currency": "USD", "asset_type": "ETF" if row.get("ETF") == "Y" else "EQUITY"})
+    return records
+
+_default_registry = None
+_default_lock = threading.Lock()
+
+def get_symbol_registry():
+    """מאגר יחיד לכל התהליך"""
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = SymbolRegistry()
+    return _default_registry
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local symbol universe")
+    parser.add_argument("--refresh", action="store_true", help="download the US listings from NASDAQ Trader")
+    parser.add_argument("--search", help="print the symbols matching a prefix")
+    parser.add_argument("--clear-unresolvable", action="store_true", help="forget every symbol in the negative cache")
+    args = parser.parse_args()
+
+    registry = get_symbol_registry()
+    if args.refresh:
+        count = registry.add(download_universe())
+        print(f"📚 Stored {count} symbols in {registry.path}")
+    if args.clear_unresolvable:
+        registry.mark_resolved(registry.unresolvable())
+        print("🧹 Negative cache cleared.")
+    if args.search:
+        for info in registry.search(args.search, limit=20):
+            print(f"{info['symbol']:10} {info['exchange']:14} {info['currency']:4} {info['asset_type']:15} {info['name']}")
+    print(f"{len(registry)} symbols known, {len(registry.unresolvable())} unresolvable.")
@@ -0,0 +1,127 @@
+# קובץ: tests/test_backtest.py
+# הבדיקה ההיסטורית מול הסורק: אותם נרות, נר-נר דרך scheduler.evaluate_rules, צריכים לתת את אותן הפעלות
+
+import types
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import notifier
+import scheduler
+from backtest import _cooldown_hits, run_backtest, session_signals
+from rule_index import CompiledRule, RuleIndex
+
+COOLDOWN = 12 * 60 # שניות - בנרות של 5 דקות: ההפעלה הבאה מותרת רק 3 נרות אחרי
+
+DAY1_CLOSE = [100, 101, 99, 98, 102, 103, 97, 100]
+DAY2_CLOSE = [101, 104, 105, 96, 95, 103, 106, 100]
+DAY1_VOLUME = [1000] * 8
+DAY2_VOLUME = [500, 500, 3000, 500, 500, 500, 500, 500]
+
+def make_bars():
+    """שני ימי מסחר של נרות 5 דקות"""
+    day1 = pd.date_range("2026-03-02 14:30", periods=8, freq="5min")
+    day2 = pd.date_range("2026-03-03 14:30", periods=8, freq="5min")
+    close = np.array(DAY1_CLOSE + DAY2_CLOSE, dtype=float)
+    return pd.DataFrame({'Open': close, 'High': close, 'Low': close, 'Close': close,
+                         'Volume': np.array(DAY1_VOLUME + DAY2_VOLUME, dtype=float)}, index=day1.append(day2))
+
+def make_rules():
+    def rule(rule_id, min_price=None, max_price=None, one_time=False, change=None, volume=None):
+        return CompiledRule(None, 'AAA', min_price, max_price, one_time, rule_id=rule_id, change_pct=change, min_volume=volume)
+    return [
+        rule(1, min_price=98, one_time=True),                 # מסלול מהיר: נגיעה בדיוק בסף
+        rule(2, max_price=105, one_time=True),
+        rule(3, min_price=90, max_price=103, one_time=True),  # מסלול מהיר עם שני ספים
+        rule(4, min_price=99),                                # חוזר, עם cooldown
+        rule(5, max_price=103, volume=5000),                  # ווליום מינימלי חוסם את סף המחיר
+        rule(6, change=3),                                    # שינוי מול סגירת היום הקודם
+        rule(7, change=-4, one_time=True),
+        rule(8, volume=6000),                                 # ווליום בלבד
+        rule(9, min_price=97, volume=7000, one_time=True),
+        rule(10, max_price=104, change=4),                    # מחיר ושינוי באותו נר - הפעלה אחת
+    ]
+
+class ReplayStore:
+    """מאגר בזיכרון לסורק: כלל חד-פעמי שהופעל יוצא מהאינדקס"""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.index = RuleIndex(self.rules)
+
+    def record_trigger(self, rule, when):
+        pass
+
+    def archive(self, rule):
+        self.rules.remove(rule)
+        self.index = RuleIndex(self.rules)
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+        self.time = None
+
+    def record(self, rule, side, symbol, price, message=""):
+        self.events.append((rule.key, self.time, side, float(price)))
+
+def scan_bar_by_bar(bars, rules, tmp_path, monkeypatch):
+    """כל נר הוא סריקה של evaluate_rules, בשעון של הנר"""
+    clock = {'now': 0.0}
+    dispatcher = notifier.Dispatcher(None, log_path=str(tmp_path / "notifications.db"), cooldown=COOLDOWN)
+    recorder = Recorder()
+
+    class BarDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.utcfromtimestamp(clock['now'])
+
+    monkeypatch.setattr(notifier, "time", types.SimpleNamespace(time=lambda: clock['now']))
+    monkeypatch.setattr(scheduler, "datetime", BarDatetime)
+    monkeypatch.setattr(scheduler, "get_dispatcher", lambda: dispatcher)
+    monkeypatch.setattr(scheduler, "get_trigger_history", lambda: recorder)
+
+    store = ReplayStore(rules)
+    change, day_volume = session_signals(bars)
+    for i, (when, close) in enumerate(bars['Close'].items()):
+        clock['now'] = when.tz_localize('UTC').timestamp()
+        recorder.time = when
+        snapshot = pd.DataFrame({'price': [close], 'change_pct': [change[i]], 'volume': [day_volume[i]],
+                                 'volume_ratio': [np.nan]}, index=pd.Index(['AAA'], name='symbol'))
+        scheduler.evaluate_rules(store, {'AAA': close}, snapshot)
+    return sorted(recorder.events)
+
+def test_backtest_matches_scan_by_scan_evaluation(tmp_path, monkeypatch):
+    bars = make_bars()
+    _, events = run_backtest(make_rules(), {'AAA': bars}, cooldown=COOLDOWN)
+    replayed = sorted(zip(events['rule'], events['time'], events['side'], events['price'].astype(float)))
+
+    expected = scan_bar_by_bar(bars, make_rules(), tmp_path, monkeypatch)
+    assert replayed == expected
+    # כל סוגי הכללים באמת הופעלו בנתונים האלה
+    assert {rule for rule, _, _, _ in expected} == set(range(1, 11))
+
+def test_one_time_price_rules_fire_once_at_first_crossing():
+    bars = make_bars()
+    _, events = run_backtest(make_rules()[:3], {'AAA': bars})
+    fired = {rule: (time, side) for rule, time, side in zip(events['rule'], events['time'], events['side'])}
+    assert len(events) == 3
+    assert fired[1] == (bars.index[3], 'min')   # 98 <= 98
+    assert fired[2] == (bars.index[10], 'max')  # 105 >= 105
+    assert fired[3] == (bars.index[5], 'max')   # 103 לפני כל ירידה ל-90
+
+def test_session_signals_roll_over_at_day_boundary():
+    change, volume = session_signals(make_bars())
+    assert np.isnan(change[:8]).all() # אין סגירה של יום קודם
+    assert change[8] == pytest.approx(1.0)           # 101 מול סגירת היום הראשון (100)
+    assert change[11] == pytest.approx(-4.0)
+    assert volume[7] == 8000
+    assert volume[8] == 500           # הווליום המצטבר מתאפס ביום החדש
+    assert volume[10] == 4000
+
+def test_cooldown_hits_keeps_first_hit_of_each_window():
+    times = np.arange(10, dtype=np.int64) * 60
+    hits = np.array([0, 1, 2, 5, 6, 9])
+    assert _cooldown_hits(hits, times, 180).tolist() == [0, 5, 9]
+    assert _cooldown_hits(hits, times, 0).tolist() == hits.tolist()
@@ -0,0 +1,69 @@
+# קובץ: tests/test_history_store.py
+# הרחבת התקופה באותו אינטרוול: החלק הישן יורד, והנרות החדשים נשארים בתוצאה;
+# stale-while-revalidate ופינוי LRU של הקבצים בדיסק
+
+import os
+import time
+
+import pandas as pd
+
+from history_store import HistoryStore, period_start
+
+def fake_fetch(calls):
+    """נר יומי לכל יום בטווח [start, end) - כמו download_range, בלי רשת"""
+    def fetch(symbol, interval, start, end):
+        calls.append((start, end))
+        end = end or time.time()
+        index = pd.date_range(pd.Timestamp(start, unit='s').ceil('D'), pd.Timestamp(end, unit='s'), freq='D', tz='UTC')
+        index = index[index < pd.Timestamp(end, unit='s', tz='UTC')]
+        return pd.DataFrame({c: 1.0 for c in ['Open', 'High', 'Low', 'Close', 'Volume']}, index=index)
+    return fetch
+
+def test_widening_period_keeps_recent_bars(tmp_path):
+    calls = []
+    store = HistoryStore(root=str(tmp_path), fetch=fake_fetch(calls), fresh_seconds=3600)
+    short = store.get("NVDA", period='6mo')
+    wide = store.get("NVDA", period='1y')
+
+    assert len(calls) == 2 # רק החלק הישן ירד שוב
+    assert wide.index[-1] == short.index[-1]
+    assert wide.index[0] < short.index[0]
+    assert wide.index[0] >= pd.Timestamp(period_start('1y')[0], unit='s', tz='UTC')
+    assert len(wide) > len(short)
+    # קריאה חוזרת מחזירה את אותו הדבר
+    assert store.get("NVDA", period='1y').equals(wide)
+
+def _wait_for_refresh(store):
+    for _ in range(200):
+        if not store._refreshing:
+            return
+        time.sleep(0.01)
+
+def test_stale_bars_are_served_and_refreshed_in_background(tmp_path):
+    calls = []
+    store = HistoryStore(root=str(tmp_path), fetch=fake_fetch(calls), fresh_seconds=0)
+    first = store.get("NVDA", period='1mo')
+    checked_at = store._memory[("NVDA", '1d')][2]
+    stale = store.get("NVDA", period='1mo')
+
+    assert stale.equals(first) # הוחזר מיד, בלי לחכות להורדה
+    _wait_for_refresh(store)
+    assert len(calls) == 2 # הנרות החדשים ירדו ברקע
+    assert store._memory[("NVDA", '1d')][2] > checked_at
+
+    store.get("NVDA", period='1mo', stale_ok=False)
+    assert len(calls) == 3 # stale_ok=False מחכה להורדה
+
+def test_disk_is_trimmed_to_max_bytes_least_recently_read_first(tmp_path):
+    store = HistoryStore(root=str(tmp_path), fetch=fake_fetch([]), fresh_seconds=3600)
+    store.get("AAA", period='1y')
+    one_file = os.path.getsize(store._path("AAA", '1d'))
+    store.max_bytes = int(one_file * 2.5)
+    store.get("BBB", period='1y')
+    os.utime(store._path("AAA", '1d'), (1, 1)) # AAA נקרא הכי מזמן
+    store.get("CCC", period='1y')
+
+    assert not os.path.exists(store._path("AAA", '1d'))
+    assert not os.path.exists(store._path("AAA", '1d') + ".json")
+    assert os.path.exists(store._path("BBB", '1d'))
+    assert os.path.exists(store._path("CCC", '1d'))
@@ -0,0 +1,117 @@
+# קובץ: tests/test_journal.py
+# יומן המסחר: קריאה לפי offset מהלוג, טעינת תמונת מצב, איפוס כשהלוג קוצר, וסימני רווח/חשיפה בעסקאות short
+
+import json
+import os
+
+import pytest
+
+import journal
+from journal import Journal, trade_stats
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "journal.jsonl")
+
+def write_line(path, entry):
+    """שורה שנכתבת ע"י תהליך אחר"""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+
+def test_refresh_reads_only_new_lines(path):
+    first = Journal(path)
+    note_id = first.add_note("first note", symbol="aapl", tags="#Earnings")
+    assert first.offset == os.path.getsize(path)
+
+    other = Journal(path)
+    assert other.records[note_id]["symbol"] == "AAPL"
+    offset = other.offset
+
+    write_line(path, {"op": "put", "id": "x1", "kind": "note", "date": "2026-01-02", "text": "second"})
+    # שורה חלקית (בלי \n) עדיין נכתבת - לא נקראת ולא מזיזה את ה-offset מעבר לה
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"op": "put", "id": "x2"')
+    assert other.refresh() == 1
+    assert other.offset == offset + len(json.dumps({"op": "put", "id": "x1", "kind": "note", "date": "2026-01-02",
+                                                     "text": "second"})) + 1
+    assert "x2" not in other.records
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(', "kind": "note", "date": "2026-01-03", "text": "third"}\n')
+    assert other.refresh() == 1
+    assert other.refresh() == 0
+    assert other.offset == os.path.getsize(path)
+    assert other.search_ids(query="thi") == ["x2"]
+
+    write_line(path, {"op": "delete", "id": note_id})
+    other.refresh()
+    assert note_id not in other.records
+    assert other.symbols() == [] and other.tags() == []
+
+def test_snapshot_reload_skips_read_lines(path, monkeypatch):
+    monkeypatch.setattr(journal, "SNAPSHOT_EVERY", 2)
+    first = Journal(path)
+    ids = [first.add_note(f"note {n}", symbol="MSFT", tags=["swing"]) for n in range(3)]
+    assert os.path.exists(path + ".snapshot")
+
+    # שורה שנכתבה אחרי תמונת המצב נקראת מהלוג; השאר מגיעות מתמונת המצב עם האינדקסים
+    write_line(path, {"op": "put", "id": "late", "kind": "note", "date": "2026-02-01", "symbol": "TSLA", "text": "late"})
+    reads = []
+    original = Journal._apply
+    monkeypatch.setattr(Journal, "_apply", lambda self, entry: (reads.append(entry["id"]), original(self, entry)))
+    reloaded = Journal(path)
+    assert reads == [ids[2], "late"]
+    assert set(reloaded.records) == set(ids) | {"late"}
+    assert reloaded.symbols() == ["MSFT", "TSLA"]
+    assert set(reloaded.search_ids(tag="swing")) == set(ids)
+
+def test_truncated_log_resets(path, monkeypatch):
+    monkeypatch.setattr(journal, "SNAPSHOT_EVERY", 1)
+    first = Journal(path)
+    for n in range(3):
+        first.add_note(f"old {n}", symbol="AAPL")
+
+    # הלוג הוחלף בקצר יותר: גם הקורא הפתוח וגם תמונת המצב לא רלוונטיים
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"op": "put", "id": "new", "kind": "note", "date": "2026-03-01", "symbol": "NVDA",
+                            "text": "fresh"}) + "\n")
+    assert first.refresh() == 1
+    assert list(first.records) == ["new"]
+    assert first.symbols() == ["NVDA"]
+    assert first.offset == os.path.getsize(path)
+
+    reopened = Journal(path)
+    assert list(reopened.records) == ["new"]
+    assert reopened.search_ids(query="old") == []
+
+def test_trade_table_signs(path):
+    book = Journal(path)
+    long_win = book.add_trade("AAPL", "long", 10, 100, exit_price=110, opened="2026-01-02", closed="2026-01-05", fees=2)
+    short_win = book.add_trade("TSLA", "short", 5, 200, exit_price=180, opened="2026-01-02", closed="2026-01-06", fees=1)
+    short_loss = book.add_trade("NVDA", "short", 4, 50, exit_price=60, opened="2026-01-03", closed="2026-01-07")
+    short_open = book.add_trade("MSFT", "short", 3, 400, opened="2026-01-08")
+    long_open = book.add_trade("AMZN", "long", 2, 150, opened="2026-01-08")
+
+    table = book.trade_table()
+    assert table.loc[long_win, "pnl"] == pytest.approx(98.0)
+    assert table.loc[short_win, "pnl"] == pytest.approx(99.0)
+    assert table.loc[short_win, "return_pct"] == pytest.approx(10.0)
+    assert table.loc[short_loss, "pnl"] == pytest.approx(-40.0)
+    assert table.loc[short_loss, "return_pct"] == pytest.approx(-20.0)
+    # עסקה פתוחה: short נספר בחשיפה שלילית, long בחיובית; סגורות לא נספרות
+    assert table.loc[short_open, "exposure"] == pytest.approx(-1200.0)
+    assert table.loc[long_open, "exposure"] == pytest.approx(300.0)
+    assert table.loc[[long_win, short_win, short_loss], "exposure"].tolist() == [0.0, 0.0, 0.0]
+
+    stats = trade_stats(table)
+    assert stats["closed"] == 3 and stats["open"] == 2
+    assert stats["total_pnl"] == pytest.approx(157.0)
+    assert stats["gross_exposure"] == pytest.approx(1500.0)
+    assert stats["net_exposure"] == pytest.approx(-900.0)
+
+    # סגירת ה-short הפתוח מעדכנת את הטבלה (המטמון מתבטל)
+    book.close_trade(short_open, 390, closed="2026-01-09")
+    table = book.trade_table()
+    assert table.loc[short_open, "pnl"] == pytest.approx(30.0)
+    assert table.loc[short_open, "exposure"] == 0.0
+    assert trade_stats(table)["net_exposure"] == pytest.approx(300.0)
@@ -0,0 +1,82 @@
+# קובץ: tests/test_market_calendar.py
+# לוח NYSE מול הלוחות שפורסמו (2022-2027), שעות מסחר סביב מעבר לשעון קיץ, וה-rollover של מט"ח/חוזים
+
+from datetime import date, datetime, timezone
+
+import pytest
+
+import market_calendar
+from market_calendar import is_open, next_open, us_early_closes, us_holidays
+
+NYSE_HOLIDAYS = {
+    # 1/1/2022 בשבת - לא נצפה ב-31/12/2021; Juneteenth ו-25/12 בראשון - נצפים ביום ב'
+    2022: ["2022-01-17", "2022-02-21", "2022-04-15", "2022-05-30", "2022-06-20", "2022-07-04", "2022-09-05",
+           "2022-11-24", "2022-12-26"],
+    2023: ["2023-01-02", "2023-01-16", "2023-02-20", "2023-04-07", "2023-05-29", "2023-06-19", "2023-07-04",
+           "2023-09-04", "2023-11-23", "2023-12-25"],
+    2024: ["2024-01-01", "2024-01-15", "2024-02-19", "2024-03-29", "2024-05-27", "2024-06-19", "2024-07-04",
+           "2024-09-02", "2024-11-28", "2024-12-25"],
+    # 4/7/2026 בשבת - נצפה ב-3/7
+    2026: ["2026-01-01", "2026-01-19", "2026-02-16", "2026-04-03", "2026-05-25", "2026-06-19", "2026-07-03",
+           "2026-09-07", "2026-11-26", "2026-12-25"],
+    # Juneteenth ו-25/12 בשבת - נצפים ביום ו'; 4/7 בראשון - ביום ב'
+    2027: ["2027-01-01", "2027-01-18", "2027-02-15", "2027-03-26", "2027-05-31", "2027-06-18", "2027-07-05",
+           "2027-09-06", "2027-11-25", "2027-12-24"],
+}
+
+NYSE_EARLY_CLOSES = {
+    2022: ["2022-11-25"],                              # 3/7 בראשון, 24/12 בשבת
+    2023: ["2023-07-03", "2023-11-24"],
+    2024: ["2024-07-03", "2024-11-29", "2024-12-24"],
+    2026: ["2026-11-27", "2026-12-24"],                # 3/7 הוא החג עצמו
+    2027: ["2027-11-26"],                              # 24/12 הוא החג
+}
+
+@pytest.fixture(autouse=True)
+def plain_calendar(monkeypatch):
+    # הלוח הרשמי בלבד, בלי חגים נוספים מהסביבה
+    monkeypatch.setattr(market_calendar.settings, "MARKET_HOURS", True)
+    monkeypatch.setattr(market_calendar.settings, "MARKET_EXTRA_HOLIDAYS", "")
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+@pytest.mark.parametrize("year", sorted(NYSE_HOLIDAYS))
+def test_us_holidays_match_nyse(year):
+    assert sorted(us_holidays(year)) == [date.fromisoformat(day) for day in NYSE_HOLIDAYS[year]]
+
+@pytest.mark.parametrize("year", sorted(NYSE_EARLY_CLOSES))
+def test_us_early_closes_match_nyse(year):
+    assert sorted(us_early_closes(year)) == [date.fromisoformat(day) for day in NYSE_EARLY_CLOSES[year]]
+
+@pytest.mark.parametrize("symbol, now, expected", [
+    # 9:30 בניו יורק: 14:30 UTC בשעון חורף, 13:30 UTC אחרי המעבר לשעון קיץ (8/3/2026)
+    ("AAPL", utc(2026, 3, 6, 14, 0), utc(2026, 3, 6, 14, 30)),
+    ("AAPL", utc(2026, 3, 9, 13, 0), utc(2026, 3, 9, 13, 30)),
+    ("AAPL", utc(2026, 3, 9, 15, 0), utc(2026, 3, 9, 15, 0)),       # פתוח
+    # סוף שבוע וחג: 4/7/2026 בשבת נצפה ביום ו' 3/7, הפתיחה הבאה ביום ב'
+    ("AAPL", utc(2026, 7, 3, 15, 0), utc(2026, 7, 6, 13, 30)),
+    # 1/1/2022 בשבת: 31/12/2021 הוא יום מסחר רגיל
+    ("AAPL", utc(2021, 12, 31, 15, 0), utc(2021, 12, 31, 15, 0)),
+    # סגירה מוקדמת ב-13:00 (18:00 UTC בחורף) ביום שאחרי חג ההודיה
+    ("AAPL", utc(2026, 11, 27, 17, 59), utc(2026, 11, 27, 17, 59)),
+    ("AAPL", utc(2026, 11, 27, 18, 0), utc(2026, 11, 30, 14, 30)),
+    # מט"ח: פתיחה ביום א' ב-17:00 ניו יורק - 21:00 UTC ביום המעבר לשעון קיץ, 22:00 UTC ביום החזרה לחורף
+    ("EURUSD=X", utc(2026, 3, 8, 20, 0), utc(2026, 3, 8, 21, 0)),
+    ("EURUSD=X", utc(2026, 11, 1, 21, 30), utc(2026, 11, 1, 22, 0)),
+    ("GC=F", utc(2026, 11, 1, 22, 0), utc(2026, 11, 1, 22, 0)),     # בדיוק בפתיחה
+    # שישי 17:00 ניו יורק סוגר עד ראשון
+    ("EURUSD=X", utc(2026, 3, 13, 20, 59), utc(2026, 3, 13, 20, 59)),
+    ("EURUSD=X", utc(2026, 3, 13, 21, 0), utc(2026, 3, 15, 21, 0)),
+    # קריפטו ובורסות אחרות - תמיד פתוחים
+    ("BTC-USD", utc(2026, 3, 14, 12, 0), utc(2026, 3, 14, 12, 0)),
+    ("TEVA.TA", utc(2026, 3, 14, 12, 0), utc(2026, 3, 14, 12, 0)),
+])
+def test_next_open(symbol, now, expected):
+    assert next_open(symbol, now, grace=0) == expected
+    assert is_open(symbol, now, grace=0) == (expected == now)
+
+def test_close_grace_keeps_the_session_open():
+    after_close = utc(2026, 3, 9, 20, 10) # 16:10 בניו יורק
+    assert is_open("AAPL", after_close, grace=20)
+    assert not is_open("AAPL", after_close, grace=5)
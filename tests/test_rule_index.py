@@ -0,0 +1,104 @@
+# קובץ: tests/test_rule_index.py
+# last_alert מהגיליון: אותו זמן בדיוק בגיליון עם locale של יום/חודש ושל חודש/יום;
+# האינדקס הממוין (bisect) מול הבדיקה המקורית שעברה על כל השורות
+
+from datetime import datetime
+
+import pytest
+
+from rule_index import RuleIndex, parse_alert_time
+from sheet_sync import RulesMirror
+
+HEADERS = ['symbol', 'min_price', 'max_price', 'is_one_time', 'phone', 'created_at', 'status', 'last_alert', 'rule_id']
+LAST_ALERT = datetime(2026, 10, 5, 14, 30)
+# 5/10/2026 14:30 כמספר סידורי של Sheets (ימים מ-30/12/1899)
+LAST_ALERT_SERIAL = (LAST_ALERT - datetime(1899, 12, 30)).total_seconds() / 86400
+
+class LocaleSheet:
+    """גיליון שמחזיר את תא התאריך כמו Sheets: מספר ל-SERIAL_NUMBER, מחרוזת ב-locale ל-FORMATTED_STRING"""
+
+    def __init__(self, date_format):
+        self.date_format = date_format
+        self.spreadsheet = self
+
+    def get_lastUpdateTime(self):
+        return None
+
+    def batch_get(self, ranges, value_render_option=None, date_time_render_option=None):
+        if ranges[0] == "1:1":
+            return [[HEADERS], [['Active']]]
+        if not ranges[0].startswith("A"):
+            return [[['Active']]] # עמודת הסטטוס
+        if date_time_render_option == "SERIAL_NUMBER":
+            last_alert = LAST_ALERT_SERIAL
+        else:
+            last_alert = LAST_ALERT.strftime(self.date_format)
+        return [[['AAPL', 100, '', 'FALSE', '', '', 'Active', last_alert, 1]]]
+
+@pytest.mark.parametrize("date_format", ['%d/%m/%Y %H:%M:%S', '%m/%d/%Y %H:%M:%S'])
+def test_last_alert_does_not_depend_on_sheet_locale(date_format):
+    mirror = RulesMirror()
+    mirror.sync(LocaleSheet(date_format))
+    (rule,) = list(mirror.index)
+    assert rule.last_alert == pytest.approx(LAST_ALERT.timestamp())
+
+@pytest.mark.parametrize("text", ['18/10/2026 14:30:00', '05/10/2026 14:30:00'])
+def test_locale_formatted_strings_are_not_guessed(text):
+    # 18/10 לא היה מזוהה, ו-05/10 היה מפוענח כ-10 במאי - עדיף None מתאריך שגוי
+    assert parse_alert_time(text) is None
+
+def test_written_format_and_serial_number():
+    assert parse_alert_time('2026-10-05 14:30:00') == LAST_ALERT.timestamp()
+    assert parse_alert_time(LAST_ALERT_SERIAL) == LAST_ALERT.timestamp()
+
+# ------------------------------------------
+# RuleIndex.triggered מול הבדיקה שורה-שורה
+# ------------------------------------------
+def record(symbol, min_price='', max_price='', status='Active'):
+    return {'symbol': symbol, 'min_price': min_price, 'max_price': max_price, 'is_one_time': 'FALSE',
+            'status': status, 'rule_id': ''}
+
+RECORDS = [
+    record('AAPL', min_price=100),
+    record('AAPL', min_price=100),             # סף זהה לכלל אחר
+    record('AAPL', min_price=95.5),
+    record('AAPL', max_price=120),             # רק סף עליון
+    record('AAPL', max_price='110'),           # מספר כמחרוזת
+    record('AAPL', min_price=105, max_price=115),
+    record('AAPL', min_price=108, max_price=108),
+    record('AAPL', min_price=112, max_price=104), # ספים הפוכים - שניהם יכולים להתקיים יחד
+    record('AAPL', min_price=200, status='Archived'),
+    record(' msft ', min_price=300),
+]
+
+def linear_triggered(records, symbol, price):
+    """הלוגיקה המקורית: if min ... elif max, על כל שורה פעילה"""
+    hits = set()
+    for i, row in enumerate(records):
+        if str(row.get('status')) != 'Active' or str(row.get('symbol')).strip().upper() != symbol:
+            continue
+        min_p, max_p = row.get('min_price'), row.get('max_price')
+        if min_p and price <= float(min_p):
+            hits.add((i + 2, 'min'))
+        elif max_p and price >= float(max_p):
+            hits.add((i + 2, 'max'))
+    return hits
+
+THRESHOLDS = sorted({float(value) for row in RECORDS for value in (row['min_price'], row['max_price']) if value != ''})
+# כל סף בדיוק (שוויון ב-<= / >=), קצת מתחת וקצת מעל, ומחירים מחוץ לכל הטווחים
+PRICES = sorted({price for value in THRESHOLDS for price in (value - 0.01, value, value + 0.01)} | {0.5, 50.0, 1000.0})
+
+@pytest.mark.parametrize("price", PRICES)
+def test_index_matches_linear_scan(price):
+    index = RuleIndex.from_records(RECORDS)
+    for symbol in ('AAPL', 'MSFT', 'NVDA'):
+        hits = index.triggered(symbol, price)
+        assert len(hits) == len({(rule.row, side) for rule, side in hits}) # אף כלל לא מדווח פעמיים
+        assert {(rule.row, side) for rule, side in hits} == linear_triggered(RECORDS, symbol, price)
+
+def test_boundary_prices_trigger():
+    index = RuleIndex.from_records(RECORDS)
+    assert {(rule.row, side) for rule, side in index.triggered('AAPL', 100.0)} >= {(2, 'min'), (3, 'min')}
+    assert (5, 'max') in {(rule.row, side) for rule, side in index.triggered('AAPL', 120.0)}
+    # בשוויון לשני הספים - הסף התחתון בלבד, כמו ה-elif המקורי
+    assert [(rule.row, side) for rule, side in index.triggered('AAPL', 108.0) if rule.row == 8] == [(8, 'min')]
@@ -0,0 +1,41 @@
+# קובץ: tests/test_rule_store.py
+# חלוקת מזהים בגיליון: שני סשנים של הדשבורד (אותו store, אותו owner של lease) לא מקבלים אותו rule_id
+
+import threading
+import time
+
+from rule_store import SheetRuleStore
+from sharding import SQLiteLeaseManager
+
+HEADERS = ['symbol', 'min_price', 'max_price', 'is_one_time', 'phone', 'created_at', 'status', 'last_alert', 'rule_id']
+
+class FakeSheet:
+    """גיליון Rules בזיכרון, עם השהיה בין קריאת המזהים לכתיבה - כדי שמרוץ יתגלה"""
+
+    col_count = len(HEADERS)
+
+    def __init__(self):
+        self.rows = [list(HEADERS)]
+
+    def row_values(self, row):
+        return self.rows[row - 1]
+
+    def batch_get(self, ranges, **kwargs):
+        time.sleep(0.05)
+        return [[[row[-1]] if row[-1] != '' else [] for row in self.rows[1:]]]
+
+    def append_row(self, values, **kwargs):
+        time.sleep(0.05)
+        self.rows.append(values)
+
+def test_concurrent_add_rule_gets_distinct_ids(tmp_path):
+    sheet = FakeSheet()
+    store = SheetRuleStore(lambda: sheet, leases=SQLiteLeaseManager(str(tmp_path / "leases.db")))
+    threads = [threading.Thread(target=store.add_rule, args=("AAPL",), kwargs={'min_price': i}) for i in range(1, 5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    ids = [row[-1] for row in sheet.rows[1:]]
+    assert sorted(ids) == [1, 2, 3, 4]
@@ -0,0 +1,164 @@
+# קובץ: tests/test_yahoo_gateway.py
+# השער ל-Yahoo עם פונקציה מדומה: איחוד בקשות זהות, קידום עדיפות בתור, והחזרה לתור אחרי 429
+
+import logging
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import settings
+import yahoo_gateway
+from yahoo_gateway import BACKGROUND, CHART, SCHEDULER, YahooGateway
+
+@pytest.fixture
+def make_gateway(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "YAHOO_BACKOFF_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "YAHOO_BACKOFF_MAX_SECONDS", 0.2)
+    gateways = []
+
+    def make(workers=2, max_retries=3):
+        gateway = YahooGateway(rate=100, burst=100, workers=workers, max_retries=max_retries,
+                               backoff_path=str(tmp_path / "yahoo_backoff"))
+        gateways.append(gateway)
+        return gateway
+
+    yield make
+    # ה-handler של כל שער נשאר על הלוגר של yfinance - מסירים כדי שלא ידווח לשערים של בדיקות אחרות
+    logger = logging.getLogger("yfinance")
+    for handler in list(logger.handlers):
+        if isinstance(handler, yahoo_gateway._RateLimitLog) and handler.gateway in gateways:
+            logger.removeHandler(handler)
+
+def in_thread(target, *args, **kwargs):
+    results = {}
+
+    def run():
+        try:
+            results["value"] = target(*args, **kwargs)
+        except Exception as e:
+            results["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, results
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_identical_calls_are_coalesced(make_gateway):
+    gateway = make_gateway()
+    release = threading.Event()
+    calls = []
+
+    def fetch(symbol):
+        calls.append(symbol)
+        release.wait(5)
+        return pd.DataFrame({"Close": [1.0, 2.0]})
+
+    key = ("download", "NVDA")
+    threads = [in_thread(gateway.call, key, fetch, "NVDA") for _ in range(3)]
+    wait_for(lambda: gateway.stats["calls"] == 3)
+    release.set()
+    for thread, _ in threads:
+        thread.join(5)
+
+    frames = [results["value"] for _, results in threads]
+    assert calls == ["NVDA"]
+    assert gateway.stats["coalesced"] == 2 and gateway.stats["requests"] == 1
+    assert all(frame.equals(frames[0]) for frame in frames)
+    # כל ממתין מקבל עותק משלו
+    frames[0].loc[0, "Close"] = 99.0
+    assert frames[1].loc[0, "Close"] == 1.0
+
+    # אחרי שהבקשה הסתיימה, אותו מפתח שולח בקשה חדשה
+    assert gateway.call(key, fetch, "NVDA").equals(frames[1])
+    assert calls == ["NVDA", "NVDA"]
+
+def test_coalesced_call_promotes_queued_job(make_gateway):
+    gateway = make_gateway(workers=1)
+    release = threading.Event()
+    order = []
+
+    def fetch(name):
+        order.append(name)
+        if name == "busy":
+            release.wait(5)
+        return name
+
+    # worker יחיד תפוס - כל השאר ממתינים בתור
+    busy, _ = in_thread(gateway.call, "busy", fetch, "busy", priority=SCHEDULER)
+    wait_for(lambda: order == ["busy"])
+    refresh, refresh_results = in_thread(gateway.call, "refresh", fetch, "refresh", priority=BACKGROUND)
+    chart, _ = in_thread(gateway.call, "chart", fetch, "chart", priority=CHART)
+    wait_for(lambda: gateway.stats["calls"] == 3)
+    # ה-scheduler מבקש את מה שהיה רענון ברקע - הבקשה עוקפת את הגרף
+    urgent, urgent_results = in_thread(gateway.call, "refresh", fetch, "refresh", priority=SCHEDULER)
+    wait_for(lambda: gateway.stats["calls"] == 4)
+    release.set()
+    for thread in (busy, refresh, chart, urgent):
+        thread.join(5)
+
+    assert order == ["busy", "refresh", "chart"]
+    assert refresh_results["value"] == urgent_results["value"] == "refresh"
+    assert gateway.stats["requests"] == 3
+
+def test_rate_limited_call_is_requeued(make_gateway, tmp_path):
+    gateway = make_gateway()
+    attempts = []
+
+    def fetch():
+        attempts.append(time.time())
+        if len(attempts) == 1:
+            raise Exception("429 Client Error: Too Many Requests")
+        return 42.0
+
+    assert gateway.call("price", fetch) == 42.0
+    assert len(attempts) == 2
+    assert gateway.stats["throttled"] == 1 and gateway.stats["retries"] == 1
+    # הניסיון החוזר יצא רק אחרי ההמתנה, וזמן סוף ההמתנה נכתב לקובץ המשותף
+    assert attempts[1] - attempts[0] >= 0.04
+    assert float((tmp_path / "yahoo_backoff").read_text()) == pytest.approx(attempts[0] + 0.05, abs=0.05)
+    # הצלחה אחרי 429 מאפסת את ההמתנה המעריכית
+    assert gateway._backoff == 0.0
+
+def test_logged_rate_limit_with_empty_frame_is_requeued(make_gateway):
+    # yf.download רק כותב את ה-429 ללוג ומחזיר טבלה ריקה
+    gateway = make_gateway()
+    attempts = []
+
+    def download():
+        attempts.append(1)
+        if len(attempts) == 1:
+            logging.getLogger("yfinance").error("1 Failed download: YFRateLimitError('Rate limited. Try after a while.')")
+            return pd.DataFrame()
+        return pd.DataFrame({"Close": [5.0]})
+
+    assert gateway.call("bars", download)["Close"].tolist() == [5.0]
+    assert len(attempts) == 2 and gateway.stats["retries"] == 1
+
+def test_gives_up_after_max_retries(make_gateway):
+    gateway = make_gateway(max_retries=2)
+    attempts = []
+
+    def fetch():
+        attempts.append(1)
+        raise Exception("YFRateLimitError: Too Many Requests. Rate limited.")
+
+    with pytest.raises(Exception, match="Too Many Requests"):
+        gateway.call("price", fetch, wait=5)
+    assert len(attempts) == 3
+    assert gateway.stats["retries"] == 2
+    # ההמתנה הוכפלה בכל חסימה, עד התקרה
+    assert gateway._backoff == pytest.approx(0.2)
+
+def test_other_process_backoff_pauses_requests(make_gateway, tmp_path):
+    gateway = make_gateway()
+    (tmp_path / "yahoo_backoff").write_text(str(time.time() + 0.2))
+    started = time.time()
+    assert gateway.call("price", lambda: 1.0) == 1.0
+    assert time.time() - started >= 0.15
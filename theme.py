@@ -0,0 +1,300 @@
+# קובץ: theme.py
+# בניית ה-assets הסטטיים של הממשק: גיליון עיצוב מוקטן ותמונות מוקטנות בתיקיית static/
+#
+# Streamlit מגיש את static/ (שליד app.py) בכתובת app/static כש-enableStaticServing דלוק
+# (.streamlit/config.toml). הבנייה רצה פעם אחת לתהליך ומדלגת על קבצים שלא השתנו;
+# כל כתובת מקבלת ?v=<hash> של התוכן, כך שהדפדפן שומר אותה במטמון ומוריד מחדש רק אחרי שינוי.
+# הגופנים מוגשים מ-assets/fonts: אם התיקייה חסרה, הבנייה הראשונה מורידה אותם לשם (במכונה עם רשת;
+# ידנית: python theme.py --fetch-fonts), ואם גם זה נכשל - הגיליון טוען אותם מ-Google Fonts כמו קודם,
+# כדי שהממשק לא יעבור בשקט לגופני המערכת.
+
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import urllib.request
+
+import settings
+
+ASSETS_DIR = os.path.join(settings.BASE_DIR, "assets")
+FONTS_DIR = os.path.join(ASSETS_DIR, "fonts")
+SOURCE_CSS = os.path.join(ASSETS_DIR, "theme.css")
+STATIC_DIR = os.path.join(settings.BASE_DIR, "static")
+STATIC_URL = "app/static"
+STYLESHEET = "theme.min.css"
+
+FONTS_URL = ("https://fonts.googleapis.com/css2?family=Inter:wght@400;600;900"
+             "&family=JetBrains+Mono:wght@400;700&family=Permanent+Marker&display=swap")
+# Google מחזיר woff2 רק לדפדפן שמציג את עצמו כמודרני
+# הורדה אוטומטית בבנייה חוסמת את טעינת העמוד הראשונה - זמן קצר, ואם נכשלה לא מנסים שוב באותו תהליך
+FETCH_TIMEOUT = 5
+FONTS_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+# שם -> (קובץ מקור ב-assets, קובץ יעד ב-static, רוחב מקסימלי בפיקסלים, פורמט)
+# הרוחב הוא בערך פי 2 מגודל התצוגה (מסכי רטינה); תמונות בלי שקיפות נשמרות כ-JPEG
+IMAGES = {
+    "logo": ("logo_light_bg.png", "logo.jpg", 600, "JPEG"),
+    "google_icon": ("google_icon.png", "google_icon.png", 48, "PNG"),
+    "background": ("dashboard_background.png.png", "dashboard_background.jpg", 1600, "JPEG"),
+}
+
+_manifest = None
+
+# ==========================================
+# הקטנת CSS
+# ==========================================
+def _split_top(text, sep):
+    """פיצול לפי sep מחוץ למחרוזות ולסוגריים (למשל url(data:...;base64))"""
+    parts, buf, depth, quote = [], [], 0, None
+    for ch in text:
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth = max(depth - 1, 0)
+        elif ch == sep and depth == 0:
+            parts.append("".join(buf))
+            buf = []
+            continue
+        buf.append(ch)
+    parts.append("".join(buf))
+    return parts
+
+def _squeeze(text, tokens):
+    text = re.sub(r"\s+", " ", text).strip()
+    return re.sub(r"\s*([" + re.escape(tokens) + r"])\s*", r"\1", text)
+
+def _parse_blocks(css):
+    """רשימת (prelude, body) ברמה העליונה. body=None למשפט כמו @import; סוגר סוגר יתום מושמט"""
+    blocks, i, n = [], 0, len(css)
+    while i < n:
+        open_at = css.find("{", i)
+        close_at = css.find("}", i)
+        semi_at = css.find(";", i)
+        if close_at != -1 and (open_at == -1 or close_at < open_at):
+            # סוגר בלי פותח (כמו ה-}} העודף שהיה אחרי .stMetricDelta) - דילוג עליו
+            head = css[i:close_at]
+            if head.strip().startswith("@") and semi_at != -1 and semi_at < close_at:
+                blocks.append((head[:head.index(";")].strip(), None))
+            i = close_at + 1
+            continue
+        if open_at == -1:
+            head = css[i:].strip()
+            if head.startswith("@"):
+                blocks.append((head.rstrip(";").strip(), None))
+            break
+        head = css[i:open_at]
+        if head.strip().startswith("@") and semi_at != -1 and semi_at < open_at:
+            blocks.append((css[i:semi_at].strip(), None))
+            i = semi_at + 1
+            continue
+        depth, j = 1, open_at + 1
+        while j < n and depth:
+            if css[j] == "{":
+                depth += 1
+            elif css[j] == "}":
+                depth -= 1
+            j += 1
+        blocks.append((head.strip(), css[open_at + 1:j - 1 if depth == 0 else j]))
+        i = j
+    return blocks
+
+def minify_css(css):
+    """
+    מסיר הערות ורווחים, משמיט סוגריים יתומים, ומוחק הצהרות כפולות: לכל (selector, property)
+    נשארת רק ההצהרה שהדפדפן היה מפעיל בכל מקרה (האחרונה, או האחרונה עם !important),
+    במקומה המקורי - כך שסדר ה-cascade מול כללים אחרים לא משתנה. כלל שהתרוקן נמחק.
+    @-rules (כמו @font-face ו-@media) נשארים כפי שהם, רק מוקטנים.
+    """
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    rules = []
+    for prelude, body in _parse_blocks(css):
+        if not prelude:
+            continue
+        if body is None or prelude.startswith("@"):
+            rules.append([prelude, body, None])
+            continue
+        declarations = []
+        for part in _split_top(body, ";"):
+            if ":" not in part:
+                continue
+            prop, value = part.split(":", 1)
+            prop = prop.strip().lower()
+            value = _squeeze(value, ",")
+            if prop and value:
+                declarations.append([prop, re.sub(r"\s*!\s*important$", "!important", value, flags=re.I)])
+        rules.append([_squeeze(prelude, ",>+~"), None, declarations])
+
+    # ההצהרה המנצחת לכל (selector, property)
+    winners = {}
+    for r, (selector, _, declarations) in enumerate(rules):
+        for d, (prop, value) in enumerate(declarations or ()):
+            key = (selector, prop)
+            important = value.endswith("!important")
+            if key not in winners or important or not winners[key][2]:
+                winners[key] = (r, d, important)
+
+    out = []
+    for r, (selector, body, declarations) in enumerate(rules):
+        if declarations is None:
+            if body is None:
+                out.append(re.sub(r"\s+", " ", selector) + ";")
+            else:
+                out.append(selector + "{" + _squeeze(body, "{};:,") + "}")
+            continue
+        kept = [f"{prop}:{value}" for d, (prop, value) in enumerate(declarations)
+                if winners[(selector, prop)][:2] == (r, d)]
+        if kept:
+            out.append(selector + "{" + ";".join(kept) + "}")
+
+    # כללים סמוכים עם אותו selector (אחרי שהכפילויות ביניהם נמחקו) מתאחדים לאחד
+    merged = []
+    for rule in out:
+        if merged and not rule.startswith("@") and rule.split("{", 1)[0] == merged[-1].split("{", 1)[0]:
+            merged[-1] = merged[-1][:-1] + ";" + rule.split("{", 1)[1]
+        else:
+            merged.append(rule)
+    return "".join(merged)
+
+# ==========================================
+# בנייה
+# ==========================================
+def _digest(data):
+    return hashlib.sha1(data).hexdigest()[:10]
+
+def _write_if_changed(path, data):
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path) # Streamlit אולי מגיש את הקובץ בדיוק עכשיו - בלי חצאי קבצים
+    return True
+
+def _is_fresh(target, source):
+    return os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source)
+
+def _build_image(source, target, max_width, fmt):
+    from PIL import Image # מגיע עם Streamlit
+
+    with Image.open(source) as img:
+        if img.width > max_width:
+            img = img.resize((max_width, round(img.height * max_width / img.width)), Image.LANCZOS)
+        if fmt == "JPEG":
+            img = img.convert("RGB")
+            options = {"quality": 82, "optimize": True, "progressive": True}
+        else:
+            options = {"optimize": True}
+        tmp = target + ".tmp"
+        img.save(tmp, fmt, **options)
+    os.replace(tmp, target)
+
+def _url(name, data):
+    return f"{STATIC_URL}/{name}?v={_digest(data)}"
+
+def build(force=False):
+    """
+    בונה את static/ ומחזיר manifest: {שם: כתובת עם ?v=}. השמות: "stylesheet" ושמות IMAGES.
+    קבצים שלא השתנו מאז הבנייה הקודמת לא נכתבים מחדש.
+    """
+    global _manifest
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    manifest = {}
+
+    for name, (source_name, target_name, max_width, fmt) in IMAGES.items():
+        source = os.path.join(ASSETS_DIR, source_name)
+        target = os.path.join(STATIC_DIR, target_name)
+        try:
+            if force or not _is_fresh(target, source):
+                _build_image(source, target, max_width, fmt)
+                print(f"🖼️ Built {target_name} ({os.path.getsize(source) // 1024}KB -> {os.path.getsize(target) // 1024}KB)")
+            with open(target, "rb") as f:
+                manifest[name] = _url(target_name, f.read())
+        except Exception as e:
+            print(f"⚠️ Could not build {target_name}: {e}")
+
+    with open(SOURCE_CSS, encoding="utf-8") as f:
+        css = f.read()
+    fonts_css = os.path.join(FONTS_DIR, "fonts.css")
+    if not os.path.exists(fonts_css):
+        try:
+            fetch_fonts(timeout=FETCH_TIMEOUT)
+        except Exception as e:
+            print(f"⚠️ Could not download the fonts to {FONTS_DIR} ({e}) - loading them from Google Fonts")
+    if os.path.exists(fonts_css):
+        # הגופנים המקומיים: fonts.css בראש הגיליון וקבצי ה-woff2 ל-static/fonts
+        with open(fonts_css, encoding="utf-8") as f:
+            css = f.read() + "\n" + css
+        os.makedirs(os.path.join(STATIC_DIR, "fonts"), exist_ok=True)
+        for font in os.listdir(FONTS_DIR):
+            target = os.path.join(STATIC_DIR, "fonts", font)
+            if font != "fonts.css" and (force or not _is_fresh(target, os.path.join(FONTS_DIR, font))):
+                shutil.copyfile(os.path.join(FONTS_DIR, font), target)
+    else:
+        css = f"@import url('{FONTS_URL}');\n" + css
+
+    # התמונות שהגיליון מפנה אליהן מקבלות את אותו ?v= כמו ב-manifest
+    for name, (_, target_name, _, _) in IMAGES.items():
+        if name in manifest:
+            css = css.replace(f"url('{target_name}')", f"url('{manifest[name].split('/')[-1]}')")
+
+    data = minify_css(css).encode("utf-8")
+    if _write_if_changed(os.path.join(STATIC_DIR, STYLESHEET), data):
+        print(f"🎨 Built {STYLESHEET} ({os.path.getsize(SOURCE_CSS)} -> {len(data)} bytes)")
+    manifest["stylesheet"] = _url(STYLESHEET, data)
+
+    _manifest = manifest
+    return manifest
+
+def static_url(name):
+    """כתובת ה-asset (בונה בקריאה הראשונה בתהליך); "" אם הבנייה שלו נכשלה"""
+    manifest = _manifest if _manifest is not None else build()
+    return manifest.get(name, "")
+
+def stylesheet_tag():
+    return f'<link rel="stylesheet" href="{static_url("stylesheet")}">'
+
+# ==========================================
+# הורדת הגופנים (פעם אחת, במכונה עם רשת)
+# ==========================================
+def fetch_fonts(url=FONTS_URL, timeout=30):
+    """מוריד את ה-woff2 של Google Fonts ל-assets/fonts וכותב fonts.css (אחרון) עם כתובות יחסיות"""
+    def get(address):
+        request = urllib.request.Request(address, headers={"User-Agent": FONTS_USER_AGENT})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.read()
+
+    os.makedirs(FONTS_DIR, exist_ok=True)
+    css = get(url).decode("utf-8")
+    files = {}
+    for remote in sorted(set(re.findall(r"url\((https://[^)]+)\)", css))):
+        data = get(remote)
+        name = _digest(remote.encode("utf-8")) + os.path.splitext(remote)[1]
+        with open(os.path.join(FONTS_DIR, name), "wb") as f:
+            f.write(data)
+        files[remote] = name
+    for remote, name in files.items():
+        css = css.replace(f"url({remote})", f"url('fonts/{name}')")
+    with open(os.path.join(FONTS_DIR, "fonts.css"), "w", encoding="utf-8") as f:
+        f.write(css)
+    print(f"🔤 Saved {len(files)} font files to {FONTS_DIR}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the static theme assets served by Streamlit")
+    parser.add_argument("--fetch-fonts", action="store_true", help="download the Google Fonts files into assets/fonts first")
+    parser.add_argument("--force", action="store_true", help="rebuild every file even if it looks up to date")
+    args = parser.parse_args()
+
+    if args.fetch_fonts:
+        fetch_fonts()
+    for name, url in build(force=args.force).items():
+        print(f"{name}: {url}")
@@ -0,0 +1,288 @@
+# קובץ: trigger_history.py
+# היסטוריית ההתראות שהופעלו: מה הופעל, באיזה מחיר, מול איזה סף ומתי
+#
+# ההתראות נאספות בזיכרון במהלך הסריקה ונכתבות בבת אחת (טרנזקציה אחת) ב-flush בסוף הסריקה.
+# הטבלה רק גדלה (append-only); seq עולה בכל שורה ומשמש כ-offset לקריאה מצטברת,
+# ואינדקסים לפי זמן ולפי סימול+זמן משרתים שאילתות טווח.
+# הדשבורד קורא דרך TriggerFeed: רק שורות עם seq גדול מהאחרון שנקרא, לתוך חלון קבוע בזיכרון.
+#
+# איפה ההיסטוריה נשמרת (לפי STOCKWATCHER_STORE):
+# - sheet: ה-flush מוסיף את השורות ללשונית "Triggers" בגיליון StockWatcherDB (append_rows אחד לסריקה),
+#   כי ב-cron כל הרצה היא runner חדש ו-.data לא נשמר. הקובץ המקומי הוא רק עותק לקריאה:
+#   pull() מעתיק אליו את השורות החדשות מהלשונית (קריאה אחת לכל TRIGGER_FEED_SECONDS לכל תהליך).
+# - sqlite: הכול בקובץ המקומי - כמו מאגר הכללים, זה עובד רק כשה-scheduler והדשבורד רצים על אותו שרת.
+# הצגה מהטרמינל: python trigger_history.py --symbol AAPL --since 2025-01-01
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import closing, contextmanager
+from datetime import datetime
+
+import gspread
+
+import settings
+from sheet_sync import SheetSession, column_letter
+
+Trigger = namedtuple("Trigger", ["seq", "triggered_at", "rule_id", "symbol", "side", "price", "threshold", "message"])
+
+COLUMNS = ", ".join(Trigger._fields)
+
+# לשונית ההיסטוריה בגיליון: כל השדות חוץ מ-seq, שנקבע בקובץ המקומי
+SHEET_TAB = "Triggers"
+SHEET_HEADERS = list(Trigger._fields[1:])
+
+def rule_threshold(rule, side):
+    """הסף של הכלל שהופעל: מחיר (min/max), אחוז שינוי (change) או ווליום (volume)"""
+    return {'min': rule.min_price, 'max': rule.max_price, 'change': rule.change_pct, 'volume': rule.min_volume}[side]
+
+def _epoch(value):
+    """epoch משניות / datetime / מחרוזת תאריך"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
+
+def _sheet_row(row):
+    """שורה מהלשונית (ערכים לא מעוצבים) -> tuple לטבלה המקומית, או None אם השורה לא תקינה"""
+    row = list(row) + [""] * (len(SHEET_HEADERS) - len(row))
+    triggered_at, rule_id, symbol, side, price, threshold, message = row[:len(SHEET_HEADERS)]
+    try:
+        return (float(triggered_at), str(rule_id), str(symbol), str(side),
+                None if price == "" else float(price), None if threshold == "" else float(threshold), str(message))
+    except (TypeError, ValueError):
+        return None
+
+class TriggerHistory:
+    """
+    record() בזמן הסריקה, flush() בסופה; since() / query() / recent() לקריאה.
+    get_sheet: worksheet של Rules (למשל SheetSession.sheet) - אם ניתן, ההיסטוריה נשמרת בלשונית Triggers
+    באותו קובץ, והקובץ המקומי מתעדכן ממנה ב-pull().
+    """
+
+    def __init__(self, path=None, get_sheet=None):
+        self.path = path or settings.TRIGGER_HISTORY_PATH
+        self.get_sheet = get_sheet
+        self._pending = []
+        self._lock = threading.Lock()
+        self._tab = None
+        self._tab_parent = None
+        self._pulled_at = None
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._db() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS triggers (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT, triggered_at REAL NOT NULL, rule_id TEXT NOT NULL,
+                symbol TEXT NOT NULL, side TEXT NOT NULL, price REAL, threshold REAL, message TEXT NOT NULL DEFAULT '')""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_triggers_time ON triggers(triggered_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_triggers_symbol ON triggers(symbol, triggered_at)")
+            # כמה שורות מהלשונית כבר הועתקו לקובץ (מצב sheet)
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    @contextmanager
+    def _db(self):
+        # חיבור קצר לכל פעולה - ה-scheduler כותב והדשבורד קורא מאותו קובץ
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+            with conn:
+                yield conn
+
+    # ------------------------------------------
+    # כתיבה
+    # ------------------------------------------
+    def record(self, rule, side, symbol, price, message="", when=None):
+        """התראה שהופעלה - נשמרת בזיכרון עד flush()"""
+        with self._lock:
+            self._pending.append((when or time.time(), str(rule.key), symbol, side,
+                                  None if price is None else float(price), rule_threshold(rule, side), message))
+
+    def flush(self):
+        """כתיבת כל ההתראות שנאספו בבת אחת (טרנזקציה אחת, או append_rows אחד ללשונית). מחזיר כמה נכתבו"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        try:
+            if self.get_sheet is None:
+                with self._db() as conn:
+                    self._insert(conn, pending)
+            else:
+                rows = [["" if value is None else value for value in row] for row in pending]
+                self._worksheet().append_rows(rows, value_input_option='RAW')
+        except Exception:
+            # שיחזרו בסריקה הבאה, לפני ההתראות החדשות
+            with self._lock:
+                self._pending[:0] = pending
+            raise
+        return len(pending)
+
+    def _insert(self, conn, rows):
+        conn.executemany("""INSERT INTO triggers (triggered_at, rule_id, symbol, side, price, threshold, message)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)""", rows)
+
+    # ------------------------------------------
+    # לשונית Triggers בגיליון
+    # ------------------------------------------
+    def _worksheet(self):
+        sheet = self.get_sheet()
+        # SheetSession מתחבר מחדש מדי פעם - הלשונית נלקחת מהחיבור הנוכחי
+        if self._tab is None or self._tab_parent is not sheet:
+            spreadsheet = sheet.spreadsheet
+            try:
+                self._tab = spreadsheet.worksheet(SHEET_TAB)
+            except gspread.WorksheetNotFound:
+                self._tab = spreadsheet.add_worksheet(SHEET_TAB, rows=1000, cols=len(SHEET_HEADERS))
+                self._tab.update([SHEET_HEADERS], "A1")
+            self._tab_parent = sheet
+        return self._tab
+
+    def pull(self, force=False):
+        """
+        מצב sheet: העתקת השורות שנוספו ללשונית מאז הפעם הקודמת אל הקובץ המקומי. מחזיר כמה הועתקו.
+        לכל היותר פעם ב-TRIGGER_FEED_SECONDS (force=True - מיד), כדי שכמה צופים לא ימצו את מכסת ה-API.
+        """
+        if self.get_sheet is None:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._pulled_at is not None and now - self._pulled_at < settings.TRIGGER_FEED_SECONDS:
+                return 0
+            self._pulled_at = now
+
+        offset = self._sheet_offset()
+        # שורה 1 היא הכותרות
+        rows = self._worksheet().get(f"A{offset + 2}:{column_letter(len(SHEET_HEADERS))}",
+                                     value_render_option="UNFORMATTED_VALUE")
+        if not rows:
+            return 0
+        records = [record for record in map(_sheet_row, rows) if record]
+        with self._db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if self._sheet_offset(conn) != offset:
+                return 0 # תהליך אחר (סשן אחר של הדשבורד, ה-CLI) כבר העתיק את השורות האלה
+            self._insert(conn, records)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('sheet_rows', ?)", (offset + len(rows),))
+        return len(records)
+
+    def _sheet_offset(self, conn=None):
+        if conn is None:
+            with self._db() as conn:
+                return self._sheet_offset(conn)
+        row = conn.execute("SELECT value FROM meta WHERE key = 'sheet_rows'").fetchone()
+        return row[0] if row else 0
+
+    # ------------------------------------------
+    # קריאה
+    # ------------------------------------------
+    def since(self, seq=0, limit=1000, newest=False):
+        """
+        השורות שנוספו אחרי seq (offset), מהישנה לחדשה.
+        newest=True: אם יש יותר מ-limit, ה-limit האחרונות (ולא הראשונות).
+        """
+        order = "DESC" if newest else "ASC"
+        with self._db() as conn:
+            rows = conn.execute(f"SELECT {COLUMNS} FROM triggers WHERE seq > ? ORDER BY seq {order} LIMIT ?",
+                                (seq, limit)).fetchall()
+        if newest:
+            rows.reverse()
+        return [Trigger(*row) for row in rows]
+
+    def recent(self, limit=50):
+        """limit השורות האחרונות, מהחדשה לישנה"""
+        with self._db() as conn:
+            rows = conn.execute(f"SELECT {COLUMNS} FROM triggers ORDER BY seq DESC LIMIT ?", (limit,)).fetchall()
+        return [Trigger(*row) for row in rows]
+
+    def query(self, start=None, end=None, symbol=None, limit=500):
+        """התראות בטווח זמנים [start, end) ואופציונלית לסימול אחד, מהחדשה לישנה"""
+        where, params = [], []
+        if symbol:
+            where.append("symbol = ?")
+            params.append(symbol.upper())
+        if start is not None:
+            where.append("triggered_at >= ?")
+            params.append(_epoch(start))
+        if end is not None:
+            where.append("triggered_at < ?")
+            params.append(_epoch(end))
+        sql = f"SELECT {COLUMNS} FROM triggers"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with self._db() as conn:
+            rows = conn.execute(sql + " ORDER BY triggered_at DESC LIMIT ?", params + [limit]).fetchall()
+        return [Trigger(*row) for row in rows]
+
+class TriggerFeed:
+    """
+    חלון של ההתראות האחרונות בזיכרון. poll() קורא מהמאגר רק את מה שנוסף מאז הקריאה הקודמת,
+    כך שרענון הפאנל לא טוען מחדש את כל ההיסטוריה.
+    """
+
+    def __init__(self, history, size=None):
+        self.history = history
+        self.items = deque(maxlen=size or settings.TRIGGER_FEED_SIZE)
+        self.last_seq = None
+        self._lock = threading.Lock()
+
+    def poll(self):
+        """מחזיר את ההתראות החדשות (מהישנה לחדשה) ומוסיף אותן לחלון"""
+        with self._lock:
+            try:
+                self.history.pull()
+            except Exception as e:
+                # הגיליון לא זמין - ממשיכים עם מה שכבר הועתק לקובץ המקומי
+                print(f"⚠️ Could not pull trigger history from the sheet: {e}")
+            # בקריאה הראשונה (last_seq=None) - רק החלון האחרון, לא כל ההיסטוריה
+            new = self.history.since(self.last_seq or 0, limit=self.items.maxlen, newest=True)
+            if new:
+                self.items.extend(new)
+                self.last_seq = new[-1].seq
+            return new
+
+    def latest(self):
+        """החלון הנוכחי, מהחדשה לישנה"""
+        with self._lock:
+            return list(reversed(self.items))
+
+_default_history = None
+_default_feed = None
+_default_lock = threading.Lock()
+
+def get_trigger_history():
+    """היסטוריה יחידה לכל התהליך"""
+    global _default_history
+    with _default_lock:
+        if _default_history is None:
+            # במצב sheet ההיסטוריה עוברת דרך הגיליון, כי ל-scheduler ב-cron ולדשבורד אין דיסק משותף
+            get_sheet = SheetSession().sheet if settings.RULE_STORE == 'sheet' else None
+            _default_history = TriggerHistory(get_sheet=get_sheet)
+    return _default_history
+
+def get_trigger_feed():
+    """חלון משותף לכל הצופים בדשבורד (כל התהליך) - קריאה אחת מהמאגר לכל רענון"""
+    global _default_feed
+    history = get_trigger_history()
+    with _default_lock:
+        if _default_feed is None:
+            _default_feed = TriggerFeed(history)
+    return _default_feed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show triggered alerts")
+    parser.add_argument("--symbol", help="only this symbol")
+    parser.add_argument("--since", help="from this date/time (ISO, e.g. 2025-01-01)")
+    parser.add_argument("--until", help="before this date/time (ISO)")
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    history = get_trigger_history()
+    history.pull(force=True)
+    for trigger in history.query(args.since, args.until, args.symbol, args.limit):
+        when = datetime.fromtimestamp(trigger.triggered_at).strftime('%Y-%m-%d %H:%M:%S')
+        price = "-" if trigger.price is None else f"{trigger.price:.2f}"
+        threshold = "-" if trigger.threshold is None else f"{trigger.threshold:g}"
+        print(f"{when}  {trigger.symbol:8} {trigger.side:6} price={price:<10} threshold={threshold:<12} rule={trigger.rule_id}")
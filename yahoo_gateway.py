@@ -0,0 +1,261 @@
+# קובץ: yahoo_gateway.py
+# שער יחיד לכל הבקשות ל-Yahoo Finance בתהליך (app.py, scheduler.py והמודולים שלהם)
+#
+# - single-flight: בקשות זהות שרצות במקביל (למשל כמה סשנים שפותחים גרף של NVDA) מתאחדות
+#   לקריאה אחת, וכל הממתינים מקבלים את אותה תוצאה (עותק).
+# - הגבלת קצב גלובלית (token bucket) עם עדיפויות: thread מתזמן אחד מוציא בכל פעם את הבקשה
+#   החשובה ביותר שממתינה - scheduler לפני טפסים, טפסים לפני גרפים, גרפים לפני רענון ברקע.
+# - מאגר threads חסום (YAHOO_WORKERS): לא יותר בקשות במקביל, גם כשיש עשרות סשנים.
+# - 429 / YFRateLimitError (גם כשyfinance רק כותב אותו ללוג ומחזיר טבלה ריקה): השער עוצר את
+#   כל הבקשות להמתנה מעריכית, והבקשה שנחסמה חוזרת לתור. זמן ההמתנה נכתב לקובץ קטן,
+#   כך שגם תהליכים אחרים (הדשבורד וה-scheduler) נעצרים יחד במקום להיחסם יחד.
+# ה-WebSocket של price_feed הוא חיבור מתמשך ולא בקשה, ולכן לא עובר כאן.
+
+import heapq
+import itertools
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pandas as pd
+import yfinance as yf
+
+import settings
+
+# מחלקות עדיפות (מספר נמוך = קודם)
+SCHEDULER = 0     # בדיקת התראות
+INTERACTIVE = 1   # משתמש מחכה: אימות סימול בטופס, מדדי השוק בראש הדשבורד
+CHART = 2         # היסטוריית נרות לגרפים
+BACKGROUND = 3    # רענון מטמון ברקע
+
+RATE_LIMIT_PATTERN = re.compile(r"YFRateLimitError|Too Many Requests|Rate limited|\b429\b", re.IGNORECASE)
+
+class _Job:
+    __slots__ = ("key", "func", "args", "kwargs", "future", "priority", "attempts", "started")
+
+    def __init__(self, key, func, args, kwargs, priority):
+        self.key, self.func, self.args, self.kwargs = key, func, args, kwargs
+        self.future = Future()
+        self.priority = priority
+        self.attempts = 0
+        self.started = False
+
+class TokenBucket:
+    """rate בקשות לשנייה, עד burst ברצף. delay() לא צורך אסימון - take() צורך"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        """כמה שניות עד שיש אסימון"""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+class _RateLimitLog(logging.Handler):
+    """yf.download לא זורק על 429 - הוא כותב את השגיאה ללוג של yfinance ומחזיר טבלה ריקה"""
+
+    def __init__(self, gateway):
+        super().__init__(logging.ERROR)
+        self.gateway = gateway
+
+    def emit(self, record):
+        try:
+            if RATE_LIMIT_PATTERN.search(record.getMessage()):
+                self.gateway.throttled()
+        except Exception:
+            pass
+
+class YahooGateway:
+    """call(key, func, ...) - הרצת func דרך השער; download / last_price / history / info לשימוש הקוד"""
+
+    def __init__(self, rate=None, burst=None, workers=None, max_retries=None, backoff_path=None):
+        self.bucket = TokenBucket(rate or settings.YAHOO_RATE, burst or settings.YAHOO_BURST)
+        self.workers = workers or settings.YAHOO_WORKERS
+        self.max_retries = settings.YAHOO_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_path = backoff_path or settings.YAHOO_BACKOFF_PATH
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="yahoo")
+        self._slots = threading.Semaphore(self.workers)
+        self._queue = []          # heap של (priority, seq, job)
+        self._seq = itertools.count()
+        self._inflight = {}       # key -> job
+        self._cond = threading.Condition()
+        self._backoff = 0.0       # ההמתנה הנוכחית אחרי 429 (שניות), 0 = אין חסימה
+        self._blocked_until = 0.0
+        self._throttles = 0       # מונה 429 - קריאה שבמהלכה הוא עלה נחשבת חסומה
+        self.stats = {"calls": 0, "coalesced": 0, "requests": 0, "throttled": 0, "retries": 0}
+        os.makedirs(os.path.dirname(os.path.abspath(self.backoff_path)), exist_ok=True)
+        logging.getLogger("yfinance").addHandler(_RateLimitLog(self))
+        threading.Thread(target=self._dispatch, name="yahoo-dispatch", daemon=True).start()
+
+    # ------------------------------------------
+    # קריאה
+    # ------------------------------------------
+    def call(self, key, func, *args, priority=CHART, wait=None, **kwargs):
+        """
+        func(*args, **kwargs) דרך התור. קריאה עם key שכבר בדרך מצטרפת אליה במקום לשלוח בקשה נוספת
+        (ואם העדיפות שלה גבוהה יותר - הבקשה מוקדמת בתור). DataFrame מוחזר כעותק לכל ממתין.
+        wait: כמה שניות לחכות לתוצאה לכל היותר (None = בלי הגבלה).
+        """
+        with self._cond:
+            self.stats["calls"] += 1
+            job = self._inflight.get(key)
+            if job is None:
+                job = _Job(key, func, args, kwargs, priority)
+                self._inflight[key] = job
+                self._push(job)
+            else:
+                self.stats["coalesced"] += 1
+                if priority < job.priority and not job.started:
+                    job.priority = priority
+                    self._push(job) # הרשומה הישנה בתור תדולג
+        result = job.future.result(wait)
+        return result.copy() if isinstance(result, pd.DataFrame) else result
+
+    def _push(self, job):
+        heapq.heappush(self._queue, (job.priority, next(self._seq), job))
+        self._cond.notify()
+
+    def _pop(self):
+        """הבקשה הבאה שעוד לא התחילה (רשומות כפולות אחרי קידום מדולגות)"""
+        while self._queue:
+            priority, _, job = heapq.heappop(self._queue)
+            if not job.started and priority == job.priority:
+                return job
+        return None
+
+    # ------------------------------------------
+    # תזמון
+    # ------------------------------------------
+    def _wait_time(self):
+        """כמה לחכות לפני הבקשה הבאה: המתנה אחרי 429 (גם מתהליך אחר) או אסימון"""
+        now = time.time()
+        blocked_until = max(self._blocked_until, self._shared_block())
+        if blocked_until > now:
+            return blocked_until - now
+        return self.bucket.delay()
+
+    def _dispatch(self):
+        while True:
+            self._slots.acquire()
+            with self._cond:
+                while True:
+                    if not any(not job.started for _, _, job in self._queue):
+                        self._queue.clear()
+                        self._cond.wait()
+                        continue
+                    delay = self._wait_time()
+                    if delay <= 0:
+                        break
+                    # בקשה חשובה יותר שתגיע בזמן ההמתנה תצא ראשונה
+                    self._cond.wait(min(delay, 1.0))
+                job = self._pop()
+                job.started = True
+                self.bucket.take()
+                self.stats["requests"] += 1
+            self._pool.submit(self._run, job)
+
+    def _run(self, job):
+        throttles = self._throttles
+        try:
+            result, error = job.func(*job.args, **job.kwargs), None
+        except Exception as e:
+            result, error = None, e
+            if RATE_LIMIT_PATTERN.search(f"{type(e).__name__} {e}"):
+                self.throttled()
+        finally:
+            self._slots.release()
+
+        with self._cond:
+            if self._throttles != throttles and _failed(result, error) and job.attempts < self.max_retries:
+                # נחסמנו באמצע ולא קיבלנו כלום - הבקשה חוזרת לתור ותצא כשההמתנה תיגמר
+                job.attempts += 1
+                job.started = False
+                self.stats["retries"] += 1
+                self._push(job)
+                return
+            if self._throttles == throttles and error is None:
+                self._backoff = 0.0
+            self._inflight.pop(job.key, None)
+        if error is None:
+            job.future.set_result(result)
+        else:
+            job.future.set_exception(error)
+
+    def throttled(self):
+        """Yahoo החזיר 429: עצירת כל הבקשות להמתנה שמוכפלת בכל חסימה נוספת"""
+        with self._cond:
+            now = time.time()
+            self._throttles += 1
+            if self._blocked_until > now:
+                return # כבר בהמתנה - חסימות מאותה תקופה לא מאריכות אותה
+            self.stats["throttled"] += 1
+            self._backoff = min(max(self._backoff * 2, settings.YAHOO_BACKOFF_SECONDS), settings.YAHOO_BACKOFF_MAX_SECONDS)
+            self._blocked_until = now + self._backoff
+            print(f"🐢 Yahoo rate limit hit - pausing requests for {self._backoff:.0f}s")
+            try:
+                with open(self.backoff_path, "w") as f:
+                    f.write(str(self._blocked_until))
+            except OSError:
+                pass
+
+    def _shared_block(self):
+        try:
+            with open(self.backoff_path) as f:
+                return float(f.read() or 0)
+        except (OSError, ValueError):
+            return 0.0
+
+    # ------------------------------------------
+    # פעולות Yahoo
+    # ------------------------------------------
+    def download(self, tickers, priority=CHART, **kwargs):
+        """yf.download"""
+        kwargs.setdefault("progress", False)
+        symbols = tickers if isinstance(tickers, str) else tuple(tickers)
+        key = ("download", symbols, tuple(sorted((k, str(v)) for k, v in kwargs.items())))
+        return self.call(key, yf.download, tickers, priority=priority, **kwargs)
+
+    def last_price(self, symbol, priority=SCHEDULER):
+        """fast_info['last_price'] (הגישה עצמה היא הבקשה, ולכן היא רצה בתוך השער)"""
+        return self.call(("last_price", symbol), lambda: yf.Ticker(symbol).fast_info['last_price'], priority=priority)
+
+    def history(self, symbol, priority=SCHEDULER, **kwargs):
+        """yf.Ticker(symbol).history"""
+        key = ("history", symbol, tuple(sorted((k, str(v)) for k, v in kwargs.items())))
+        return self.call(key, lambda: yf.Ticker(symbol).history(**kwargs), priority=priority)
+
+    def info(self, symbol, priority=INTERACTIVE):
+        """מטא-דאטה מ-fast_info: {'exchange', 'currency', 'quoteType'} (ערכים חסרים = '')"""
+        def load():
+            fast = yf.Ticker(symbol).fast_info
+            return {field: fast.get(field) or "" for field in ("exchange", "currency", "quoteType")}
+        return self.call(("info", symbol), load, priority=priority)
+
+def _failed(result, error):
+    return error is not None or result is None or (isinstance(result, pd.DataFrame) and result.empty)
+
+_default_gateway = None
+_default_lock = threading.Lock()
+
+def get_gateway():
+    """שער יחיד לכל התהליך"""
+    global _default_gateway
+    with _default_lock:
+        if _default_gateway is None:
+            _default_gateway = YahooGateway()
+    return _default_gateway